@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Reports the time InterventionPlanMultiPatch.build_model() takes on synthetic instances of increasing size (patches x
+interventions x pieces), with and without variable and constraint names. Nothing is solved.
+
+Example usage:
+$ python benchmark_build_model.py --patches 22 100 400 --interventions 4 8 --pieces 5 20
+"""
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from resop.multi_patch_optimizers import InterventionPlanMultiPatch
+
+
+def make_instance(patches, interventions, pieces, phases=5):
+    """
+    :return: (config, patches) in the layout of examples/data/patch_data.json
+    """
+    random = np.random.RandomState(0)
+    coverage = np.concatenate([[0.0], np.sort(random.uniform(0.05, 0.95, phases - 1))])
+
+    patch_entries = {}
+    for p in range(patches):
+        unit_cost = random.uniform(10, 1e4, interventions)
+        patch_entries['P%d' % p] = {
+            'name': 'P%d' % p,
+            'population': float(random.randint(1e3, 1e6)),
+            'Beta': random.uniform(0.8, 1.2),
+            'Gamma': random.uniform(2.5, 3.5),
+            'minimum_patch_budget': 0,
+            'efficacyBeta': random.uniform(0.1, 0.5, interventions).tolist(),
+            'efficacyGamma': random.uniform(0.1, 0.5, interventions).tolist(),
+            'threshold_coverage': [coverage.tolist()] * interventions,
+            'threshold_costs': np.outer(unit_cost, coverage * 1e3).tolist()
+        }
+
+    config = {
+        'num_interventions': interventions,
+        'num_pieces': pieces,
+        'total_budget': 1e7,
+        'minimum_intervention_budget': [0] * interventions,
+        'maximum_intervention_budget': [1e7] * interventions,
+        'intervention_names': ['I%d' % i for i in range(interventions)]
+    }
+    return config, patch_entries
+
+
+def build_seconds(config, patches, ignore_names, repeats):
+    """
+    :return: (best build time over repeats, number of variables, number of constraints)
+    """
+    optimiser = InterventionPlanMultiPatch(docloud_url=None, docloud_client_id=None, config=config, patches=patches,
+                                           ignore_names=ignore_names)
+    best = np.inf
+    for _ in range(repeats):
+        start = time.time()
+        _, _, model = optimiser.build_model()
+        best = min(best, time.time() - start)
+    return best, model.number_of_variables, model.number_of_constraints
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # the demo adjustments in build_model() need at least 22 patches
+    parser.add_argument('--patches', type=int, nargs='+', default=[22, 100, 400], help='Numbers of patches (>= 22)')
+    parser.add_argument('--interventions', type=int, nargs='+', default=[4, 8], help='Numbers of interventions')
+    parser.add_argument('--pieces', type=int, nargs='+', default=[5, 20], help='Numbers of linearization pieces')
+    parser.add_argument('--repeats', type=int, default=3, help='Builds per instance (the best is reported)')
+    args = parser.parse_args()
+
+    print('%8s %13s %6s %10s %11s %10s %12s' % ('patches', 'interventions', 'pieces', 'variables', 'constraints',
+                                                 'names (s)', 'no names (s)'))
+    for patches, interventions, pieces in itertools.product(args.patches, args.interventions, args.pieces):
+        # build_model() reads as many cost phases as there are interventions
+        config, patch_entries = make_instance(patches, interventions, pieces, phases=interventions)
+        named, variables, constraints = build_seconds(config, patch_entries, False, args.repeats)
+        unnamed, _, _ = build_seconds(config, patch_entries, True, args.repeats)
+        print('%8d %13d %6d %10d %11d %10.3f %12.3f' % (patches, interventions, pieces, variables, constraints, named,
+                                                         unnamed))
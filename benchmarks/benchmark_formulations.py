@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Compares the piecewise-linear formulations of InterventionPlanMultiPatch ('binary', 'sos2' and 'log'): model size,
+branch-and-bound nodes, solve time and objective, on synthetic instances or on a patch data file. HiGHS does not
+support SOS2 sets, so 'sos2' is skipped with that backend. With --presolve every model is also built with the presolve
+reductions.
+
+Example usage:
+$ python benchmark_formulations.py --solver cplex --patches 22 50 --interventions 4 --pieces 10
+$ python benchmark_formulations.py --solver highs --data ../examples/data/patch_data.json --presolve
+"""
+
+import argparse
+import json
+
+from benchmark_build_model import make_instance
+from resop.multi_patch_optimizers import (
+    FORMULATIONS,
+    InterventionPlanMultiPatch
+)
+from resop.solver_backends import (
+    BACKENDS,
+    make_backend
+)
+
+
+def solve(config, patches, formulation, solver, presolve=False):
+    """
+    :return: (model, backend details, whether a solution was found)
+    """
+    backend = make_backend(solver)
+    optimiser = InterventionPlanMultiPatch(docloud_url=None, docloud_client_id=None, config=config, patches=patches,
+                                           ignore_names=True, solver=backend, formulation=formulation,
+                                           presolve=presolve)
+    _, _, model = optimiser.build_model()
+    solved = backend.solve(model)
+    return model, backend.details, solved
+
+
+def report(label, config, patches, solver, presolve=False):
+    for formulation in FORMULATIONS:
+        if formulation == 'sos2' and solver == 'highs':
+            continue
+        for reduced in ([False, True] if presolve else [False]):
+            model, details, solved = solve(config, patches, formulation, solver, reduced)
+            objective = model.objective_value if solved else float('nan')
+            print('%-16s %-7s %-8s %8d %9d %8d %10.3f %16.6f  %s' % (
+                label, formulation, 'presolve' if reduced else '', model.number_of_variables,
+                model.number_of_binary_variables, details['nodes'], details['time'], objective, details['status']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--solver', choices=BACKENDS[1:], default='highs', help='Local solver backend')
+    parser.add_argument('--data', default=None, help='Patch data file (e.g. examples/data/patch_data.json) instead of '
+                                                     'synthetic instances')
+    # the demo adjustments in build_model() need at least 22 patches
+    parser.add_argument('--patches', type=int, nargs='+', default=[22, 50], help='Numbers of patches (>= 22)')
+    parser.add_argument('--interventions', type=int, nargs='+', default=[4], help='Numbers of interventions')
+    parser.add_argument('--pieces', type=int, nargs='+', default=[5, 10, 20],
+                        help='Numbers of linearization pieces')
+    parser.add_argument('--budget', type=float, default=3e6, help='Total budget of the synthetic instances')
+    parser.add_argument('--presolve', action='store_true', help='Also solve every model with the presolve reductions')
+    args = parser.parse_args()
+
+    print('%-16s %-7s %-8s %8s %9s %8s %10s %16s  %s' % ('instance', 'form', '', 'vars', 'binaries', 'nodes',
+                                                         'time (s)', 'objective', 'status'))
+    if args.data:
+        with open(args.data) as data_file:
+            data = json.load(data_file)
+        report(args.data.split('/')[-1], data['config'], data['patches'], args.solver, args.presolve)
+    else:
+        for patches in args.patches:
+            for interventions in args.interventions:
+                for pieces in args.pieces:
+                    # build_model() reads as many cost phases as there are interventions
+                    config, patch_entries = make_instance(patches, interventions, pieces, phases=interventions)
+                    config['total_budget'] = args.budget
+                    report('%dx%dx%d' % (patches, interventions, pieces), config, patch_entries, args.solver,
+                           args.presolve)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Compares the number of right-hand side evaluations needed with and without the models' analytic Jacobians, on stiff
+settings (short infectious periods, large populations, long horizons), for odeint (LSODA, which only needs a Jacobian
+once it has switched to its stiff method) and for solve_ivp's implicit BDF method.
+
+Example usage:
+$ python benchmark_jacobians.py --duration 1825 --infectious_period 0.1
+"""
+
+import argparse
+import time
+
+import numpy as np
+import scipy.integrate as scint
+
+from resop.sir_models import (
+    SIRModel,
+    SEIRModel,
+    SIRSModel,
+    SINRModel,
+    SIRMigrationModel,
+    GammaContactModel
+)
+
+
+def make_cases(infectious_period, population, patches):
+    """
+    :return: list of (name, model, initial conditions)
+    """
+    random = np.random.RandomState(0)
+    travel = random.uniform(0, 0.01, (patches, patches)) * (random.uniform(size=(patches, patches)) < 0.1)
+    np.fill_diagonal(travel, 0)
+    patch_populations = np.zeros((patches, 4))
+    patch_populations[:, 0] = population / patches
+    patch_populations[0, :2] = (population / patches - 1, 1)
+
+    return [
+        ('SIR', SIRModel(transmission=2.5 / infectious_period, infectious_period=infectious_period),
+         (population - 1, 1, 0)),
+        ('SEIR', SEIRModel(transmission=2.5 / infectious_period, infectious_period=infectious_period,
+                           incubation_period=5 * infectious_period),
+         (population - 1, 0, 1, 0)),
+        ('SIRS', SIRSModel(transmission=1.5 / infectious_period, infectious_period=infectious_period,
+                           waning_immunity=1 / 90.0),
+         (population - 1, 1, 0, 0)),
+        ('SINR', SINRModel(transmission=2.5 / infectious_period, infectious_period=infectious_period, n=10),
+         (population - 1, 1) + (0,) * 10),
+        ('GammaContact', GammaContactModel(transmission=2.5 / infectious_period, infectious_period=infectious_period,
+                                           incubation_period=5 * infectious_period, shape=0.5,
+                                           birth=1 / (70 * 365.0), death=1 / (70 * 365.0)),
+         (population - 1, 0, 1, 0)),
+        ('SIRMigration', SIRMigrationModel(transmission=np.full(patches, 2.5 / infectious_period),
+                                           infectious_period=np.full(patches, infectious_period), travel=travel,
+                                           patches=patches),
+         patch_populations.ravel()),
+    ]
+
+
+class CountingModel(object):
+    """
+    Wraps a model, counting right-hand side and Jacobian evaluations (solve_ivp does not include the evaluations made
+    for finite-difference Jacobians in its own counts)
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.rhs_calls = 0
+        self.jacobian_calls = 0
+
+    def run(self, previous_population, time_vector):
+        self.rhs_calls += 1
+        return self.model.run(previous_population, time_vector)
+
+    def jacobian(self, previous_population, time_vector):
+        self.jacobian_calls += 1
+        return self.model.jacobian(previous_population, time_vector)
+
+
+def count_odeint_evaluations(model, initial_conditions, timespan, use_jacobian):
+    """
+    :return: (RHS evaluations, Jacobian evaluations, seconds)
+    """
+    counter = CountingModel(model)
+    start = time.time()
+    _, info = scint.odeint(counter.run, initial_conditions, timespan, Dfun=counter.jacobian if use_jacobian else None,
+                           full_output=True, mxstep=50000)
+    elapsed = time.time() - start
+
+    return counter.rhs_calls, info['nje'][-1], elapsed
+
+
+def count_bdf_evaluations(model, initial_conditions, timespan, use_jacobian):
+    """
+    :return: (RHS evaluations, Jacobian evaluations, seconds)
+    """
+    counter = CountingModel(model)
+    start = time.time()
+    result = scint.solve_ivp(lambda t, y: counter.run(y, t), (timespan[0], timespan[-1]), initial_conditions,
+                             method='BDF', t_eval=timespan,
+                             jac=(lambda t, y: counter.jacobian(y, t)) if use_jacobian else None)
+    elapsed = time.time() - start
+
+    return counter.rhs_calls, result.njev, elapsed
+
+
+def report(title, count_evaluations, cases, timespan):
+    print(title)
+    print('%-14s %12s %12s %10s %12s %12s %10s %10s' % ('model', 'nfe (FD)', 'nje (FD)', 'time (FD)',
+                                                         'nfe (jac)', 'nje (jac)', 'time (jac)', 'nfe ratio'))
+    for name, model, initial_conditions in cases:
+        fd_nfe, fd_nje, fd_time = count_evaluations(model, initial_conditions, timespan, use_jacobian=False)
+        an_nfe, an_nje, an_time = count_evaluations(model, initial_conditions, timespan, use_jacobian=True)
+        print('%-14s %12d %12d %10.4f %12d %12d %10.4f %10.2f' % (name, fd_nfe, fd_nje, fd_time, an_nfe, an_nje,
+                                                                  an_time, float(fd_nfe) / an_nfe))
+    print('')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--duration', type=float, default=1825.0, help='Number of days integrated')
+    parser.add_argument('--infectious_period', type=float, default=0.1, help='Average infectious period, in days')
+    parser.add_argument('--population', type=float, default=1e7, help='Population size')
+    parser.add_argument('--patches', type=int, default=50, help='Number of patches in the migration model')
+    args = parser.parse_args()
+
+    timespan = np.arange(1, args.duration)
+    cases = make_cases(args.infectious_period, args.population, args.patches)
+
+    report('odeint (LSODA)', count_odeint_evaluations, cases, timespan)
+    report('solve_ivp (BDF)', count_bdf_evaluations, cases, timespan)
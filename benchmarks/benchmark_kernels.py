@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Reports right-hand side calls per second for each model: the model's own run(), and the compiled kernels from
+resop.kernels with the NumPy and (when installed) Numba backends.
+
+Example usage:
+$ python benchmark_kernels.py --calls 20000 --patches 100
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from resop import kernels
+from resop.sir_models import (
+    SIRModel,
+    SEIRModel,
+    SIRSModel,
+    SINRModel,
+    SIRMigrationModel,
+    GammaContactModel
+)
+
+
+def make_cases(patches):
+    """
+    :return: list of (name, model, population vector)
+    """
+    random = np.random.RandomState(0)
+    travel = random.uniform(0, 0.01, (patches, patches)) * (random.uniform(size=(patches, patches)) < 0.1)
+    np.fill_diagonal(travel, 0)
+
+    return [
+        ('SIR', SIRModel(transmission=0.5, infectious_period=5.0), random.uniform(1, 1e5, 3)),
+        ('SEIR', SEIRModel(transmission=0.5, infectious_period=5.0, incubation_period=3.0), random.uniform(1, 1e5, 4)),
+        ('SIRS', SIRSModel(transmission=0.5, infectious_period=5.0, waning_immunity=0.01), random.uniform(1, 1e5, 4)),
+        ('SINR', SINRModel(transmission=0.5, infectious_period=5.0, n=10), random.uniform(1, 1e5, 12)),
+        ('GammaContact', GammaContactModel(transmission=0.5, infectious_period=5.0, incubation_period=3.0, shape=0.5,
+                                           birth=1e-4, death=1e-4), random.uniform(1, 1e5, 4)),
+        ('SIRMigration', SIRMigrationModel(transmission=np.full(patches, 0.5), infectious_period=np.full(patches, 5.0),
+                                           travel=travel, patches=patches), random.uniform(1, 1e5, 4 * patches)),
+    ]
+
+
+def calls_per_second(run, population, calls):
+    run(population, 0)  # warm up (and compile, for Numba)
+    start = time.time()
+    for _ in range(calls):
+        run(population, 0)
+    return calls / (time.time() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=20000, help='Number of RHS calls timed per model and backend')
+    parser.add_argument('--patches', type=int, default=100, help='Number of patches in the migration model')
+    args = parser.parse_args()
+
+    backends = ['numpy'] + (['numba'] if kernels.__has_numba__ else [])
+    print('%-14s %14s' % ('model', 'run()') + ''.join(' %14s' % backend for backend in backends) + '  identical')
+    for name, model, population in make_cases(args.patches):
+        rates = [calls_per_second(model.run, population, args.calls)]
+        results = []
+        for backend in backends:
+            compiled = kernels.compile_model(model, backend=backend)
+            rates.append(calls_per_second(compiled.run, population, args.calls))
+            results.append(compiled.run(population, 0).copy())
+        identical = all(np.array_equal(results[0], result) for result in results[1:])
+        print('%-14s' % name + ''.join(' %14.0f' % rate for rate in rates) + '  %s' % identical)
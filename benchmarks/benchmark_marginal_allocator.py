@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Compares the greedy MarginalAllocator plan with the MILP of InterventionPlanMultiPatch on synthetic instances of
+increasing patch counts: the objective and time of each (the MILP under a time limit, and only up to --milp-patches
+patches).
+
+Example usage:
+$ python benchmark_marginal_allocator.py --patches 22 200 1000 5000 --milp-patches 200 --time-limit 60
+"""
+
+import argparse
+import time
+
+from benchmark_build_model import make_instance
+from benchmark_decomposition import milp
+from resop.marginal_allocator import MarginalAllocator
+from resop.multi_patch_optimizers import InterventionPlanMultiPatch
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # the demo adjustments in build_model() need at least 22 patches
+    parser.add_argument('--patches', type=int, nargs='+', default=[22, 200, 1000, 5000], help='Numbers of patches')
+    parser.add_argument('--interventions', type=int, default=4, help='Number of interventions')
+    parser.add_argument('--pieces', type=int, default=10, help='Number of linearization pieces')
+    parser.add_argument('--budget-per-patch', type=float, default=1e5, help='Total budget per patch')
+    parser.add_argument('--milp-patches', type=int, default=200, help='Largest instance also solved as one MILP')
+    parser.add_argument('--time-limit', type=float, default=60, help='Time limit of the MILP solves (seconds)')
+    args = parser.parse_args()
+
+    print('%8s %16s %9s %16s %9s' % ('patches', 'greedy', 'time (s)', 'milp', 'time (s)'))
+    for num_patches in args.patches:
+        # build_model() reads as many cost phases as there are interventions
+        config, patches = make_instance(num_patches, args.interventions, args.pieces, phases=args.interventions)
+        config['total_budget'] = args.budget_per_patch * num_patches
+        optimiser = InterventionPlanMultiPatch(docloud_url=None, docloud_client_id=None, config=config,
+                                               patches=patches)
+
+        start = time.time()
+        allocator = MarginalAllocator(optimiser)
+        allocator.allocate()
+        seconds = time.time() - start
+
+        milp_objective, milp_seconds = float('nan'), float('nan')
+        if num_patches <= args.milp_patches:
+            milp_objective, milp_seconds = milp(config, patches, args.time_limit)
+        print('%8d %16.1f %9.3f %16.1f %9.3f' % (num_patches, allocator.objective(), seconds, milp_objective,
+                                                milp_seconds))
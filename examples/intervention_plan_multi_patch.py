@@ -95,7 +95,8 @@ Set up the optimiser to run the data
 optimiser = InterventionPlanMultiPatch(docloud_url=services['docloud']['url'],
                                        docloud_client_id=services['docloud']['client_id'],
                                        config=patch_data['config'],
-                                       patches=patch_data['patches'])
+                                       patches=patch_data['patches'],
+                                       verbose=True)
 
 # Run the optimization and get the outputs
 result_patch_entry, config_data, result_solved_patch_model = optimiser.run()
@@ -103,7 +104,8 @@ result_patch_entry, config_data, result_solved_patch_model = optimiser.run()
 # Get optimisation solution
 result = InterventionPlanMultiPatch.get_optimization_solution(patches=result_patch_entry,
                                                               config=config_data,
-                                                              optimization_model=result_solved_patch_model)
+                                                              optimization_model=result_solved_patch_model,
+                                                              verbose=True)
 
 # Transform the result in to the json expected by the application
 data_from_opt = DataFromOpt(data_in=result,
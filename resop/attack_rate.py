@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Precomputed attack rate (fraction of the population removed) against R0, population and horizon, for the SIR and SEIR
+families, so that many R0 values can be turned into cases without integrating a model per lookup.
+
+Time is measured in infectious periods: a model with infectious period D behaves exactly like one with infectious
+period 1 run for horizon / D, so one table covers every infectious period (and, for SEIR, every incubation period with
+the same ratio to the infectious period). Tables are interpolated multilinearly, which keeps them monotone in R0 and in
+the horizon. The R0 and population grids are refined until linear interpolation at the midpoint of every cell edge is
+within the requested tolerance at each of the table's horizons (elsewhere in a cell the error can be slightly larger,
+and the shipped tables are stored in single precision); between those horizons the attack rate is interpolated
+linearly in time, without that bound (the time at which an epidemic takes off moves with R0 and population, so bounding
+it would need a far denser grid).
+
+Example usage, building the tables shipped in resop/data:
+$ python -m resop.attack_rate --family sir --tolerance 1e-3
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from .sir_models import (
+    BatchSIRModel,
+    BatchSEIRModel,
+    integrate_batch
+)
+
+FAMILIES = ('sir', 'seir')
+# in infectious periods, e.g. days for DataFromOpt (up to its five year horizon)
+DEFAULT_HORIZONS = (7, 14, 30, 60, 90, 180, 365, 730, 1095, 1460, 1823)
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def table_path(family):
+    """
+    :return: path of the table shipped with the package for family
+    """
+    return os.path.join(DATA_DIRECTORY, 'attack_rate_%s.npz' % family)
+
+
+def _evaluate(family, r0, log_population, horizon, incubation_ratio, initial_infected):
+    """
+    :return: attack rates, array [len(r0), len(log_population), len(horizon)]
+    """
+    r0_grid, population = np.meshgrid(r0, 10.0 ** np.asarray(log_population), indexing='ij')
+    if family == 'sir':
+        model = BatchSIRModel(transmission=r0_grid, infectious_period=1.0)
+        infectious = 1
+    else:
+        model = BatchSEIRModel(transmission=r0_grid, infectious_period=1.0, incubation_period=incubation_ratio)
+        infectious = 2
+
+    initial_conditions = np.zeros(r0_grid.shape + (model.num_compartments,))
+    initial_conditions[..., 0] = population - initial_infected
+    initial_conditions[..., infectious] = initial_infected
+
+    # odeint reports the initial state first, so integrate from 0 even when the grid does not start there
+    start = 0 if horizon[0] == 0 else 1
+    times = np.concatenate([[0.0], horizon]) if start else horizon
+    populations = integrate_batch(model, initial_conditions, times, mxstep=100000)[start:]
+
+    return np.moveaxis(populations[..., -1] / population, 0, -1)
+
+
+class AttackRateTable(object):
+    """
+    Attack rate on a (R0, log10 population, horizon in infectious periods) grid, interpolated multilinearly
+    """
+
+    def __init__(self, family, r0, log_population, horizon, attack_rate, incubation_ratio=1.0, initial_infected=1.0,
+                 tolerance=np.nan):
+        """
+
+        :param family: 'sir' or 'seir'
+        :param r0: increasing grid of R0 values
+        :param log_population: increasing grid of log10(population)
+        :param horizon: increasing grid of horizons, in infectious periods
+        :param attack_rate: array [len(r0), len(log_population), len(horizon)]
+        :param incubation_ratio: incubation period / infectious period (SEIR only)
+        :param initial_infected: number infectious at the start
+        :param tolerance: interpolation tolerance the grids were refined to
+        """
+        if family not in FAMILIES:
+            raise ValueError('Unknown model family "%s", expected one of %s' % (family, ', '.join(FAMILIES)))
+
+        self.family = family
+        self.r0 = np.asarray(r0, dtype=float)
+        self.log_population = np.asarray(log_population, dtype=float)
+        self.horizon = np.asarray(horizon, dtype=float)
+        self.attack_rate = np.asarray(attack_rate, dtype=float)
+        self.incubation_ratio = float(incubation_ratio)
+        self.initial_infected = float(initial_infected)
+        self.tolerance = float(tolerance)
+
+    @classmethod
+    def build(cls, family='sir', r0_range=(0.5, 8.0), population_range=(1e2, 1e8), horizons=DEFAULT_HORIZONS,
+              tolerance=1e-3, incubation_ratio=1.0, initial_infected=1.0, max_passes=40):
+        """
+        Integrate the model family on a coarse grid and refine the R0 and population axes until interpolation is within
+        tolerance
+
+        :param family: 'sir' or 'seir'
+        :param r0_range: (lowest, highest) R0
+        :param population_range: (smallest, largest) population
+        :param horizons: horizons, in infectious periods, at which the table is exact up to the tolerance
+        :param tolerance: largest absolute interpolation error allowed at the cell edge midpoints
+        :param incubation_ratio: incubation period / infectious period (SEIR only)
+        :param initial_infected: number infectious at the start
+        :param max_passes: refinement passes over the three axes
+        :return: AttackRateTable
+        """
+        if family not in FAMILIES:
+            raise ValueError('Unknown model family "%s", expected one of %s' % (family, ', '.join(FAMILIES)))
+
+        axes = [np.linspace(r0_range[0], r0_range[1], 9),
+                np.linspace(np.log10(population_range[0]), np.log10(population_range[1]), 5),
+                np.union1d([0.0], np.asarray(horizons, dtype=float))]
+        table = _evaluate(family, axes[0], axes[1], axes[2], incubation_ratio, initial_infected)
+
+        for _ in range(max_passes):
+            refined = False
+            for axis in range(2):
+                grid = axes[axis]
+                midpoints = 0.5 * (grid[:-1] + grid[1:])
+                exact = _evaluate(family, *[midpoints if other == axis else axes[other] for other in range(3)],
+                                  incubation_ratio=incubation_ratio, initial_infected=initial_infected)
+                interpolated = 0.5 * (np.take(table, np.arange(len(grid) - 1), axis=axis) +
+                                      np.take(table, np.arange(1, len(grid)), axis=axis))
+
+                others = tuple(other for other in range(3) if other != axis)
+                inaccurate = np.nonzero(np.abs(exact - interpolated).max(axis=others) > tolerance)[0]
+                if inaccurate.size:
+                    refined = True
+                    grid = np.concatenate([grid, midpoints[inaccurate]])
+                    table = np.concatenate([table, np.take(exact, inaccurate, axis=axis)], axis=axis)
+                    order = np.argsort(grid)
+                    axes[axis] = grid[order]
+                    table = np.take(table, order, axis=axis)
+            if not refined:
+                break
+        else:
+            print('aur.resop: Warning: attack rate table not within tolerance after %d passes' % max_passes)
+
+        return cls(family, axes[0], axes[1], axes[2], table, incubation_ratio=incubation_ratio,
+                   initial_infected=initial_infected, tolerance=tolerance)
+
+    def save(self, path):
+        """
+        :param path: .npz file to write
+        """
+        np.savez_compressed(path, family=self.family, r0=self.r0, log_population=self.log_population,
+                            horizon=self.horizon, attack_rate=self.attack_rate.astype(np.float32),
+                            incubation_ratio=self.incubation_ratio, initial_infected=self.initial_infected,
+                            tolerance=self.tolerance)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: .npz file written by save()
+        :return: AttackRateTable
+        """
+        with np.load(path) as data:
+            return cls(str(data['family']), data['r0'], data['log_population'], data['horizon'], data['attack_rate'],
+                       incubation_ratio=float(data['incubation_ratio']),
+                       initial_infected=float(data['initial_infected']), tolerance=float(data['tolerance']))
+
+    def attack_rate_at(self, r0, population, horizon, infectious_period=1.0):
+        """
+        Vectorized lookup; the arguments are broadcast against each other
+
+        :param r0: R0 values
+        :param population: population sizes
+        :param horizon: time since the start, in the same unit as infectious_period
+        :param infectious_period: average infectious period
+        :return: fraction of the population removed by horizon, nan outside the table
+        """
+        r0, log_population, periods = np.broadcast_arrays(
+            np.asarray(r0, dtype=float), np.log10(np.asarray(population, dtype=float)),
+            np.asarray(horizon, dtype=float) / np.asarray(infectious_period, dtype=float))
+
+        corners = []
+        inside = np.ones(r0.shape, dtype=bool)
+        for grid, values in zip((self.r0, self.log_population, self.horizon), (r0, log_population, periods)):
+            # allow for round-off at the edges (e.g. a horizon of exactly the last one, rescaled by the period)
+            slack = 1e-9 * (grid[-1] - grid[0])
+            inside &= (values >= grid[0] - slack) & (values <= grid[-1] + slack)
+            index = np.clip(np.searchsorted(grid, values, side='right') - 1, 0, len(grid) - 2)
+            weight = np.clip((values - grid[index]) / (grid[index + 1] - grid[index]), 0.0, 1.0)
+            corners.append((index, weight))
+
+        (i, wi), (j, wj), (k, wk) = corners
+        table = self.attack_rate
+        result = ((1 - wi) * ((1 - wj) * ((1 - wk) * table[i, j, k] + wk * table[i, j, k + 1]) +
+                              wj * ((1 - wk) * table[i, j + 1, k] + wk * table[i, j + 1, k + 1])) +
+                  wi * ((1 - wj) * ((1 - wk) * table[i + 1, j, k] + wk * table[i + 1, j, k + 1]) +
+                        wj * ((1 - wk) * table[i + 1, j + 1, k] + wk * table[i + 1, j + 1, k + 1])))
+
+        return np.where(inside, result, np.nan)
+
+    def cases(self, r0, population, horizon, infectious_period=1.0):
+        """
+        :return: number removed by horizon (attack rate times population), nan outside the table
+        """
+        return self.attack_rate_at(r0, population, horizon, infectious_period) * np.asarray(population, dtype=float)
+
+
+_tables = {}
+
+
+def load_table(family='sir'):
+    """
+    :param family: 'sir' or 'seir'
+    :return: the AttackRateTable shipped with the package, loaded once per process
+    """
+    if family not in _tables:
+        path = table_path(family)
+        if not os.path.exists(path):
+            raise IOError('No attack rate table for "%s" at %s - build it with "python -m resop.attack_rate"'
+                          % (family, path))
+        _tables[family] = AttackRateTable.load(path)
+    return _tables[family]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--family', choices=FAMILIES, default='sir', help='Model family')
+    parser.add_argument('--tolerance', type=float, default=1e-3, help='Largest interpolation error of the attack rate')
+    parser.add_argument('--horizons', type=float, nargs='+', default=DEFAULT_HORIZONS,
+                        help='Horizons at which the table is within tolerance, in infectious periods')
+    parser.add_argument('--incubation_ratio', type=float, default=1.0,
+                        help='Incubation period / infectious period (SEIR only)')
+    parser.add_argument('--output', default=None, help='Output file (defaults to the table shipped in resop/data)')
+    args = parser.parse_args()
+
+    built = AttackRateTable.build(family=args.family, horizons=args.horizons, tolerance=args.tolerance,
+                                  incubation_ratio=args.incubation_ratio)
+    output = args.output or table_path(args.family)
+    if not os.path.isdir(os.path.dirname(os.path.abspath(output))):
+        os.makedirs(os.path.dirname(os.path.abspath(output)))
+    built.save(output)
+    print('%s: %d x %d x %d grid written to %s' % (args.family, len(built.r0), len(built.log_population),
+                                                   len(built.horizon), output))
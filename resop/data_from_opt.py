@@ -12,10 +12,14 @@
 ##################################################################
 
 import json
+import numpy as np
 from . import data_consts
 from .sir_models import (
-    SIRModel
+    SIRModel,
+    BatchSIRModel,
+    integrate_batch
 )
+from .trajectory_cache import TrajectoryCache
 __can_integrate__ = True
 try:
     import scipy.integrate as scint
@@ -24,9 +28,24 @@ except ImportError:
     print('aur.resop: "scipy" package not present - integration capability disabled')
 
 
+# final case counts per (R0, population), shared by every DataFromOpt in the process
+CASES_CACHE = TrajectoryCache(max_entries=4096)
+
+
 class DataFromOpt:
-    def __init__(self, data_in, db_connection_url, run_id):
+    def __init__(self, data_in, db_connection_url, run_id, cache=None, attack_rates=None):
+        """
+
+        :param data_in: solution dict from InterventionPlanMultiPatch.get_optimization_solution
+        :param db_connection_url: database connection URL
+        :param run_id: identifier of the run
+        :param cache: TrajectoryCache for the case counts (defaults to the shared CASES_CACHE)
+        :param attack_rates: optional attack_rate.AttackRateTable (SIR, one initial infected) to look cases up in,
+        within its tolerance, instead of computing them
+        """
         self._connection_url = db_connection_url
+        self._cache = CASES_CACHE if cache is None else cache
+        self._attack_rates = attack_rates
         self._allocated_budget_patches_interventions = self.my_get(data_in, 'allocated_budget_patches_interventions')
         self._allocated_budget_patches = self.my_get(data_in, 'allocated_budget_patches')
         self._coverage_patches_interventions = self.my_get(data_in, 'coverage_patches_interventions')
@@ -40,8 +59,7 @@ class DataFromOpt:
         self._patch_ids = self.my_get(data_in, 'patch_ids')
         self._intervention_names = self.my_get(data_in, 'intervention_names')
         self._population = self.my_get(data_in, 'population')
-        self._cases = self.get_cases(self._r0)
-        self._base_cases = self.get_cases(self._base_r0)
+        self._cases, self._base_cases = self.get_scenario_cases([self._r0, self._base_r0])
         # TODO - this needs to live in the database and be fed through
         self._fatality = 0.01
 
@@ -132,19 +150,78 @@ class DataFromOpt:
         }
 
     def get_cases(self, r0_vals):
-        if __can_integrate__:
-            result = []
-            for patch in range(len(self._patch_ids)):
-                beta = r0_vals[patch]
-                gamma = 1
-                end_day = 1825  # 5 years
-                timespan = range(1, end_day)  # assuming starting at day 1 and time steps of a day and duration in days
-                initial_conditions = (self._population[patch] - 1, 1, 0)
-                sirmodel = SIRModel(transmission=beta, infectious_period=gamma)
-                sirpops = scint.odeint(sirmodel.run, initial_conditions, timespan)
-
-                result.append(sirpops[end_day - 2][2])
-            return result
-        else:
-            print("aur.resop: Warning: Integration disabled - no cases will be reported")
-            return [0 for _ in range(len(self._patch_ids))]
+        return self.get_scenario_cases([r0_vals])[0]
+
+    def get_scenario_cases(self, r0_scenarios):
+        """
+        Number of cases in each patch after five years, for each set of R0 values. Results are cached per (R0,
+        population) pair, so unchanged and identical patches are only computed once.
+
+        :param r0_scenarios: list of R0 vectors, each with one value per patch
+        :return: list (one entry per scenario) of lists of cases per patch
+        """
+        beta = np.array(r0_scenarios, dtype=float)
+        gamma = 1
+        end_day = 1825  # 5 years
+        population = np.broadcast_to(np.asarray(self._population, dtype=float), beta.shape)
+
+        cases = np.zeros(beta.size)
+        missing = {}
+        for index, (r0, patch_population) in enumerate(zip(beta.ravel(), population.ravel())):
+            key = self._cache.make_key(SIRModel, r0, gamma, patch_population, end_day)
+            if key in missing:
+                missing[key].append(index)
+                continue
+            value = self._cache.lookup(key)
+            if value is None:
+                missing[key] = [index]
+            else:
+                cases[index] = value
+
+        if missing:
+            first = [indices[0] for indices in missing.values()]
+            missing_beta, missing_population = beta.ravel()[first], population.ravel()[first]
+            if self._attack_rates is None:
+                computed = self.compute_cases(missing_beta, missing_population, gamma, end_day)
+            else:
+                computed = self._attack_rates.cases(missing_beta, missing_population, end_day - 2, gamma)
+                outside = np.isnan(computed)
+                if outside.any():
+                    computed[outside] = self.compute_cases(missing_beta[outside], missing_population[outside], gamma,
+                                                           end_day)
+            for (key, indices), value in zip(missing.items(), computed):
+                cases[indices] = value
+                self._cache.store(key, value)
+
+        return [list(scenario) for scenario in cases.reshape(beta.shape)]
+
+    @staticmethod
+    def compute_cases(beta, population, gamma, end_day):
+        """
+        Number of cases at end_day - 1 for each R0 value. Only the final removed compartment is needed, so it comes from
+        the closed-form final size wherever the epidemic has burnt out within the horizon; the rest are integrated
+        together as one batch.
+
+        :param beta: vector of R0 values
+        :param population: vector of populations
+        :param gamma: infectious period
+        :param end_day: end of the simulation, in days
+        :return: vector of cases
+        """
+        # timespan is range(1, end_day), so the last reported day is end_day - 1
+        cases, burnt_out = SIRModel.final_size(r0=beta, population=population, initial_infected=1,
+                                               infectious_period=gamma, horizon=end_day - 2)
+
+        if not burnt_out.all():
+            if __can_integrate__:
+                timespan = np.arange(1, end_day)  # assuming starting at day 1 and time steps of a day and duration in days
+                initial_conditions = np.zeros((np.count_nonzero(~burnt_out), BatchSIRModel.num_compartments))
+                initial_conditions[:, 0] = population[~burnt_out] - 1
+                initial_conditions[:, 1] = 1
+                sirmodel = BatchSIRModel(transmission=beta[~burnt_out], infectious_period=gamma)
+                sirpops = integrate_batch(sirmodel, initial_conditions, timespan)
+                cases[~burnt_out] = sirpops[end_day - 2, :, 2]
+            else:
+                print("aur.resop: Warning: Integration disabled - cases are reported as final epidemic sizes")
+
+        return cases
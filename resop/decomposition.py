@@ -0,0 +1,594 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Lagrangian decomposition of the InterventionPlanMultiPatch MILP, for patch counts at which the monolithic model is
+out of reach:
+
+    decomposition = LagrangianDecomposition(optimiser)
+    result = decomposition.solve()
+    print(result.lower_bound, result.upper_bound, result.gap)
+    solution = result.solution(optimiser.patches, optimiser.config)
+
+The constraints that couple patches (the total budget, the per-intervention minimum and maximum budgets and max_var >=
+var_R0) are relaxed with multipliers, and so are the two per-patch constraints (the minimum patch budget and the R0
+floor of var_R0). What is left separates into one problem per (intervention, patch) pair: pick a coverage minimizing a
+weighted sum of its log R0 reduction and its spend, which is solved exactly for all pairs at once over their tabulated
+coverage options (see intervention_curves). The multipliers follow projected subgradient steps (Polyak step sizes
+towards the best plan found).
+
+Every few iterations the pairs' choices are repaired into a plan satisfying every constraint: coverage is lowered where
+a patch falls below its R0 floor or a budget is exceeded, raised where a minimum budget is not met, and left-over budget
+is spent greedily, all priced by the current multipliers. The best repaired plan, one repaired from the best
+multipliers and one built up from the cheapest options are finally polished with LPs (when scipy is installed) in which
+every pair may move continuously to its next coverage breakpoint up or down, which reaches optima lying between
+breakpoints (e.g. where a patch's R0 floor binds, or small coverages everywhere lower max R0). The best polished
+plan is the upper bound, the best dual value the lower bound, and their gap bounds how far the plan is from optimal.
+"""
+
+import numpy as np
+
+__can_polish__ = True
+try:
+    import scipy.sparse as sparse
+    from scipy.optimize import linprog
+except ImportError:
+    __can_polish__ = False
+
+from .intervention_curves import InterventionCurves
+from .multi_patch_optimizers import InterventionPlanMultiPatch
+
+
+def _project_capped(values, total):
+    """
+    Euclidean projection onto {x >= 0, sum(x) <= total}
+    """
+    values = np.maximum(values, 0)
+    if values.sum() <= total:
+        return values
+    ordered = np.sort(values)[::-1]
+    cumulative = np.cumsum(ordered) - total
+    rank = np.nonzero(ordered - cumulative / np.arange(1, len(ordered) + 1) > 0)[0][-1]
+    return np.maximum(values - cumulative[rank] / (rank + 1), 0)
+
+
+class DecompositionResult(object):
+    """
+    Outcome of LagrangianDecomposition.solve():
+
+    lower_bound: best Lagrangian bound on the MILP objective
+    upper_bound: objective of the best repaired plan (inf if no plan could be repaired)
+    gap: (upper_bound - lower_bound) / |upper_bound|
+    coverage, allocated_budget: the plan, arrays [interventions, patches] (None without a plan)
+    var_r0: var_R0 of the plan, array [patches] (None without a plan)
+    iterations: number of subgradient iterations run
+    history: dict of arrays over the iterations: 'lower_bound' (dual value), 'upper_bound' (best so far), 'step'
+    multipliers: dict of the multipliers giving the lower bound
+    """
+
+    def __init__(self, lower_bound, upper_bound, plan, iterations, history, multipliers):
+        self.lower_bound = lower_bound
+        self.upper_bound = upper_bound
+        self.gap = (upper_bound - lower_bound) / abs(upper_bound) if np.isfinite(upper_bound) else np.inf
+        self.coverage = None if plan is None else plan['coverage']
+        self.allocated_budget = None if plan is None else plan['allocated_budget']
+        self.var_r0 = None if plan is None else plan['var_r0']
+        self.iterations = iterations
+        self.history = history
+        self.multipliers = multipliers
+
+    def feasible(self):
+        """
+        :return: whether a plan satisfying every constraint was found
+        """
+        return self.coverage is not None
+
+    def solution(self, patches, config):
+        """
+        :param patches: the optimiser's patches
+        :param config: the optimiser's config
+        :return: the plan in the layout of InterventionPlanMultiPatch.get_optimization_solution()
+        """
+        if not self.feasible():
+            raise ValueError('No feasible plan was found')
+        return InterventionPlanMultiPatch.solution_from_arrays(patches, config, self.allocated_budget, self.coverage,
+                                                               self.var_r0)
+
+
+class LagrangianDecomposition(object):
+    """
+    Lagrangian relaxation of the model built by InterventionPlanMultiPatch.build_model(), on the same data
+    """
+
+    def __init__(self, optimiser, iterations=300, tolerance=1e-3, step=2.0, patience=10, repair_every=10):
+        """
+
+        :param optimiser: InterventionPlanMultiPatch (its model is never built)
+        :param iterations: largest number of subgradient iterations
+        :param tolerance: relative duality gap at which to stop
+        :param step: initial Polyak step factor, halved whenever the bound has not improved for patience iterations
+        :param patience: iterations without improvement of the lower bound before the step factor is halved
+        :param repair_every: iterations between repairs of the current choices into a plan
+        """
+        self.iterations = iterations
+        self.tolerance = tolerance
+        self.step = step
+        self.patience = patience
+        self.repair_every = repair_every
+
+        data = optimiser.optimization_data()
+        config = optimiser.config
+        num_interventions = config['num_interventions']
+        self.curves = InterventionCurves.from_data(data, config)
+        self.population = data['population']
+        self.total_population = float(self.population.sum())
+        # lower bounds of var_R0, as in build_model(), and of max_var, which is also above every var_R0 floor
+        self.r0_floor = np.log(0.9) - np.log(data['beta'] * data['gamma'])
+        self.max_r0_floor = self.r0_floor.max()
+        self.budget = float(config['total_budget'])
+        self.minimum_patch_budget = data['minimum_patch_budget']
+        self.minimum_intervention_budget = np.array(config['minimum_intervention_budget'][:num_interventions],
+                                                    dtype=float)
+        self.maximum_intervention_budget = np.array(config['maximum_intervention_budget'][:num_interventions],
+                                                    dtype=float)
+        # budget constraints are relaxed divided by the size of the budget they limit, so that all subgradient entries
+        # are of order 1
+        num_patches = len(self.population)
+        self.scale = max(self.budget, 1.0)
+        self.intervention_scale = np.maximum(np.minimum(self.maximum_intervention_budget, self.budget), 1.0)
+        self.patch_scale = max(self.budget / num_patches, 1.0)
+        self.budget_tolerance = 1e-9 * self.scale
+        self.r0_tolerance = 1e-9
+
+    def initial_multipliers(self):
+        """
+        :return: dict of zero multipliers: 'budget' (scalar), 'minimum_intervention' and 'maximum_intervention'
+        [interventions], 'minimum_patch', 'max_r0' and 'r0_floor' [patches]
+        """
+        num_interventions, num_patches, _ = self.curves.shape()
+        return {
+            'budget': 0.0,
+            'minimum_intervention': np.zeros(num_interventions),
+            'maximum_intervention': np.zeros(num_interventions),
+            'minimum_patch': np.zeros(num_patches),
+            'max_r0': np.zeros(num_patches),
+            'r0_floor': np.zeros(num_patches)
+        }
+
+    def dual(self, multipliers):
+        """
+        Solve the relaxed problem for given multipliers
+
+        :param multipliers: dict, see initial_multipliers()
+        :return: (dual value, chosen option of every pair [interventions, patches], subgradient dict shaped like the
+        multipliers)
+        """
+        m = multipliers
+        reduction_weight = self.population + m['max_r0'] - m['r0_floor']
+        price = (m['budget'] / self.scale +
+                 ((m['maximum_intervention'] - m['minimum_intervention']) / self.intervention_scale)[:, np.newaxis] -
+                 m['minimum_patch'][np.newaxis, :] / self.patch_scale)
+        choice, values = self.curves.minimize(reduction_weight[np.newaxis, :], price)
+
+        # max_var only appears with the coefficient below, which the projection keeps >= 0, so it sits at its bound
+        value = (values.sum() +
+                 (self.total_population - m['max_r0'].sum()) * self.max_r0_floor +
+                 np.dot(m['r0_floor'], self.r0_floor) -
+                 m['budget'] +
+                 np.dot(m['minimum_intervention'] * self.minimum_intervention_budget -
+                        m['maximum_intervention'] * self.maximum_intervention_budget, 1 / self.intervention_scale) +
+                 np.dot(m['minimum_patch'], self.minimum_patch_budget) / self.patch_scale)
+
+        _, log_reduction, cost, _ = self.curves.select(choice)
+        r0 = log_reduction.sum(axis=0)
+        spend_interventions = cost.sum(axis=1)
+        subgradient = {
+            'budget': (cost.sum() - self.budget) / self.scale,
+            'minimum_intervention': (self.minimum_intervention_budget - spend_interventions) / self.intervention_scale,
+            'maximum_intervention': (spend_interventions - self.maximum_intervention_budget) / self.intervention_scale,
+            'minimum_patch': (self.minimum_patch_budget - cost.sum(axis=0)) / self.patch_scale,
+            'max_r0': r0 - self.max_r0_floor,
+            'r0_floor': self.r0_floor - r0
+        }
+        return value, choice, subgradient
+
+    def objective(self, log_reduction):
+        """
+        :param log_reduction: log R0 reduction of every pair, array [interventions, patches]
+        :return: MILP objective of a plan
+        """
+        r0 = log_reduction.sum(axis=0)
+        return float(np.dot(self.population, r0) + self.total_population * max(r0.max(), self.max_r0_floor))
+
+    def _best_moves(self, log_reduction, cost, weights, r0, room, up):
+        """
+        Best move of every pair to another of its options, priced by weights * change in log R0 reduction per change in
+        spend
+
+        :param room: largest spend increase of every pair (up), array [interventions, patches]
+        :param up: raise the spend (best gain per dollar), or lower it (least loss per dollar saved)
+        :return: (target option, ratio), arrays [interventions, patches]; ratio is -inf / inf where there is no move
+        """
+        curves = self.curves
+        change = curves.cost - cost[..., np.newaxis]
+        value = weights[np.newaxis, :, np.newaxis] * (curves.log_reduction - log_reduction[..., np.newaxis])
+        if up:
+            allowed = curves.feasible & (change > 0) & (change <= room[..., np.newaxis])
+            # raising spend must not take var_R0 below its floor
+            allowed &= (r0[np.newaxis, :, np.newaxis] + curves.log_reduction - log_reduction[..., np.newaxis] >=
+                        self.r0_floor[np.newaxis, :, np.newaxis] - self.r0_tolerance)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = np.where(allowed, -value / change, -np.inf)
+            target = np.argmax(ratio, axis=-1)
+        else:
+            allowed = curves.feasible & (change < 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = np.where(allowed, value / -change, np.inf)
+            target = np.argmin(ratio, axis=-1)
+        return target, np.take_along_axis(ratio, target[..., np.newaxis], axis=-1)[..., 0]
+
+    def repair(self, choice, weights):
+        """
+        Turn a choice of options into a plan satisfying every constraint of the model, except minimum budgets that no
+        choice of options meets (e.g. below the cost of the first breakpoint); those are left to polish()
+
+        :param choice: option of every pair, array [interventions, patches]
+        :param weights: price of a unit of var_R0 in every patch, array [patches] (the population, plus the max_r0
+        multipliers to account for the max R0 term)
+        :return: dict of 'choice', 'coverage', 'allocated_budget' [interventions, patches], 'var_r0' [patches],
+        'objective' and 'shortfall' (total spend missing on minimum budgets), or None if no plan was found
+        """
+        curves = self.curves
+        choice = choice.copy()
+        _, log_reduction, cost, _ = curves.select(choice)
+        num_interventions, num_patches, _ = curves.shape()
+        r0 = log_reduction.sum(axis=0)
+
+        def move(i, p, q):
+            r0[p] += curves.log_reduction[i, p, q] - log_reduction[i, p]
+            log_reduction[i, p] = curves.log_reduction[i, p, q]
+            cost[i, p] = curves.cost[i, p, q]
+            choice[i, p] = q
+
+        # var_R0 floors: take back the coverage that overshoots them, cheapest first
+        for p in np.nonzero(r0 < self.r0_floor - self.r0_tolerance)[0]:
+            while r0[p] < self.r0_floor[p] - self.r0_tolerance:
+                raise_by = curves.log_reduction[:, p] - log_reduction[:, p, np.newaxis]
+                allowed = curves.feasible[:, p] & (raise_by > 0)
+                if not allowed.any():
+                    return None
+                deficit = self.r0_floor[p] - r0[p]
+                enough = allowed & (raise_by >= deficit)
+                if enough.any():
+                    i, q = np.unravel_index(np.argmin(np.where(enough, raise_by, np.inf)), raise_by.shape)
+                else:
+                    i, q = np.unravel_index(np.argmax(np.where(allowed, raise_by, -np.inf)), raise_by.shape)
+                move(i, p, q)
+
+        def short_after(i, p, change):
+            """whether changing the spend of (i, p) leaves intervention i or patch p below its minimum budget"""
+            return (cost[i].sum() + change < self.minimum_intervention_budget[i] - self.budget_tolerance or
+                    cost[:, p].sum() + change < self.minimum_patch_budget[p] - self.budget_tolerance)
+
+        # maximum budgets: lower spend where it loses the least per dollar saved, without opening shortfalls on
+        # minimum budgets unless there is no other way
+        protect = True
+        while True:
+            excess = cost.sum() - self.budget
+            excess_interventions = cost.sum(axis=1) - self.maximum_intervention_budget
+            if excess <= self.budget_tolerance and (excess_interventions <= self.budget_tolerance).all():
+                break
+            target, ratio = self._best_moves(log_reduction, cost, weights, r0, None, up=False)
+            moved = False
+            for flat in np.argsort(ratio, axis=None):
+                i, p = np.unravel_index(flat, ratio.shape)
+                if not np.isfinite(ratio[i, p]):
+                    break
+                if excess <= self.budget_tolerance and excess_interventions[i] <= self.budget_tolerance:
+                    continue
+                saved = cost[i, p] - curves.cost[i, p, target[i, p]]
+                if protect and short_after(i, p, -saved):
+                    continue
+                move(i, p, target[i, p])
+                excess -= saved
+                excess_interventions[i] -= saved
+                moved = True
+                if excess <= self.budget_tolerance and (excess_interventions <= self.budget_tolerance).all():
+                    break
+            if not moved:
+                if not protect:
+                    return None
+                protect = False
+
+        def shortfalls():
+            return (np.maximum(self.minimum_intervention_budget - cost.sum(axis=1), 0),
+                    np.maximum(self.minimum_patch_budget - cost.sum(axis=0), 0))
+
+        def raise_spend(ratio, target, limit):
+            """apply the upgrades in order of ratio that fit; limit(i, p) bounds the spend each may add"""
+            moved = False
+            left = self.budget - cost.sum() - reserve
+            left_interventions = self.maximum_intervention_budget - cost.sum(axis=1)
+            for flat in np.argsort(-ratio, axis=None):
+                i, p = np.unravel_index(flat, ratio.shape)
+                if not np.isfinite(ratio[i, p]):
+                    break
+                q = target[i, p]
+                added = curves.cost[i, p, q] - cost[i, p]
+                if added > min(left, left_interventions[i], limit(i, p)) + self.budget_tolerance:
+                    continue
+                if r0[p] + curves.log_reduction[i, p, q] - log_reduction[i, p] < self.r0_floor[p] - self.r0_tolerance:
+                    continue
+                move(i, p, q)
+                left -= added
+                left_interventions[i] -= added
+                moved = True
+            return moved
+
+        # minimum budgets: raise spend where it gains the most per dollar, by no more than is short. What the options
+        # cannot meet exactly is left for polish() to close with coverage between breakpoints.
+        reserve = 0.0
+        while True:
+            short_interventions, short_patches = shortfalls()
+            if short_interventions.sum() + short_patches.sum() <= self.budget_tolerance:
+                break
+            needed = np.maximum(short_interventions[:, np.newaxis], short_patches[np.newaxis, :])
+            left = self.budget - cost.sum()
+            room = np.minimum(np.minimum(left, self.maximum_intervention_budget - cost.sum(axis=1))[:, np.newaxis],
+                              needed)
+            target, ratio = self._best_moves(log_reduction, cost, weights, r0, room, up=True)
+            ratio = np.where(needed > self.budget_tolerance, ratio, -np.inf)
+
+            def still_needed(i, p):
+                return max(self.minimum_intervention_budget[i] - cost[i].sum(),
+                           self.minimum_patch_budget[p] - cost[:, p].sum())
+
+            if not raise_spend(ratio, target, still_needed):
+                break
+
+        # keep that shortfall free, releasing spend where the minimum budgets allow (least loss per dollar first)
+        short_interventions, short_patches = shortfalls()
+        reserve = short_interventions.sum() + short_patches.sum()
+        excess = reserve - (self.budget - cost.sum())
+        if excess > self.budget_tolerance:
+            target, ratio = self._best_moves(log_reduction, cost, weights, r0, None, up=False)
+            for flat in np.argsort(ratio, axis=None):
+                i, p = np.unravel_index(flat, ratio.shape)
+                if not np.isfinite(ratio[i, p]) or excess <= self.budget_tolerance:
+                    break
+                saved = cost[i, p] - curves.cost[i, p, target[i, p]]
+                if short_interventions[i] or short_patches[p] or short_after(i, p, -saved):
+                    continue
+                move(i, p, target[i, p])
+                excess -= saved
+
+        # the left-over budget: raise spend where it gains the most per dollar
+        while True:
+            left = self.budget - cost.sum() - reserve
+            room = np.minimum(left, self.maximum_intervention_budget - cost.sum(axis=1))[:, np.newaxis] * \
+                np.ones(num_patches)
+            target, ratio = self._best_moves(log_reduction, cost, weights, r0, room, up=True)
+            ratio = np.where(ratio > 0, ratio, -np.inf)
+            if not raise_spend(ratio, target, lambda i, p: np.inf):
+                break
+
+        coverage, log_reduction, cost, _ = curves.select(choice)
+        return {
+            'choice': choice,
+            'coverage': coverage,
+            'allocated_budget': cost,
+            'var_r0': log_reduction.sum(axis=0),
+            'objective': self.objective(log_reduction),
+            'shortfall': float(np.maximum(self.minimum_intervention_budget - cost.sum(axis=1), 0).sum() +
+                               np.maximum(self.minimum_patch_budget - cost.sum(axis=0), 0).sum())
+        }
+
+    def _segment(self, choice, towards):
+        """
+        Segment from every pair's option to its next coverage breakpoint up or down (with the same fixed cost), on which
+        the log R0 reduction and the spend are linear
+
+        :param towards: 1 for up, -1 for down
+        :return: (option at the end of the segment, changes in coverage, log R0 reduction and spend along it), arrays
+        [interventions, patches]; the option is the pair's own and the changes 0 where there is no breakpoint that way
+        """
+        curves = self.curves
+        coverage, log_reduction, cost, alpha = curves.select(choice)
+        distance = towards * (curves.coverage - coverage[..., np.newaxis])
+        # an option beyond the total budget still ends a segment whose start is affordable; the LP bounds the spend
+        beyond = (curves.alpha == alpha[..., np.newaxis]) & (distance > 0)
+        exists = beyond.any(axis=-1)
+        end = np.where(exists, np.argmin(np.where(beyond, distance, np.inf), axis=-1), choice)
+        return (end,) + tuple(np.take_along_axis(values, end[..., np.newaxis], axis=-1)[..., 0] - current
+                              for values, current in ((curves.coverage, coverage),
+                                                      (curves.log_reduction, log_reduction), (curves.cost, cost)))
+
+    def _segment_lp(self, choice, holds=5):
+        """
+        Best moves of all pairs along their segments up and down from the chosen options, by an LP. A pair the LP moves
+        both ways (i.e. onto a chord rather than its curve) is held to its upward segment, and the LP solved again.
+
+        :param holds: largest number of LP solves
+        :return: (position on the upward segments, position on the downward segments, the segments from _segment()),
+        or None if the LP has no solution
+        """
+        num_interventions, num_patches, _ = self.curves.shape()
+        _, log_reduction, cost, _ = self.curves.select(choice)
+        segments = [self._segment(choice, 1), self._segment(choice, -1)]
+        pairs = num_interventions * num_patches
+        # variables: the position on every upward segment, then on every downward segment, then max_var
+        reduction_change = np.concatenate([segment[2].ravel() for segment in segments])
+        cost_change = np.concatenate([segment[3].ravel() for segment in segments])
+        patch_of = np.tile(np.arange(num_patches), 2 * num_interventions)
+        intervention_of = np.tile(np.repeat(np.arange(num_interventions), num_patches), 2)
+        columns = np.arange(2 * pairs)
+
+        def rows(row_of, values, count, max_var=0.0):
+            return sparse.hstack([sparse.csr_matrix((values, (row_of, columns)), shape=(count, 2 * pairs)),
+                                  sparse.csr_matrix(np.full((count, 1), max_var))])
+
+        a_ub = sparse.vstack([
+            rows(patch_of, reduction_change, num_patches, max_var=-1.0),
+            rows(patch_of, -reduction_change, num_patches),
+            rows(np.zeros(2 * pairs, dtype=int), cost_change, 1),
+            rows(intervention_of, cost_change, num_interventions),
+            rows(intervention_of, -cost_change, num_interventions),
+            rows(patch_of, -cost_change, num_patches)
+        ]).tocsr()
+        r0 = log_reduction.sum(axis=0)
+        spend_interventions = cost.sum(axis=1)
+        # the options themselves (no move) need not be feasible
+        b_ub = np.concatenate([
+            -r0,
+            r0 - self.r0_floor,
+            [self.budget - cost.sum()],
+            self.maximum_intervention_budget - spend_interventions,
+            spend_interventions - self.minimum_intervention_budget,
+            cost.sum(axis=0) - self.minimum_patch_budget
+        ])
+        c = np.concatenate([np.tile(self.population, 2 * num_interventions) * reduction_change,
+                            [self.total_population]])
+        upper = np.ones(2 * pairs + 1)
+        upper[-1] = np.inf
+        lower = np.zeros(2 * pairs + 1)
+        lower[-1] = self.max_r0_floor
+
+        for _ in range(holds):
+            result = linprog(c, A_ub=a_ub, b_ub=b_ub, bounds=np.column_stack([lower, upper]), method='highs')
+            if result.x is None:
+                return None
+            up = np.reshape(result.x[:pairs], (num_interventions, num_patches))
+            down = np.reshape(result.x[pairs:2 * pairs], (num_interventions, num_patches))
+            both = (up > 1e-9) & (down > 1e-9)
+            if not both.any():
+                return up, down, segments
+            upper[pairs:2 * pairs][both.ravel()] = 0
+        return None
+
+    def polish(self, plan, rounds=10):
+        """
+        Improve a plan from repair() by LPs in which every pair may move continuously to its next coverage breakpoint up
+        or down. Pairs that reach a breakpoint continue from it in the next round (or in the next call, for the returned
+        plan). The LPs also close any shortfall on minimum budgets the plan has.
+
+        :param plan: dict from repair()
+        :param rounds: largest number of LPs
+        :return: dict like plan, or plan unchanged when scipy is not installed or no better plan is found; None when the
+        plan has a shortfall that could not be closed
+        """
+        best = plan if plan['shortfall'] <= self.budget_tolerance else None
+        if not __can_polish__:
+            return best
+        choice = plan['choice']
+        for _ in range(rounds):
+            moves = self._segment_lp(choice)
+            if moves is None:
+                break
+            up, down, segments = moves
+            coverage, log_reduction, cost, _ = self.curves.select(choice)
+            log_reduction = log_reduction + up * segments[0][2] + down * segments[1][2]
+            # pairs that reach a breakpoint continue from it, in this call or in a later one
+            ended = np.where(up >= 1 - 1e-9, segments[0][0], np.where(down >= 1 - 1e-9, segments[1][0], choice))
+            polished = {
+                'choice': ended,
+                'coverage': coverage + up * segments[0][1] + down * segments[1][1],
+                'allocated_budget': cost + up * segments[0][3] + down * segments[1][3],
+                'var_r0': log_reduction.sum(axis=0),
+                'objective': self.objective(log_reduction),
+                'shortfall': 0.0
+            }
+            if best is not None and polished['objective'] >= best['objective'] - 1e-9 * abs(best['objective']):
+                break
+            best = polished
+
+            if (ended == choice).all():
+                break
+            choice = ended
+        return best
+
+    def _feasible_plan(self, choice, weights):
+        """
+        :return: plan from repair(), with a few rounds of polish() if needed to meet the minimum budgets, or None
+        """
+        plan = self.repair(choice, weights)
+        if plan is not None and plan['shortfall'] > self.budget_tolerance:
+            plan = self.polish(plan, rounds=3)
+        return plan
+
+    def solve(self, multipliers=None):
+        """
+        Run the subgradient method
+
+        :param multipliers: starting multipliers (e.g. from a previous result), see initial_multipliers()
+        :return: DecompositionResult
+        """
+        m = {key: np.array(value, dtype=float) for key, value in
+             (multipliers or self.initial_multipliers()).items()}
+        lower, upper = -np.inf, np.inf
+        best_multipliers, plan = m, None
+        step, stalled = self.step, 0
+        history = {'lower_bound': [], 'upper_bound': [], 'step': []}
+
+        iteration = 0
+        for iteration in range(1, self.iterations + 1):
+            value, choice, subgradient = self.dual(m)
+            if value > lower + 1e-12 * abs(value):
+                lower, best_multipliers, stalled = value, {key: np.copy(item) for key, item in m.items()}, 0
+            else:
+                stalled += 1
+                if stalled >= self.patience:
+                    step, stalled = step / 2, 0
+
+            if iteration == 1 or iteration % self.repair_every == 0:
+                repaired = self._feasible_plan(choice, self.population + m['max_r0'])
+                if repaired is not None and repaired['objective'] < upper:
+                    upper, plan = repaired['objective'], repaired
+
+            history['lower_bound'].append(value)
+            history['upper_bound'].append(upper)
+            history['step'].append(step)
+
+            if np.isfinite(upper) and upper - lower <= self.tolerance * abs(upper):
+                break
+            # entries that would push a zero multiplier negative are cut off by the projection, so they must not shorten
+            # the step
+            subgradient = {key: np.where((m[key] <= 0) & (subgradient[key] < 0), 0.0, subgradient[key]) for key in m}
+            norm = sum(float(np.sum(np.square(item))) for item in subgradient.values())
+            if norm == 0 or step < 1e-8:
+                break
+
+            # Polyak step towards the best plan, or towards an optimistic guess until there is one
+            target = upper if np.isfinite(upper) else value + 0.1 * max(abs(value), 1.0)
+            length = step * (target - value) / norm
+            for key in m:
+                m[key] = np.maximum(m[key] + length * subgradient[key], 0)
+            m['max_r0'] = _project_capped(m['max_r0'], self.total_population)
+
+        # a last repair from the multipliers that gave the bound, and the cheapest options left to polish() alone: the
+        # max_r0 term favours many patches at the same var_R0 with coverage between breakpoints, which the repairs of
+        # greedy moves between breakpoints may miss
+        _, choice, _ = self.dual(best_multipliers)
+        cheapest = np.argmin(np.where(self.curves.feasible, self.curves.cost, np.inf), axis=-1)
+        candidates = [plan, self.repair(choice, self.population + best_multipliers['max_r0']),
+                      self.repair(cheapest, np.zeros(len(self.population)))]
+        for candidate in candidates:
+            if candidate is not None:
+                candidate = self.polish(candidate, rounds=1)
+            if candidate is not None and candidate['objective'] < upper:
+                upper, plan = candidate['objective'], candidate
+        if plan is not None:
+            plan = self.polish(plan)
+            upper = plan['objective']
+
+        history = {key: np.array(values, dtype=float) for key, values in history.items()}
+        return DecompositionResult(lower, upper, plan, iteration, history, best_multipliers)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Budget and trade-off sweeps over a single InterventionPlanMultiPatch model. The model is built once; each point of a
+sweep only changes the total budget (the budget constraint and the spend bounds) or the weight of max R0 in the
+objective, and is solved from the previous point's plan when the backend takes MIP starts:
+
+    sweep = PlanSweep(optimiser)
+    frontier = sweep.budgets(np.arange(1, 11) * 1e6)
+    print(frontier['budget'], frontier['weighted_sum'], frontier['max_r0'])
+
+Sweeping budgets in increasing order keeps each previous plan feasible for the next point. With presolve the model
+only holds for budgets up to the one its curves were cut for, so it is rebuilt (once, for the largest budget of a
+sweep) when a larger budget is set.
+"""
+
+import copy
+
+import numpy as np
+
+from .multi_patch_optimizers import add_mip_start
+
+
+class PlanSweep(object):
+    """
+    One model from InterventionPlanMultiPatch.build_model(), re-solved for different budgets and trade-off weights
+    """
+
+    def __init__(self, optimiser, warm_start=True):
+        """
+
+        :param optimiser: InterventionPlanMultiPatch (its solver backend is used for every point)
+        :param warm_start: start each solve from the previous point's plan (ignored by backends without MIP starts)
+        """
+        self.optimiser = optimiser
+        self.backend = optimiser.solver_backend()
+        self.warm_start = warm_start and self.backend.supports_mip_starts
+
+        _, config, self.model = optimiser.build_model()
+        self.budget = config['total_budget']
+        self.weight = 1.0
+        # largest budget the model holds for: presolve cuts the curves at the budget the model is built with
+        self._model_budget = self.budget if optimiser.presolve else np.inf
+        self._plan = None
+
+        self._population = optimiser.optimization_data()['population']
+        # R0 is reported against the patch data as given, like get_optimization_solution() does
+        entries = [optimiser.patches[patch] for patch in optimiser.patches.keys()]
+        self._base_log_r0 = np.log([entry['Beta'] * entry['Gamma'] for entry in entries])
+
+    def _rebuild(self, budget):
+        """
+        Build the model again with its curves cut for budget, from the last plan found when warm starting
+        """
+        optimiser = copy.copy(self.optimiser)
+        optimiser.config = dict(optimiser.config, total_budget=budget)
+        optimiser.warm_start = None
+        if self.warm_start and self._plan is not None:
+            allocated_budget, coverage = self._plan
+            optimiser.warm_start = {
+                'coverage_patches_interventions': coverage,
+                'allocated_budget_patches_interventions': allocated_budget
+            }
+        _, _, self.model = optimiser.build_model()
+        self._model_budget = budget
+        if self.weight != 1.0:
+            self.set_weight(self.weight)
+
+    def set_budget(self, budget):
+        """
+        :param budget: total budget for the next solves
+        """
+        if budget > self._model_budget:
+            self._rebuild(budget)
+        # pairs presolve fixed keep their spend pinned
+        spend = self.model.total_dollar_var[~self.model.presolve_report.fixed].tolist()
+        self.model.budget_constraint.rhs = budget
+        self.model.change_var_upper_bounds(spend, [budget] * len(spend))
+        self.budget = budget
+
+    def set_weight(self, weight):
+        """
+        :param weight: weight of the population-weighted max R0 term in the objective, relative to the weighted sum of
+        R0 (1 in build_model())
+        """
+        model = self.model
+        model.minimize(model.scal_prod(model.var_R0, self._population) +
+                       weight * sum(self._population.tolist()) * model.max_var)
+        self.weight = weight
+
+    def solve(self):
+        """
+        Solve for the current budget and weight
+
+        :return: dict of 'budget', 'weight', 'objective', 'weighted_sum', 'max_r0', 'r0' [patches], 'allocated_budget'
+        and 'coverage' [interventions, patches], or None if no solution was found
+        """
+        model = self.model
+        if not self.backend.solve(model):
+            return None
+
+        solution = model.solution
+        shape = model.total_dollar_var.shape
+        allocated_budget = np.reshape(solution.get_values(model.total_dollar_var.ravel().tolist()), shape)
+        coverage = np.reshape(solution.get_values(model.cover_var.ravel().tolist()), shape)
+        r0 = np.exp(self._base_log_r0 + np.array(solution.get_values(model.var_R0)))
+
+        self._plan = (allocated_budget, coverage)
+        if self.warm_start:
+            model.clear_mip_starts()
+            add_mip_start(model, solution)
+
+        return {
+            'budget': self.budget,
+            'weight': self.weight,
+            'objective': solution.objective_value,
+            'weighted_sum': float(np.dot(self._population, r0)),
+            'max_r0': float(r0.max()),
+            'r0': r0,
+            'allocated_budget': allocated_budget,
+            'coverage': coverage
+        }
+
+    def _sweep(self, update, values):
+        settings, points = [], []
+        for value in values:
+            update(value)
+            settings.append((self.budget, self.weight))
+            points.append(self.solve())
+        return self._frontier(settings, points)
+
+    def budgets(self, budgets):
+        """
+        :param budgets: total budgets, best in increasing order
+        :return: frontier dict, see _frontier()
+        """
+        budgets = list(budgets)
+        if budgets and max(budgets) > self._model_budget:
+            self._rebuild(max(budgets))
+        return self._sweep(self.set_budget, budgets)
+
+    def weights(self, weights):
+        """
+        :param weights: weights of the max R0 term, at the current budget
+        :return: frontier dict, see _frontier()
+        """
+        return self._sweep(self.set_weight, weights)
+
+    def _frontier(self, settings, points):
+        """
+        :param settings: (budget, weight) of each point
+        :param points: results of solve()
+        :return: dict of arrays over the points: 'budget', 'weight', 'solved', 'objective', 'weighted_sum', 'max_r0',
+        'r0' [points, patches], 'allocated_budget' and 'coverage' [points, interventions, patches]; nan where no
+        solution was found
+        """
+        shape = self.model.total_dollar_var.shape
+        frontier = {
+            'budget': np.array([budget for budget, _ in settings], dtype=float),
+            'weight': np.array([weight for _, weight in settings], dtype=float),
+            'solved': np.array([point is not None for point in points], dtype=bool)
+        }
+        for key in ('objective', 'weighted_sum', 'max_r0'):
+            frontier[key] = np.array([np.nan if point is None else point[key] for point in points], dtype=float)
+        for key, item_shape in (('r0', shape[1:]), ('allocated_budget', shape), ('coverage', shape)):
+            frontier[key] = np.array([np.full(item_shape, np.nan) if point is None else point[key]
+                                      for point in points], dtype=float).reshape((len(points),) + tuple(item_shape))
+        return frontier
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+The coverage options of every (intervention, patch) pair of an InterventionPlanMultiPatch model, with the log R0
+reduction and the spend each one implies.
+
+In the MILP both the log R0 reduction and the spend are piecewise linear in the coverage (between the R0 breakpoints
+j / num_pieces and the cost thresholds respectively), so any objective that is linear in them is minimized at one of the
+union of those breakpoints, or where the spend reaches its upper bound (the total budget) between two of them.
+Tabulating the pairs at those points lets the per-pair problems of a decomposition or a greedy heuristic be solved
+exactly with array operations, without a solver.
+"""
+
+import numpy as np
+
+
+class InterventionCurves(object):
+    """
+    Coverage options, arrays [interventions, patches, options] sorted by spend within each pair:
+
+    coverage: coverage of the option
+    log_reduction: its contribution to var_R0 (log of the R0 reduction factor, <= 0)
+    cost: its spend, including the fixed cost when alpha is set
+    alpha: whether the option pays the fixed cost (threshold_costs[0]) on top of the curve
+    feasible: whether the spend is within the spend bounds of the model
+    """
+
+    def __init__(self, coverage, log_reduction, cost, alpha, feasible):
+        order = np.lexsort((log_reduction, cost), axis=-1)
+        self.coverage = np.take_along_axis(coverage, order, axis=-1)
+        self.log_reduction = np.take_along_axis(log_reduction, order, axis=-1)
+        self.cost = np.take_along_axis(cost, order, axis=-1)
+        self.alpha = np.take_along_axis(alpha, order, axis=-1)
+        self.feasible = np.take_along_axis(feasible, order, axis=-1)
+
+    @classmethod
+    def from_data(cls, data, config):
+        """
+        :param data: dict from InterventionPlanMultiPatch.optimization_data()
+        :param config: the optimiser's config
+        :return: InterventionCurves
+        """
+        num_pieces = config['num_pieces']
+        num_phases = data['threshold_coverage'].shape[-1]
+        # [interventions, patches, ...] like the model's variables
+        threshold_coverage = np.transpose(data['threshold_coverage'][:, :, :num_phases], (1, 0, 2))
+        threshold_cost = np.transpose(data['threshold_cost'][:, :, :num_phases], (1, 0, 2))
+        c_points = np.arange(num_pieces + 1) / num_pieces
+        log_reduction = np.transpose(np.log(1 - data['efficacy_beta'][:, :, np.newaxis] * c_points) +
+                                     np.log(1 - data['efficacy_gamma'][:, :, np.newaxis] * c_points), (1, 0, 2))
+
+        # the union of both sets of breakpoints, within the coverage the cost curve spans
+        low = np.maximum(threshold_coverage[..., :1], 0)
+        high = np.minimum(threshold_coverage[..., -1:], 1)
+        coverage = np.concatenate([np.broadcast_to(c_points, threshold_coverage.shape[:2] + c_points.shape),
+                                   threshold_coverage], axis=-1)
+        coverage = np.clip(coverage, low, high)
+
+        piece = np.minimum(np.floor(coverage * num_pieces).astype(int), num_pieces - 1)
+        fraction = coverage * num_pieces - piece
+        reduction = ((1 - fraction) * np.take_along_axis(log_reduction, piece, axis=-1) +
+                     fraction * np.take_along_axis(log_reduction, piece + 1, axis=-1))
+
+        phase = np.clip((threshold_coverage[..., np.newaxis, :] <= coverage[..., np.newaxis]).sum(axis=-1) - 1,
+                        0, num_phases - 2)
+        start = np.take_along_axis(threshold_coverage, phase, axis=-1)
+        end = np.take_along_axis(threshold_coverage, phase + 1, axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(end > start, (coverage - start) / (end - start), 0.0)
+        cost = ((1 - share) * np.take_along_axis(threshold_cost, phase, axis=-1) +
+                share * np.take_along_axis(threshold_cost, phase + 1, axis=-1))
+
+        # the same options with the fixed cost paid, each set with the points where its curve reaches the total budget
+        # (the upper bound of the spend): a linear objective over the part of a curve within the budget may be
+        # minimized at one of them
+        order = np.argsort(coverage, axis=-1)
+        coverage, reduction, cost = (np.take_along_axis(values, order, axis=-1)
+                                     for values in (coverage, reduction, cost))
+        total_budget = config['total_budget']
+        unpaid = cls._capped(coverage, reduction, cost, total_budget)
+        paid = cls._capped(coverage, reduction, cost + threshold_cost[..., :1], total_budget)
+        coverage, reduction, cost = (np.concatenate(values, axis=-1) for values in zip(unpaid, paid))
+        alpha = np.concatenate([np.zeros(unpaid[2].shape), np.ones(paid[2].shape)], axis=-1)
+        feasible = (cost >= 0) & (cost <= total_budget)
+
+        return cls(coverage, reduction, cost, alpha, feasible)
+
+    @staticmethod
+    def _capped(coverage, reduction, cost, cap):
+        """
+        Options sorted by coverage, followed by the points where the segments between consecutive options cross the
+        spend cap (a copy of the segment's first option where it does not cross it)
+
+        :return: (coverage, log_reduction, cost), arrays [interventions, patches, 2 * options - 1]
+        """
+        start, end = cost[..., :-1], cost[..., 1:]
+        crosses = (np.minimum(start, end) < cap) & (np.maximum(start, end) > cap)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(crosses, (cap - start) / (end - start), 0.0)
+        ends = [values[..., :-1] + share * np.diff(values, axis=-1) for values in (coverage, reduction)]
+        ends.append(np.where(crosses, cap, start))
+        return tuple(np.concatenate([values, end], axis=-1) for values, end in zip((coverage, reduction, cost), ends))
+
+    def shape(self):
+        """
+        :return: (interventions, patches, options)
+        """
+        return self.cost.shape
+
+    def select(self, choice):
+        """
+        :param choice: option index of every pair, array [interventions, patches]
+        :return: (coverage, log_reduction, cost, alpha) of the chosen options, arrays [interventions, patches]
+        """
+        index = choice[..., np.newaxis]
+        return (np.take_along_axis(self.coverage, index, axis=-1)[..., 0],
+                np.take_along_axis(self.log_reduction, index, axis=-1)[..., 0],
+                np.take_along_axis(self.cost, index, axis=-1)[..., 0],
+                np.take_along_axis(self.alpha, index, axis=-1)[..., 0])
+
+    def minimize(self, reduction_weight, cost_weight):
+        """
+        Best option of every pair for the objective reduction_weight * log_reduction + cost_weight * cost
+
+        :param reduction_weight: array broadcastable to [interventions, patches]
+        :param cost_weight: array broadcastable to [interventions, patches]
+        :return: (option index, objective value), arrays [interventions, patches]
+        """
+        values = (np.asarray(reduction_weight)[..., np.newaxis] * self.log_reduction +
+                  np.asarray(cost_weight)[..., np.newaxis] * self.cost)
+        values = np.where(self.feasible, values, np.inf)
+        choice = np.argmin(values, axis=-1)
+        return choice, np.take_along_axis(values, choice[..., np.newaxis], axis=-1)[..., 0]
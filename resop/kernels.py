@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Preallocated-buffer right-hand side kernels for the models in sir_models.
+
+compile_model() turns a model instance into an object whose run() writes the derivatives into a buffer allocated once,
+instead of allocating a new array and re-summing the population through Python on every call. Kernels are compiled with
+Numba when it is installed and run as plain NumPy otherwise. Both backends perform the same floating-point operations in
+the same order, so they return identical results.
+
+The returned buffer is reused between calls: odeint copies it, but callers that keep derivatives (e.g. solve_ivp) should
+copy it themselves.
+"""
+
+import math
+import numpy as np
+
+from .sir_models import (
+    SIRModel,
+    SEIRModel,
+    SIRSModel,
+    SINRModel,
+    SIRMigrationModel,
+    GammaContactModel
+)
+
+__has_numba__ = True
+try:
+    import numba
+except ImportError:
+    __has_numba__ = False
+
+__has_scipy__ = True
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    __has_scipy__ = False
+
+BACKENDS = ('numpy', 'numba')
+
+
+def _sir_kernel(y, out, transmission, infectious_period):
+    population = y[0] + y[1] + y[2]
+    out[0] = -transmission * y[0] * y[1] / population
+    out[1] = transmission * y[0] * y[1] / population - y[1] / infectious_period
+    out[2] = y[1] / infectious_period
+
+
+def _seir_kernel(y, out, transmission, infectious_period, incubation_period):
+    population = y[0] + y[1] + y[2] + y[3]
+    out[0] = -transmission * y[0] * y[2] / population
+    out[1] = transmission * y[0] * y[2] / population - y[1] / incubation_period
+    out[2] = y[1] / incubation_period - y[2] / infectious_period
+    out[3] = y[2] / infectious_period
+
+
+def _sirs_kernel(y, out, transmission, infectious_period, waning_immunity):
+    population = y[0] + y[1] + y[2] + y[3]
+    out[0] = -transmission * y[0] * y[1] / population + waning_immunity * y[2]
+    out[1] = transmission * y[0] * y[1] / population - y[1] / infectious_period
+    out[2] = y[1] / infectious_period - waning_immunity * y[2]
+    out[3] = transmission * y[0] * y[1] / population
+
+
+def _gamma_contact_kernel(y, out, transmission, infectious_period, incubation_period, shape, birth, death):
+    population = y[0] + y[1] + y[2] + y[3]
+    force = shape * math.log(1 + transmission * y[2] / (shape * population))
+    out[0] = birth * population - force * y[0] - death * y[0]
+    out[1] = force * y[0] - (1 / incubation_period + death) * y[1]
+    out[2] = y[1] / incubation_period - (1 / infectious_period + death) * y[2]
+    out[3] = y[2] / infectious_period - death * y[3]
+
+
+def _sinr_kernel_loop(y, out, transmission, infectious_period, n, scratch):
+    population = 0.0
+    for i in range(n + 2):
+        population += y[i]
+    total_infectious = 0.0
+    for i in range(1, n):
+        total_infectious += y[i]
+
+    out[0] = -transmission * y[0] * total_infectious / population
+    out[1] = transmission * y[0] * total_infectious / population - n * y[1] / infectious_period
+    for i in range(2, n + 1):
+        out[i] = n * (y[i - 1] - y[i]) / infectious_period
+    out[n + 1] = n * y[n] / infectious_period
+
+
+def _sinr_kernel_numpy(y, out, transmission, infectious_period, n, scratch):
+    # np.cumsum accumulates sequentially, matching the loop above bit for bit
+    population = np.cumsum(y, out=scratch)[-1]
+    total_infectious = np.cumsum(y[1:n], out=scratch[:n - 1])[-1] if n > 1 else 0.0
+
+    out[0] = -transmission * y[0] * total_infectious / population
+    out[1] = transmission * y[0] * total_infectious / population - n * y[1] / infectious_period
+    stages = out[2:n + 1]
+    np.subtract(y[1:n], y[2:n + 1], out=stages)
+    stages *= n
+    stages /= infectious_period
+    out[n + 1] = n * y[n] / infectious_period
+
+
+def _migration_kernel_loop(y, out, transmission, recovery, indptr, indices, data, patches):
+    for i in range(patches):
+        # net migration (arrivals minus departures) of S, I and R into patch i
+        moved_s = 0.0
+        moved_i = 0.0
+        moved_r = 0.0
+        for k in range(indptr[i], indptr[i + 1]):
+            j = indices[k]
+            moved_s += data[k] * y[4 * j]
+            moved_i += data[k] * y[4 * j + 1]
+            moved_r += data[k] * y[4 * j + 2]
+
+        susceptible = y[4 * i]
+        infectious = y[4 * i + 1]
+        population = susceptible + infectious + y[4 * i + 2]
+        infections = transmission[i] * susceptible * infectious / population
+        recoveries = infectious * recovery[i]
+
+        out[4 * i] = moved_s - infections
+        out[4 * i + 1] = moved_i + (infections - recoveries)
+        out[4 * i + 2] = moved_r + recoveries
+        out[4 * i + 3] = infections
+
+
+def _migration_kernel_numpy(y, out, transmission, recovery, migration, scratch):
+    state = y.reshape(-1, 4)
+    d_pop = out.reshape(-1, 4)
+    population, infections, recoveries = scratch
+
+    np.add(state[:, 0], state[:, 1], out=population)
+    np.add(population, state[:, 2], out=population)
+    np.multiply(transmission, state[:, 0], out=infections)
+    np.multiply(infections, state[:, 1], out=infections)
+    np.divide(infections, population, out=infections)
+    np.multiply(state[:, 1], recovery, out=recoveries)
+
+    d_pop[:, :3] = migration.dot(state[:, :3])
+    d_pop[:, 0] -= infections
+    np.subtract(infections, recoveries, out=population)
+    d_pop[:, 1] += population
+    d_pop[:, 2] += recoveries
+    d_pop[:, 3] = infections
+
+
+_jit_cache = {}
+
+
+def _jit(kernel):
+    """
+    Numba-compiled version of kernel, compiled once per process
+    """
+    if kernel not in _jit_cache:
+        _jit_cache[kernel] = numba.njit(kernel)
+    return _jit_cache[kernel]
+
+
+def _build_sir(model, use_numba):
+    return _sir_kernel, (float(model.transmission), float(model.infectious_period)), 3, True
+
+
+def _build_seir(model, use_numba):
+    return _seir_kernel, (float(model.transmission), float(model.infectious_period),
+                          float(model.incubation_period)), 4, True
+
+
+def _build_sirs(model, use_numba):
+    return _sirs_kernel, (float(model.transmission), float(model.infectious_period),
+                          float(model.waning_immunity)), 4, True
+
+
+def _build_gamma_contact(model, use_numba):
+    return _gamma_contact_kernel, (float(model.transmission), float(model.infectious_period),
+                                   float(model.incubation_period), float(model.shape), float(model.birth),
+                                   float(model.death)), 4, True
+
+
+def _build_sinr(model, use_numba):
+    n = int(model.n)
+    scratch = np.zeros(n + 2)
+    args = (float(model.transmission), float(model.infectious_period), n, scratch)
+
+    # without Numba, looping over Python floats beats the array version until there are a few dozen stages
+    if use_numba or n <= 32:
+        return _sinr_kernel_loop, args, n + 2, not use_numba
+    return _sinr_kernel_numpy, args, n + 2, False
+
+
+def _build_migration(model, use_numba):
+    if not __has_scipy__:
+        raise ImportError('"scipy" package not present - the migration kernel needs scipy.sparse')
+
+    # both backends apply the same CSR operator, row by row in index order
+    migration = sparse.csr_matrix(model._migration)
+    migration.sort_indices()
+    patches = model.patches
+    transmission = np.ascontiguousarray(model._transmission)
+    recovery = np.ascontiguousarray(model._recovery)
+
+    if use_numba:
+        return _migration_kernel_loop, (transmission, recovery, migration.indptr, migration.indices, migration.data,
+                                        patches), 4 * patches, False
+
+    scratch = (np.zeros(patches), np.zeros(patches), np.zeros(patches))
+    return _migration_kernel_numpy, (transmission, recovery, migration, scratch), 4 * patches, False
+
+
+_BUILDERS = {
+    SIRModel: _build_sir,
+    SEIRModel: _build_seir,
+    SIRSModel: _build_sirs,
+    SINRModel: _build_sinr,
+    SIRMigrationModel: _build_migration,
+    GammaContactModel: _build_gamma_contact,
+}
+
+
+class CompiledModel(object):
+    """
+    A model's right-hand side compiled into a kernel that writes into a preallocated buffer. Drop-in replacement for
+    the model's run(), e.g. "scint.odeint(compile_model(model).run, initial_conditions, timespan)".
+    """
+
+    def __init__(self, model, backend='auto'):
+        """
+
+        :param model: model instance from sir_models
+        :param backend: 'numba', 'numpy' or 'auto' (Numba when installed, NumPy otherwise)
+        """
+        if backend == 'auto':
+            backend = 'numba' if __has_numba__ else 'numpy'
+        if backend not in BACKENDS:
+            raise ValueError('Unknown kernel backend "%s", expected one of %s' % (backend, ', '.join(BACKENDS)))
+        if backend == 'numba' and not __has_numba__:
+            raise ImportError('"numba" package not present - use the "numpy" kernel backend')
+        if type(model) not in _BUILDERS:
+            raise ValueError('No kernel available for model type %s' % type(model).__name__)
+
+        self.model = model
+        self.backend = backend
+
+        kernel, self._args, size, scalar = _BUILDERS[type(model)](model, backend == 'numba')
+        self._kernel = _jit(kernel) if backend == 'numba' else kernel
+        self._out = np.zeros(size)
+
+        # without Numba, the scalar kernels are fastest on Python floats (same IEEE operations as on float64)
+        self._as_floats = scalar and backend == 'numpy'
+
+    def run(self, previous_population, time_vector):
+        """
+        :param previous_population: population vector, laid out as for the model's run()
+        :param time_vector: time (unused, the models are autonomous)
+        :return: the derivatives, in a buffer that is overwritten by the next call
+        """
+        if self._as_floats:
+            self._kernel(previous_population.tolist(), self._out, *self._args)
+        else:
+            self._kernel(np.asarray(previous_population, dtype=float), self._out, *self._args)
+        return self._out
+
+    def jacobian(self, previous_population, time_vector):
+        return self.model.jacobian(previous_population, time_vector)
+
+
+def compile_model(model, backend='auto'):
+    """
+    :param model: model instance from sir_models
+    :param backend: 'numba', 'numpy' or 'auto'
+    :return: CompiledModel
+    """
+
+    return CompiledModel(model, backend=backend)
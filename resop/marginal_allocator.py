@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Greedy allocation of the budget of an InterventionPlanMultiPatch model by marginal return, for a good plan in a
+fraction of a second rather than an optimal one from the solver:
+
+    solution = MarginalAllocator(optimiser).allocate()
+
+The solution has the layout of InterventionPlanMultiPatch.get_optimization_solution(), and can be passed back as the
+optimiser's warm_start to seed the MILP.
+
+Every (intervention, patch) pair moves between the coverage options tabulated by intervention_curves, from its cheapest
+one upwards. The next move of a pair is the option with the largest log R0 reduction per extra dollar, weighted by the
+patch population, or part of the way to its next coverage breakpoint when no option fits in the budget left. All moves
+wait in one priority queue. The queue is lazy: a move is only re-priced when it comes to the top, and is put back if the
+budget left no longer allows it at that price. Since that budget only shrinks, a move that keeps its price at the top is
+the best one left.
+
+The minimum intervention and patch budgets are met first, by the same queue restricted to the pairs of the budgets still
+short and with moves capped at the shortfall; then the remaining budget goes to the moves of best return until none is
+left that fits. A patch whose R0 floor stops its moves before its minimum budget is met is started again from its
+cheapest options and filled with the moves reducing R0 the least per dollar (e.g. a fixed cost, or coverage of an
+intervention with little efficacy there) instead. allocate() raises a ValueError if a minimum budget is still not met.
+"""
+
+import heapq
+
+import numpy as np
+
+from .intervention_curves import InterventionCurves
+from .multi_patch_optimizers import InterventionPlanMultiPatch
+
+
+class MarginalAllocator(object):
+    """
+    Greedy plan for the model built by InterventionPlanMultiPatch.build_model(), on the same data
+    """
+
+    def __init__(self, optimiser):
+        """
+
+        :param optimiser: InterventionPlanMultiPatch (its model is never built)
+        """
+        self.patches = optimiser.patches
+        self.config = optimiser.config
+
+        data = optimiser.optimization_data()
+        num_interventions = self.config['num_interventions']
+        self.curves = InterventionCurves.from_data(data, self.config)
+        self.population = data['population']
+        # lower bounds of var_R0, as in build_model(), and of max_var, which is also above every var_R0 floor
+        self.r0_floor = np.log(0.9) - np.log(data['beta'] * data['gamma'])
+        self.max_r0_floor = self.r0_floor.max()
+        self.budget = float(self.config['total_budget'])
+        self.minimum_patch_budget = data['minimum_patch_budget']
+        self.minimum_intervention_budget = np.array(self.config['minimum_intervention_budget'][:num_interventions],
+                                                    dtype=float)
+        self.maximum_intervention_budget = np.array(self.config['maximum_intervention_budget'][:num_interventions],
+                                                    dtype=float)
+        self.tolerance = 1e-9 * max(self.budget, 1.0)
+
+        self.choice = None
+        self.coverage = None
+        self.spend = None
+        self.log_reduction = None
+        self.partial = None
+        self.var_r0 = None
+        self.intervention_spend = None
+        self.patch_spend = None
+
+    def _reset(self):
+        """
+        Start every pair at its cheapest option
+        """
+        curves = self.curves
+        self.choice = np.argmin(np.where(curves.feasible, curves.cost, np.inf), axis=-1)
+        self.coverage, self.log_reduction, self.spend, _ = curves.select(self.choice)
+        self.partial = np.zeros(self.choice.shape, dtype=bool)
+        self.var_r0 = self.log_reduction.sum(axis=0)
+        self.intervention_spend = self.spend.sum(axis=1)
+        self.patch_spend = self.spend.sum(axis=0)
+
+    def _room(self, i):
+        """
+        :return: largest extra spend intervention i may take
+        """
+        return min(self.budget - self.intervention_spend.sum(),
+                   self.maximum_intervention_budget[i] - self.intervention_spend[i])
+
+    def _toward(self, i, p, end, change, gain, limit):
+        """
+        Move of a pair towards option end, as far as the budget and the R0 floor allow
+
+        :param change: extra spend to reach end
+        :param gain: log R0 reduction to reach end
+        :param limit: largest extra spend
+        :return: (return per dollar, option, fraction of the way to it) or None
+        """
+        fraction = min(1.0, limit / change)
+        if gain > 0:
+            fraction = min(fraction, (self.var_r0[p] - self.r0_floor[p]) / gain)
+        if fraction * change <= self.tolerance:
+            return None
+        return self.population[p] * gain / change, end, fraction
+
+    def _best_move(self, i, p, reducing, need=np.inf, fill=False):
+        """
+        Best next move of a pair within the budget left: to one of its options, or part of the way to its next coverage
+        breakpoint when no option fits (the log R0 reduction and spend are linear in between). A pair left part of the
+        way can only continue to that breakpoint.
+
+        :param reducing: whether the move must reduce R0 (else it may only add spend, to meet a minimum budget)
+        :param need: largest extra spend wanted
+        :param fill: prefer the moves reducing R0 the least per dollar, and when none fits within need, take the
+        cheapest option beyond it (to meet a minimum budget of a patch whose R0 floor binds)
+        :return: (return per dollar, option, fraction of the way to it) or None; the return is negated when filling
+        """
+        curves = self.curves
+        q = self.choice[i, p]
+        sign = -1.0 if fill else 1.0
+        room = self._room(i)
+        limit = min(room, need)
+        if limit <= self.tolerance:
+            return None
+        if self.partial[i, p]:
+            move = self._toward(i, p, q, curves.cost[i, p, q] - self.spend[i, p],
+                                self.log_reduction[i, p] - curves.log_reduction[i, p, q], limit)
+            return None if move is None else (sign * move[0],) + move[1:]
+
+        change = curves.cost[i, p] - curves.cost[i, p, q]
+        gain = curves.log_reduction[i, p, q] - curves.log_reduction[i, p]
+        allowed = (change > self.tolerance) & ((gain > 0) if reducing else (gain >= 0))
+        ratio = np.where(allowed, sign * self.population[p] * gain / np.where(allowed, change, 1.0), -np.inf)
+
+        within_floor = allowed & curves.feasible[i, p] & (self.var_r0[p] - gain >= self.r0_floor[p] - 1e-9)
+        fits = within_floor & (change <= limit + self.tolerance)
+        move = None
+        if fits.any():
+            best = int(np.argmax(np.where(fits, ratio, -np.inf)))
+            move = (ratio[best], best, 1.0)
+
+        # the next breakpoint with the same fixed cost; an option beyond the total budget still ends a segment whose
+        # start is affordable
+        ahead = (curves.alpha[i, p] == curves.alpha[i, p, q]) & (curves.coverage[i, p] > curves.coverage[i, p, q])
+        if ahead.any():
+            end = int(np.argmax(ahead))
+            if allowed[end] and (move is None or ratio[end] > move[0]):
+                toward = self._toward(i, p, end, change[end], gain[end], limit)
+                if toward is not None:
+                    move = (sign * toward[0],) + toward[1:]
+
+        # a minimum budget is a lower bound: spend beyond the need rather than not meet it
+        beyond = within_floor & (change <= room + self.tolerance)
+        if move is None and fill and beyond.any():
+            best = int(np.argmin(np.where(beyond, change, np.inf)))
+            move = (ratio[best], best, 1.0)
+        return move
+
+    def _move(self, i, p, q, fraction):
+        """
+        Move a pair a fraction of the way to option q
+        """
+        curves = self.curves
+        coverage = self.coverage[i, p] + fraction * (curves.coverage[i, p, q] - self.coverage[i, p])
+        log_reduction = self.log_reduction[i, p] + fraction * (curves.log_reduction[i, p, q] - self.log_reduction[i, p])
+        spend = self.spend[i, p] + fraction * (curves.cost[i, p, q] - self.spend[i, p])
+
+        self.var_r0[p] += log_reduction - self.log_reduction[i, p]
+        self.intervention_spend[i] += spend - self.spend[i, p]
+        self.patch_spend[p] += spend - self.spend[i, p]
+        self.coverage[i, p], self.log_reduction[i, p], self.spend[i, p] = coverage, log_reduction, spend
+        self.choice[i, p] = q
+        self.partial[i, p] = fraction < 1.0
+
+    def _greedy(self, pairs, reducing, need=None, fill=False):
+        """
+        Apply the best moves of the pairs until none fits
+
+        :param pairs: iterable of (intervention, patch)
+        :param reducing: see _best_move()
+        :param need: function (intervention, patch) -> largest extra spend the pair should take, None for no limit
+        :param fill: see _best_move()
+        """
+        def best_move(i, p):
+            return self._best_move(i, p, reducing, np.inf if need is None else need(i, p), fill)
+
+        queue = []
+        for i, p in pairs:
+            move = best_move(i, p)
+            if move is not None:
+                queue.append((-move[0], i, p) + move[1:])
+        heapq.heapify(queue)
+
+        while queue:
+            ratio, i, p, q, fraction = heapq.heappop(queue)
+            # re-price the move: the budget left may have shrunk since it was queued
+            move = best_move(i, p)
+            if move is None:
+                continue
+            if (move[1], move[2]) != (q, fraction) or -move[0] > ratio + 1e-12 * abs(ratio):
+                heapq.heappush(queue, (-move[0], i, p) + move[1:])
+                continue
+            self._move(i, p, q, fraction)
+            move = best_move(i, p)
+            if move is not None:
+                heapq.heappush(queue, (-move[0], i, p) + move[1:])
+
+    def _restart(self, patches):
+        """
+        Move every pair of the patches back to its cheapest option
+        """
+        curves = self.curves
+        cheapest = np.argmin(np.where(curves.feasible[:, patches], curves.cost[:, patches], np.inf), axis=-1)
+        for i, p in np.ndindex(*cheapest.shape):
+            self._move(i, patches[p], cheapest[i, p], 1.0)
+
+    def _short(self):
+        """
+        :return: (interventions, patches) whose spend is below their minimum budget, index arrays
+        """
+        return (np.flatnonzero(self.intervention_spend < self.minimum_intervention_budget - self.tolerance),
+                np.flatnonzero(self.patch_spend < self.minimum_patch_budget - self.tolerance))
+
+    def _meet_minimum_budgets(self):
+        """
+        Raise spend to the minimum intervention and patch budgets, by the moves of best return, or for the patches where
+        the R0 floor stops those, from their cheapest options by the moves reducing R0 the least
+        """
+        num_interventions, num_patches, _ = self.curves.shape()
+
+        def intervention_need(i, p):
+            return self.minimum_intervention_budget[i] - self.intervention_spend[i]
+
+        def patch_need(i, p):
+            return self.minimum_patch_budget[p] - self.patch_spend[p]
+
+        short, _ = self._short()
+        self._greedy([(i, p) for i in short for p in range(num_patches)], False, intervention_need)
+        _, short = self._short()
+        self._greedy([(i, p) for p in short for i in range(num_interventions)], False, patch_need)
+
+        _, short = self._short()
+        if len(short):
+            self._restart(short)
+            self._greedy([(i, p) for p in short for i in range(num_interventions)], False, patch_need, fill=True)
+            # the restart may have taken spend off interventions with a minimum budget
+            short, _ = self._short()
+            self._greedy([(i, p) for i in short for p in range(num_patches)], False, intervention_need)
+
+    def objective(self):
+        """
+        :return: MILP objective of the last plan from allocate()
+        """
+        return float(np.dot(self.population, self.var_r0) +
+                     self.population.sum() * max(self.var_r0.max(), self.max_r0_floor))
+
+    def allocate(self):
+        """
+        Compute the plan
+
+        :return: dict in the layout of InterventionPlanMultiPatch.get_optimization_solution()
+        :raises ValueError: if the plan does not meet every minimum budget (it would not be a valid warm start)
+        """
+        self._reset()
+        num_interventions, num_patches, _ = self.curves.shape()
+
+        self._meet_minimum_budgets()
+        short_interventions, short_patches = self._short()
+        if len(short_interventions) or len(short_patches):
+            raise ValueError('The greedy allocation does not meet the minimum budgets of interventions %s and '
+                             'patches %s' % (short_interventions.tolist(), short_patches.tolist()))
+
+        self._greedy([(i, p) for i in range(num_interventions) for p in range(num_patches)], True)
+
+        return InterventionPlanMultiPatch.solution_from_arrays(self.patches, self.config, self.spend, self.coverage,
+                                                               self.var_r0)
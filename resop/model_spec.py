@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Declarative compartmental models, compiled into a vectorized right-hand side and Jacobian over
+(patches x strata x compartments), e.g. age groups within patches linked by travel.
+
+A spec lists the compartments, the transitions between them (each with a per-capita rate, or the force of infection),
+how infection works (which compartments are infectious, the transmission rate, an optional contact matrix between
+strata and the functional form), optional births and deaths, and an optional mobility matrix between patches. As a
+dict (e.g. loaded from JSON):
+
+    {
+        "compartments": ["S", "E", "I", "R"],
+        "transitions": [
+            {"from": "S", "to": "E", "rate": "infection"},
+            {"from": "E", "to": "I", "rate": 0.2},
+            {"from": "I", "to": "R", "rate": 0.1}
+        ],
+        "infection": {"infectious": ["I"], "transmission": 0.25, "contact": [[2.0, 0.5], [0.5, 1.0]]},
+        "strata": 2
+    }
+
+Rates and the transmission rate may be scalars or arrays broadcastable to (patches, strata). spec_from_model()
+re-expresses SIRModel, SEIRModel, SIRSModel and GammaContactModel as specs.
+"""
+
+import numpy as np
+
+from .sir_models import (
+    SIRModel,
+    SEIRModel,
+    SIRSModel,
+    GammaContactModel
+)
+
+__has_scipy__ = True
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    __has_scipy__ = False
+
+INFECTION = 'infection'
+FORMS = ('mass_action', 'log')
+
+
+def _is_infection(rate):
+    return isinstance(rate, str) and rate == INFECTION
+
+
+class ModelSpec(object):
+    """
+    Declarative description of a compartmental model over patches and strata
+    """
+
+    def __init__(self, compartments, transitions, infection=None, population=None, births=None, deaths=None,
+                 mobility=None, mobile=None, patches=1, strata=1):
+        """
+
+        :param compartments: list of compartment names
+        :param transitions: list of dicts with "from", "to", "rate" (per capita, or "infection" for the force of
+        infection) and optionally "counter", a compartment that also accumulates the flow (e.g. cumulative infections)
+        :param infection: dict with "infectious" (list of compartment names, or dict of name to infectiousness weight),
+        "transmission", optionally "contact" (strata x strata matrix, rows infected by columns), "form" ("mass_action",
+        the default, for transmission * I / N, or "log" for shape * log(1 + transmission * I / (shape * N)) as in
+        GammaContactModel) and "shape"
+        :param population: compartments summed for the population N (defaults to all of them)
+        :param births: dict with "to" and "rate", births at rate * N
+        :param deaths: dict with "rate" and optionally "compartments" (defaults to the population compartments)
+        :param mobility: travel rates between patches [(rows "to"), (columns "from")], dense or scipy.sparse
+        :param mobile: compartments that travel (defaults to the population compartments)
+        :param patches: number of patches
+        :param strata: number of strata within each patch
+        """
+        self.compartments = list(compartments)
+        self.transitions = [dict(transition) for transition in transitions]
+        self.infection = dict(infection) if infection is not None else None
+        self.population = list(population) if population is not None else list(self.compartments)
+        self.births = dict(births) if births is not None else None
+        self.deaths = dict(deaths) if deaths is not None else None
+        self.mobility = mobility
+        self.mobile = list(mobile) if mobile is not None else list(self.population)
+        self.patches = int(patches)
+        self.strata = int(strata)
+
+        for transition in self.transitions:
+            names = [transition['from'], transition['to']] + ([transition['counter']] if transition.get('counter')
+                                                              else [])
+            self._check_names(names, 'transition')
+            if _is_infection(transition['rate']) and self.infection is None:
+                raise ValueError('Transition %s -> %s uses the force of infection, but the spec has no "infection"'
+                                 % (transition['from'], transition['to']))
+        self._check_names(self.population, 'population')
+        self._check_names(self.mobile, 'mobile')
+        if self.infection is not None:
+            self._check_names(list(self.infection['infectious']), 'infectious')
+            if self.infection.get('form', 'mass_action') not in FORMS:
+                raise ValueError('Unknown infection form "%s", expected one of %s'
+                                 % (self.infection['form'], ', '.join(FORMS)))
+
+    def _check_names(self, names, where):
+        unknown = [name for name in names if name not in self.compartments]
+        if unknown:
+            raise ValueError('Unknown compartment(s) %s in %s' % (', '.join(unknown), where))
+
+    @classmethod
+    def from_dict(cls, spec):
+        """
+        :param spec: dict with the constructor's arguments as keys (e.g. loaded from JSON)
+        :return: ModelSpec
+        """
+        return cls(**spec)
+
+    def compile(self, sparse_jacobian=None):
+        """
+        :param sparse_jacobian: return the Jacobian as scipy.sparse (defaults to sparse when there is more than one
+        patch or stratum)
+        :return: CompiledSpecModel
+        """
+        return CompiledSpecModel(self, sparse_jacobian=sparse_jacobian)
+
+
+class CompiledSpecModel(object):
+    """
+    A ModelSpec compiled into array operations. The state is the flattened (patches, strata, compartments) array;
+    run() and jacobian() have the same call signatures as the models in sir_models.
+    """
+
+    def __init__(self, spec, sparse_jacobian=None):
+        """
+
+        :param spec: ModelSpec
+        :param sparse_jacobian: return the Jacobian as scipy.sparse (defaults to sparse when there is more than one
+        patch or stratum)
+        """
+        self.spec = spec
+        self.shape = (spec.patches, spec.strata, len(spec.compartments))
+        self.size = int(np.prod(self.shape))
+        if sparse_jacobian is None:
+            sparse_jacobian = spec.patches * spec.strata > 1
+        if sparse_jacobian and not __has_scipy__:
+            raise ImportError('"scipy" package not present - sparse Jacobians disabled')
+        self.sparse_jacobian = sparse_jacobian
+
+        index = {name: position for position, name in enumerate(spec.compartments)}
+        cells = (spec.patches, spec.strata)
+        num_compartments = len(spec.compartments)
+
+        # transitions: source, target and counter indices, per-capita rates broadcast to (patches, strata)
+        self._source = np.array([index[transition['from']] for transition in spec.transitions], dtype=int)
+        self._target = np.array([index[transition['to']] for transition in spec.transitions], dtype=int)
+        self._counter = np.array([index[transition['counter']] if transition.get('counter') else -1
+                                  for transition in spec.transitions], dtype=int)
+        self._infected = np.array([_is_infection(transition['rate']) for transition in spec.transitions], dtype=bool)
+        self._rates = np.zeros(cells + (len(spec.transitions),))
+        for position, transition in enumerate(spec.transitions):
+            if not self._infected[position]:
+                self._rates[..., position] = np.broadcast_to(np.asarray(transition['rate'], dtype=float), cells)
+        self._current_rates = self._rates.copy()  # rates with the force of infection filled in, reused by run()
+
+        # stoichiometry (transitions x compartments): the change in each compartment per unit of flow
+        self._stoichiometry = np.zeros((len(spec.transitions), num_compartments))
+        transition_index = np.arange(len(spec.transitions))
+        np.add.at(self._stoichiometry, (transition_index, self._source), -1.0)
+        np.add.at(self._stoichiometry, (transition_index, self._target), 1.0)
+        counted = self._counter >= 0
+        np.add.at(self._stoichiometry, (transition_index[counted], self._counter[counted]), 1.0)
+
+        self._population = np.zeros(num_compartments)
+        self._population[[index[name] for name in spec.population]] = 1.0
+
+        # infection: infectiousness weights, transmission (patches, strata), contact (strata, strata)
+        self._weights = np.zeros(num_compartments)
+        if spec.infection is not None:
+            infectious = spec.infection['infectious']
+            weights = infectious if isinstance(infectious, dict) else dict((name, 1.0) for name in infectious)
+            for name, weight in weights.items():
+                self._weights[index[name]] = weight
+            self._transmission = np.broadcast_to(np.asarray(spec.infection['transmission'], dtype=float), cells)
+            contact = spec.infection.get('contact')
+            self._contact = np.eye(spec.strata) if contact is None else np.asarray(contact, dtype=float)
+            self._log_form = spec.infection.get('form', 'mass_action') == 'log'
+            self._shape = float(spec.infection.get('shape', 1.0))
+
+        self._births = None
+        if spec.births is not None:
+            self._births = (index[spec.births['to']],
+                            np.broadcast_to(np.asarray(spec.births['rate'], dtype=float), cells))
+        self._deaths = np.zeros(cells + (num_compartments,))
+        if spec.deaths is not None:
+            dying = [index[name] for name in spec.deaths.get('compartments', spec.population)]
+            self._deaths[..., dying] = np.broadcast_to(np.asarray(spec.deaths['rate'], dtype=float),
+                                                       cells)[..., np.newaxis]
+
+        # net migration operator (travel minus departures) acting on the mobile compartments
+        self._migration = None
+        self._mobile = np.array([index[name] for name in spec.mobile], dtype=int)
+        if spec.mobility is not None:
+            mobility = spec.mobility
+            if __has_scipy__ and sparse.issparse(mobility):
+                mobility = sparse.csr_matrix(mobility, dtype=float)
+                leaving = np.asarray(mobility.sum(axis=0)).ravel()
+                self._migration = (mobility - sparse.diags(leaving)).tocsr()
+            else:
+                mobility = np.asarray(mobility, dtype=float)
+                self._migration = mobility - np.diag(mobility.sum(axis=0))
+
+    def _force(self, state):
+        """
+        :return: (force of infection, mass-action pressure, population), arrays (patches, strata)
+        """
+        population = state.dot(self._population)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prevalence = np.where(population > 0, state.dot(self._weights) / population, 0.0)
+        pressure = self._transmission * prevalence.dot(self._contact.T)
+        if self._log_form:
+            return self._shape * np.log1p(pressure / self._shape), pressure, population
+        return pressure, pressure, population
+
+    def run(self, previous_population, time_vector):
+        """
+        call for ode solver, e.g. "populations = scint.odeint(compiled.run, initial_conditions.ravel(), timespan)"
+        :param previous_population: (flattened) array of shape (patches, strata, compartments)
+        :param time_vector: time (unused, the model is autonomous)
+        :return: the flattened derivatives
+        """
+        state = np.reshape(previous_population, self.shape)
+        rates = self._current_rates
+        population = None
+        if self._infected.any():
+            force, _, population = self._force(state)
+            rates[..., self._infected] = force[..., np.newaxis]
+
+        flows = rates * state[..., self._source]
+        d_pop = flows.dot(self._stoichiometry)
+        d_pop -= self._deaths * state
+        if self._births is not None:
+            if population is None:
+                population = state.dot(self._population)
+            d_pop[..., self._births[0]] += self._births[1] * population
+
+        if self._migration is not None:
+            mobile = state[:, :, self._mobile].reshape(self.shape[0], -1)
+            d_pop[:, :, self._mobile] += self._migration.dot(mobile).reshape(self.shape[0], self.shape[1], -1)
+
+        return d_pop.ravel()
+
+    def jacobian(self, previous_population, time_vector):
+        """
+        Analytic Jacobian of run()
+        :param previous_population: (flattened) array of shape (patches, strata, compartments)
+        :param time_vector: time (unused, the model is autonomous)
+        :return: (patches * strata * compartments) square matrix, scipy.sparse if sparse_jacobian, dense otherwise
+        """
+        state = np.reshape(previous_population, self.shape)
+        patches, strata, num_compartments = self.shape
+        cell = (np.arange(patches)[:, np.newaxis] * strata + np.arange(strata)) * num_compartments  # (P, G)
+        rows, columns, values = [], [], []
+
+        def add(row, column, value):
+            row, column, value = np.broadcast_arrays(row, column, value)
+            rows.append(row.ravel())
+            columns.append(column.ravel())
+            values.append(value.ravel())
+
+        # linear transitions: flow = rate * source, moving from source to target (and into the counter)
+        linear = np.nonzero(~self._infected)[0]
+        for position in linear:
+            source = cell + self._source[position]
+            rate = self._rates[..., position]
+            add(source, source, -rate)
+            add(cell + self._target[position], source, rate)
+            if self._counter[position] >= 0:
+                add(cell + self._counter[position], source, rate)
+
+        infected = np.nonzero(self._infected)[0]
+        if infected.size:
+            force, pressure, population = self._force(state)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                inverse = np.where(population > 0, 1.0 / population, 0.0)
+                prevalence = state.dot(self._weights) * inverse
+            # d(prevalence[p, h]) / d(state[p, h, c]), shape (P, G, K)
+            d_prevalence = (self._weights * inverse[..., np.newaxis] -
+                            (prevalence * inverse)[..., np.newaxis] * self._population)
+            d_force = 1.0 / (1.0 + pressure / self._shape) if self._log_form else np.ones(pressure.shape)
+            # d(force[p, g]) / d(state[p, h, c]), shape (P, G, G, K)
+            d_force_state = ((d_force * self._transmission)[:, :, np.newaxis, np.newaxis] *
+                             self._contact[np.newaxis, :, :, np.newaxis] * d_prevalence[:, np.newaxis, :, :])
+            other = cell[:, np.newaxis, :, np.newaxis] + np.arange(num_compartments)  # (P, 1, G, K)
+
+            for position in infected:
+                source = cell + self._source[position]
+                susceptible = state[..., self._source[position]]
+                d_flow = susceptible[:, :, np.newaxis, np.newaxis] * d_force_state
+                moved = [(self._source[position], -1.0), (self._target[position], 1.0)]
+                if self._counter[position] >= 0:
+                    moved.append((self._counter[position], 1.0))
+                for compartment, sign in moved:
+                    add(cell + compartment, source, sign * force)
+                    add((cell + compartment)[:, :, np.newaxis, np.newaxis], other, sign * d_flow)
+
+        diagonal = cell[..., np.newaxis] + np.arange(num_compartments)
+        add(diagonal, diagonal, -self._deaths)
+        if self._births is not None:
+            target = cell + self._births[0]
+            add(target[..., np.newaxis], diagonal, self._births[1][..., np.newaxis] * self._population)
+
+        rows, columns, values = np.concatenate(rows), np.concatenate(columns), np.concatenate(values)
+        if self.sparse_jacobian:
+            jac = sparse.coo_matrix((values, (rows, columns)), shape=(self.size, self.size)).tocsr()
+            if self._migration is not None:
+                jac = jac + sparse.kron(self._migration, self._moving_block(sparse_block=True)).tocsr()
+            return jac
+
+        jac = np.zeros((self.size, self.size))
+        np.add.at(jac, (rows, columns), values)
+        if self._migration is not None:
+            migration = self._migration.toarray() if hasattr(self._migration, 'toarray') else self._migration
+            jac += np.kron(migration, self._moving_block(sparse_block=False))
+        return jac
+
+    def _moving_block(self, sparse_block):
+        """
+        (strata * compartments) diagonal block selecting the mobile compartments of every stratum
+        """
+        moving = np.zeros(len(self.spec.compartments))
+        moving[self._mobile] = 1.0
+        diagonal = np.tile(moving, self.shape[1])
+        return sparse.diags(diagonal) if sparse_block else np.diag(diagonal)
+
+
+def _sir_spec(model):
+    return ModelSpec(compartments=['S', 'I', 'R'],
+                     transitions=[{'from': 'S', 'to': 'I', 'rate': INFECTION},
+                                  {'from': 'I', 'to': 'R', 'rate': 1.0 / model.infectious_period}],
+                     infection={'infectious': ['I'], 'transmission': model.transmission})
+
+
+def _seir_spec(model):
+    return ModelSpec(compartments=['S', 'E', 'I', 'R'],
+                     transitions=[{'from': 'S', 'to': 'E', 'rate': INFECTION},
+                                  {'from': 'E', 'to': 'I', 'rate': 1.0 / model.incubation_period},
+                                  {'from': 'I', 'to': 'R', 'rate': 1.0 / model.infectious_period}],
+                     infection={'infectious': ['I'], 'transmission': model.transmission})
+
+
+def _sirs_spec(model):
+    # the fourth compartment counts infections, and (as in SIRSModel.run) is part of the population sum
+    return ModelSpec(compartments=['S', 'I', 'R', 'C'],
+                     transitions=[{'from': 'S', 'to': 'I', 'rate': INFECTION, 'counter': 'C'},
+                                  {'from': 'I', 'to': 'R', 'rate': 1.0 / model.infectious_period},
+                                  {'from': 'R', 'to': 'S', 'rate': model.waning_immunity}],
+                     infection={'infectious': ['I'], 'transmission': model.transmission})
+
+
+def _gamma_contact_spec(model):
+    return ModelSpec(compartments=['S', 'E', 'I', 'R'],
+                     transitions=[{'from': 'S', 'to': 'E', 'rate': INFECTION},
+                                  {'from': 'E', 'to': 'I', 'rate': 1.0 / model.incubation_period},
+                                  {'from': 'I', 'to': 'R', 'rate': 1.0 / model.infectious_period}],
+                     infection={'infectious': ['I'], 'transmission': model.transmission, 'form': 'log',
+                                'shape': model.shape},
+                     births={'to': 'S', 'rate': model.birth},
+                     deaths={'rate': model.death})
+
+
+_SPECS = {
+    SIRModel: _sir_spec,
+    SEIRModel: _seir_spec,
+    SIRSModel: _sirs_spec,
+    GammaContactModel: _gamma_contact_spec,
+}
+
+
+def spec_from_model(model):
+    """
+    :param model: SIRModel, SEIRModel, SIRSModel or GammaContactModel instance
+    :return: ModelSpec with the same equations (and compartment order) as the model
+    """
+    if type(model) not in _SPECS:
+        raise ValueError('No spec available for model type %s' % type(model).__name__)
+
+    return _SPECS[type(model)](model)
@@ -25,11 +25,65 @@ from __future__ import unicode_literals
 from __future__ import division
 from future.utils import raise_with_traceback
 from docplex.mp.model import Model
+from docplex.mp.solution import SolveSolution
 import numpy as np
+try:
+    from docplex.mp.constants import WriteLevel
+except ImportError:
+    # older docplex versions keep every variable of a MIP start
+    WriteLevel = None
+
+from . import data_consts
+
+from .presolve import presolve
+from .run_stats import RunStats
+from .solver_backends import (
+    SolverBackend,
+    make_backend
+)
+
+# piecewise-linear encodings: adjacency binaries per breakpoint, solver-native SOS2 sets, or logarithmic (Gray code)
+FORMULATIONS = ('binary', 'sos2', 'log')
+
+
+def _log_sos2_sets(num_points):
+    """
+    Logarithmic SOS2 encoding (Vielma and Nemhauser): segment s, between breakpoints s and s+1, is selected by the
+    binary reflected Gray code of s on ceil(log2(segments)) bits. A breakpoint may be nonzero only if every bit agrees
+    with the codes of all segments it lies on.
+
+    :param num_points: number of breakpoints
+    :return: (number of bits, for each bit the breakpoints that need it set, for each bit the breakpoints that need it
+    cleared)
+    """
+    segments = num_points - 1
+    bits = int(np.ceil(np.log2(segments))) if segments > 1 else 0
+    codes = [[((s ^ (s >> 1)) >> b) & 1 for b in range(bits)] for s in range(segments)]
+    on_segments = [[s for s in (j - 1, j) if 0 <= s < segments] for j in range(num_points)]
+
+    ones = [[j for j in range(num_points) if all(codes[s][b] == 1 for s in on_segments[j])] for b in range(bits)]
+    zeros = [[j for j in range(num_points) if all(codes[s][b] == 0 for s in on_segments[j])] for b in range(bits)]
+    return bits, ones, zeros
+
+
+def add_mip_start(model, start):
+    """
+    Add a solution of model, with values for all of its variables, as a MIP start
+
+    :param model: docplex model
+    :param start: docplex SolveSolution, e.g. model.solution after a solve
+    """
+    if WriteLevel is None:
+        model.add_mip_start(start)
+    else:
+        # by default only the discrete variables would be kept
+        model.add_mip_start(start, write_level=WriteLevel.AllVars)
 
 
 class InterventionPlanMultiPatch(object):
-    def __init__(self, docloud_url, docloud_client_id, config, patches):
+    def __init__(self, docloud_url, docloud_client_id, config, patches, ignore_names=False, solver=None,
+                 formulation='binary', warm_start=None, presolve=False, time_limit=None, mip_gap=None, node_limit=None,
+                 on_incumbent=None, verbose=False):
         """
         Class constructor
 
@@ -37,13 +91,46 @@ class InterventionPlanMultiPatch(object):
         :param docloud_client_id: DOCloud REST API client id/key
         :param config: object containing global configuration values
         :param patches: Array of patch entries
+        :param ignore_names: build models without variable and constraint names, which is faster for large instances
+        :param solver: SolverBackend instance, or backend name ('docloud', 'cplex' or 'highs'); by default DOCloud when
+        docloud_url is given, else local CPLEX when installed, else HiGHS
+        :param formulation: encoding of the piecewise-linear R0 and cost curves: 'binary' (one binary per breakpoint),
+        'sos2' (SOS2 sets, not supported by HiGHS) or 'log' (logarithmic, ceil(log2(pieces)) binaries per curve)
+        :param warm_start: prior plan passed to the solver as a MIP start: the dict from get_optimization_solution(), or
+        a stored result in the layout of DataFromOpt.result_as_dict()
+        :param presolve: fix or remove the variables of (intervention, patch) pairs that cannot change the objective,
+        and cut the piecewise-linear curves to the coverage the budgets allow, before the model is built (see
+        presolve.py)
+        :param time_limit: seconds before run() stops the solve and returns the best plan found (None for no limit)
+        :param mip_gap: relative MIP gap at which run() stops the solve (None for the solver's default)
+        :param node_limit: number of branch-and-bound nodes after which run() stops the solve (None for no limit)
+        :param on_incumbent: function called by run() with every improving plan the solver finds, as the dict from
+        get_optimization_solution(); local CPLEX reports each incumbent as it is found, the other backends only the
+        final plan
+        :param verbose: print the model data, and the presolve report, when building the model
         """
+        if formulation not in FORMULATIONS:
+            raise ValueError('Unknown formulation "%s", expected one of %s' % (formulation, ', '.join(FORMULATIONS)))
+
         self.name = None
 
         self._docloud_url = docloud_url
         self._docloud_client_id = docloud_client_id
 
         self.config = config
+        self.ignore_names = ignore_names
+
+        self.solver = solver
+        self.formulation = formulation
+        self.warm_start = warm_start
+        self.presolve = presolve
+        self.time_limit = time_limit
+        self.mip_gap = mip_gap
+        self.node_limit = node_limit
+        self.on_incumbent = on_incumbent
+        self.verbose = verbose
+        #: RunStats of the last model built, see run_stats.py
+        self.stats = None
 
         assert patches and len(patches) > 0
 
@@ -58,246 +145,518 @@ class InterventionPlanMultiPatch(object):
         else:
             return self.__class__.__name__
 
+    def solver_backend(self):
+        """
+        :return: the SolverBackend used by run()
+        """
+        if isinstance(self.solver, SolverBackend):
+            return self.solver
+        return make_backend(self.solver, self._docloud_url, self._docloud_client_id)
+
     def run(self):
         """
 
-        :return: The patch entry and its associated optimization solution
+        :return: The patch entry and its associated optimization solution (the best one found within the limits)
         """
 
         patches, config, patch_model = self.build_model()
 
+        on_incumbent = None
+        if self.on_incumbent is not None:
+            def on_incumbent(model_solution):
+                self.on_incumbent(self.get_optimization_solution(patches, config, patch_model,
+                                                                 model_solution=model_solution))
+
         # Run the solver on this patch model
-        if not patch_model.solve(url=self._docloud_url, key=self._docloud_client_id):
+        backend = self.solver_backend()
+        with patch_model.run_stats.phase('solve'):
+            solved = backend.solve(patch_model, time_limit=self.time_limit, mip_gap=self.mip_gap,
+                                   node_limit=self.node_limit, on_incumbent=on_incumbent)
+        patch_model.run_stats.record_solve(backend, solved)
+        if not solved:
             raise_with_traceback(ValueError('Error solving model'))
 
         return patches, config, patch_model
 
+    def optimization_data(self):
+        """
+        Convert the patch entries to optimisation data
+
+        :return: dict of arrays: 'population', 'beta', 'gamma' and 'minimum_patch_budget' [patches], 'efficacy_beta' and
+        'efficacy_gamma' [patches, interventions], 'threshold_coverage' and 'threshold_cost' [patches, interventions,
+        phases]. Only the config's num_interventions interventions are kept; the number of cost phases is the number of
+        interventions in the patch data.
+        """
+        entries = [self.patches[patch] for patch in self.patches.keys()]
+        num_interventions = self.config['num_interventions']
+        num_phases = len(entries[0]['threshold_coverage'])
+
+        data = {
+            'population': np.array([entry['population'] for entry in entries], dtype=float),
+            'beta': np.array([entry['Beta'] for entry in entries], dtype=float),
+            'gamma': np.array([entry['Gamma'] for entry in entries], dtype=float),
+            'minimum_patch_budget': np.array([entry['minimum_patch_budget'] for entry in entries], dtype=float),
+            'threshold_coverage': np.array([entry['threshold_coverage'] for entry in entries],
+                                           dtype=float)[:, :num_interventions, :num_phases],
+            'threshold_cost': np.array([entry['threshold_costs'] for entry in entries],
+                                       dtype=float)[:, :num_interventions, :num_phases],
+            'efficacy_beta': np.array([entry['efficacyBeta'] for entry in entries],
+                                      dtype=float)[:, :num_interventions],
+            'efficacy_gamma': np.array([entry['efficacyGamma'] for entry in entries],
+                                       dtype=float)[:, :num_interventions]
+        }
+
+        for x in range(1, 8):
+            data['beta'][2*x] = data['beta'][2*x] + 0.5
+            data['gamma'][3*x] = data['gamma'][3*x]-1
+
+        return data
+
+    @staticmethod
+    def _var_array(variables, shape):
+        """
+        :return: object array of docplex variables, indexed as [i][p][j] like nested lists, or as [i, p, j]
+        """
+        array = np.empty(len(variables), dtype=object)
+        array[:] = variables
+        return array.reshape(shape)
+
+    def _names(self, pattern, shape):
+        """
+        :return: pattern formatted with every index of shape, or None when names are ignored
+        """
+        if self.ignore_names:
+            return None
+        return [pattern % index for index in np.ndindex(*shape)]
+
+    def _masked_var_array(self, create, mask, pattern, **bounds):
+        """
+        Variables for the true entries of mask, created in bulk
+
+        :param create: e.g. model.continuous_var_list
+        :param mask: bool array of the variables' shape
+        :return: object array of mask's shape, with None where mask is false
+        """
+        names = self._names(pattern, mask.shape)
+        if names is not None:
+            names = [name for name, kept in zip(names, mask.ravel()) if kept]
+        array = np.empty(mask.shape, dtype=object)
+        array[mask] = self._var_array(create(int(mask.sum()), name=names, **bounds), (int(mask.sum()),))
+        return array
+
+    def _piecewise_binaries(self, model, mask, pattern):
+        """
+        Binary variables of the piecewise-linear encoding of weights: one per breakpoint for 'binary', one per bit of
+        the segment code for 'log', none for 'sos2'
+
+        :param mask: which binaries to create, array [interventions, patches, breakpoints or bits] (see
+        PresolveReport.lambda_mask())
+        :return: object array of mask's shape, or None
+        """
+        if self.formulation == 'sos2':
+            return None
+        return self._masked_var_array(model.binary_var_list, mask, pattern)
+
+    def _add_sos2(self, model, weights, binaries, pairs, points):
+        """
+        Allow at most two adjacent nonzero weights along the last axis, with SOS2 sets or the logarithmic encoding
+
+        :param weights: object array of variables [interventions, patches, points]
+        :param binaries: object array from _piecewise_binaries()
+        :param pairs: (intervention, patch) index pairs
+        :param points: number of breakpoints of every pair, array [interventions, patches]
+        """
+        if self.formulation == 'sos2':
+            for i, p in pairs:
+                model.add_sos2(weights[i, p, :points[i, p]].tolist())
+            return
+
+        sets = {n: _log_sos2_sets(n) for n in set(points[i, p] for i, p in pairs)}
+        model.add_constraints([model.sum(weights[i, p, sets[points[i, p]][1][b]].tolist()) <= binaries[i, p, b]
+                               for i, p in pairs for b in range(sets[points[i, p]][0])])
+        model.add_constraints([model.sum(weights[i, p, sets[points[i, p]][2][b]].tolist()) <= 1 - binaries[i, p, b]
+                               for i, p in pairs for b in range(sets[points[i, p]][0])])
+
     def build_model(self):
         """
-        Builds an optimization model for the specified patch entry
+        Builds an optimization model for the specified patch entry. Variables are created in bulk and kept in object
+        arrays of shape [interventions, patches(, points or phases)], and constraint coefficients are computed as arrays
+        before the constraints are added.
 
         :return:
         """
+        stats = RunStats(patches=len(self.patches), interventions=self.config['num_interventions'],
+                         pieces=self.config['num_pieces'], formulation=self.formulation, presolve=self.presolve)
+        stats.start('load')
 
         '''
         Convert data to optimisation data
         '''
-        population = []
-        beta = []
-        gamma = []
-        minimum_patch_budget = []
-        threshold_coverage =[]
-        threshold_cost =[]
-        efficacy_beta = []
-        efficacy_gamma = []
-
-        for patch in self.patches.keys():
-            population.append(self.patches[patch]['population'])
-            beta.append(self.patches[patch]['Beta'])
-            gamma.append(self.patches[patch]['Gamma'])
-            minimum_patch_budget.append(self.patches[patch]['minimum_patch_budget'])
-            threshold_coverage.append(self.patches[patch]['threshold_coverage'])
-            threshold_cost.append(self.patches[patch]['threshold_costs'])
-            efficacy_beta.append(self.patches[patch]['efficacyBeta'])
-            efficacy_gamma.append(self.patches[patch]['efficacyGamma'])
-
-        for x in range(1, 8):
-            beta[2*x]=beta[2*x] + 0.5
-            gamma[3*x] = gamma[3*x]-1
-        print("beta = ", beta)
-        print("gamma", gamma)
-        print("R0-initials = ", np.multiply(beta, gamma))
-        print("efficacy_beta", efficacy_beta)
-        print("efficacy-gamma", efficacy_gamma)
-        print("population", population)
-        print("threshold cost", threshold_cost)
-
+        data = self.optimization_data()
+        stats.stop('load')
+        stats.start('build')
+        population = data['population']
+        beta = data['beta']
+        gamma = data['gamma']
+        minimum_patch_budget = data['minimum_patch_budget']
+        threshold_coverage = data['threshold_coverage']
+        threshold_cost = data['threshold_cost']
+        efficacy_beta = data['efficacy_beta']
+        efficacy_gamma = data['efficacy_gamma']
+
+        if self.verbose:
+            print("beta = ", beta.tolist())
+            print("gamma", gamma.tolist())
+            print("R0-initials = ", np.multiply(beta, gamma))
+            print("efficacy_beta", efficacy_beta.tolist())
+            print("efficacy-gamma", efficacy_gamma.tolist())
+            print("population", population.tolist())
+            print("threshold cost", threshold_cost.tolist())
 
         num_patches = len(self.patches)
-        num_phases = len(threshold_coverage[0])
+        num_phases = threshold_coverage.shape[-1]
         num_interventions = self.config['num_interventions']
         num_pieces = self.config['num_pieces']
         total_budget = self.config['total_budget']
 
-
-        minimim_intervention_budget= self.config['minimum_intervention_budget']
+        minimim_intervention_budget = self.config['minimum_intervention_budget']
         maximum_intervention_budget = self.config['maximum_intervention_budget']
 
+        # coverage breakpoints, and the log R0 reduction at each of them [patches, interventions, points]
+        c_points = np.arange(num_pieces + 1) / num_pieces
+        log_reduction = (np.log(1 - efficacy_beta[:, :, np.newaxis] * c_points) +
+                         np.log(1 - efficacy_gamma[:, :, np.newaxis] * c_points))
+
         '''
         Optimisation Model
         '''
 
-        model = Model('test_optimizer')
+        model = Model('test_optimizer', ignore_names=self.ignore_names)
 
         '''
         Decision Variables
         '''
-        c_points = [[[] for p in range(0, num_patches)] for i in range(0, num_interventions)]
-        for i in range(0, num_interventions):
-            for p in range(0, num_patches):
-                for j in range(0, num_pieces+1):
-                    c_points[i][p].append(j / num_pieces)
-
-        # Threshold indices are  p i k #
-        y_points = [[[] for i in range(0, num_interventions)] for p in range(0, num_patches)]
-        for i in range(0, num_interventions):
-            for p in range(0, num_patches):
-                y_points[p][i].append(0)
-                for k in range(1, num_phases):
-                    y_points[p][i].append(y_points[p][i][k-1] + threshold_cost[p][i][k] *(threshold_coverage[p][i][k] - threshold_coverage[p][i][k-1]))
-
-        model.cover_var= [[] for i in range(0, num_interventions)]
-        model.total_dollar_var = [[] for i in range(0, num_interventions)]
-        model.alpha_var = [[] for i in range(0, num_interventions)]
-
-        for i in range(0, num_interventions):
-            for p in range(0, num_patches):
-                model.cover_var[i].append( model.continuous_var(lb=0, ub=1, name='cover%d_%d' % (i, p)))
-                model.total_dollar_var[i].append(model.continuous_var(lb=0, ub=total_budget, name='total_dollar%d_%d' % (i, p)))
-                model.alpha_var[i].append(model.binary_var(name='alpha%d_%d' % (i, p)))
-
-        model.var_R0 = [model.continuous_var(lb=np.log(0.9) - np.log(beta[p] * gamma[p]), name='R0' + str(p)) for p in range(0, num_patches)]
-
-        model.w_var = [[[] for p in range(0, num_patches)]for i in range(0, num_interventions)]
-        model.lambda_var = [[[] for p in range(0, num_patches)] for i in range(0, num_interventions)]
-        for i in range(0, num_interventions):
-            for p in range(0, num_patches):
-                for j in range(0, num_pieces+1):
-                    model.w_var[i][p].append(model.continuous_var(lb =0, ub =1, name= 'w%d_%d_%d' %(i, p, j)))
-                    model.lambda_var[i][p].append(model.binary_var( name='lambda_%d_%d_%d' %(i, p, j)))
-
-        model.eta_var = [[[] for p in range(0, num_patches)]for i in range(0, num_interventions)]
-        model.psi_var = [[[] for p in range(0, num_patches)] for i in range(0, num_interventions)]
-        for i in range(0, num_interventions):
-            for p in range(0, num_patches):
-                for k in range(0, num_phases):
-                    model.eta_var[i][p].append(model.continuous_var(lb=0, ub=1, name= 'eta%d_%d_%d' % (i, p, k)))
-                    model.psi_var[i][p].append(model.binary_var(name='psi%d_%d_%d' % (i, p, k)))
+        pairs = (num_interventions, num_patches)
+
+        # pairs that cannot change the objective are fixed, and the curves of the others cut to the coverage the budgets
+        # allow; without presolve the report reduces nothing
+        report = presolve(data, self.config, self.formulation, reduce=self.presolve)
+        if self.presolve and self.verbose:
+            print(report)
+        fixed = report.fixed
+        r0_points = report.r0_points
+        cost_points = report.cost_points
+        model.presolve_report = report
+
+        model.cover_var = self._var_array(model.continuous_var_list(
+            int(np.prod(pairs)), lb=report.cover_lb.ravel().tolist(), ub=report.cover_ub.ravel().tolist(),
+            name=self._names('cover%d_%d', pairs)), pairs)
+        model.total_dollar_var = self._var_array(model.continuous_var_list(
+            int(np.prod(pairs)), lb=np.where(fixed, report.fixed_spend, 0).ravel().tolist(),
+            ub=np.where(fixed, report.fixed_spend, total_budget).ravel().tolist(),
+            name=self._names('total_dollar%d_%d', pairs)), pairs)
+        model.alpha_var = self._masked_var_array(model.binary_var_list, ~fixed, 'alpha%d_%d')
+
+        model.var_R0 = model.continuous_var_list(num_patches, lb=(np.log(0.9) - np.log(beta * gamma)).tolist(),
+                                                 name=self._names('R0%d', (num_patches,)))
+
+        w_kept = np.arange(num_pieces + 1) < r0_points[..., np.newaxis]
+        model.w_var = self._masked_var_array(model.continuous_var_list, w_kept, 'w%d_%d_%d', lb=0, ub=1)
+        model.lambda_var = self._piecewise_binaries(model, report.lambda_mask(), 'lambda_%d_%d_%d')
+
+        eta_kept = np.arange(num_phases) < cost_points[..., np.newaxis]
+        model.eta_var = self._masked_var_array(model.continuous_var_list, eta_kept, 'eta%d_%d_%d', lb=0, ub=1)
+        model.psi_var = self._piecewise_binaries(model, report.psi_mask(), 'psi%d_%d_%d')
+
+        total_dollar = model.total_dollar_var
+        cover = model.cover_var
+        w = model.w_var
+        lam = model.lambda_var
+        eta = model.eta_var
+        psi = model.psi_var
+        all_pairs = list(np.ndindex(*pairs))
+        # pairs with an R0 curve, with a cost curve, with a flat cost curve (spend fixed up to alpha), and those of the
+        # curves that need an encoding of adjacency (every curve unless presolve drops those of a single segment)
+        r0_pairs = [(i, p) for i, p in all_pairs if r0_points[i, p] > 0]
+        cost_pairs = [(i, p) for i, p in all_pairs if cost_points[i, p] > 0]
+        flat_pairs = [(i, p) for i, p in all_pairs if report.flat_cost[i, p]]
+        r0_adjacent = [(i, p) for i, p in r0_pairs if r0_points[i, p] > 2 or not report.prune_binaries]
+        cost_adjacent = [(i, p) for i, p in cost_pairs if cost_points[i, p] > 2 or not report.prune_binaries]
 
         '''
         Constraints
         '''
         # budget  constraints
 
-        model.add_constraint(model.sum(model.total_dollar_var[i][p] for i in range(0, num_interventions) for p in range(0, num_patches)) <= total_budget)
-        model.add_constraints(model.sum(model.total_dollar_var[i][p] for i in range(0, num_interventions)) >= minimum_patch_budget[p] for p in range(0, num_patches))
-        model.add_constraints(model.sum(model.total_dollar_var[i][p] for p in range(0, num_patches)) >= minimim_intervention_budget[i] for i in range(0,num_interventions))
-        model.add_constraints(model.sum(model.total_dollar_var[i][p] for p in range(0, num_patches)) <= maximum_intervention_budget[i] for i in range(0, num_interventions))
+        model.budget_constraint = model.add_constraint(model.sum(total_dollar.ravel().tolist()) <= total_budget)
+        model.add_constraints([model.sum(total_dollar[:, p].tolist()) >= minimum_patch_budget[p]
+                               for p in range(0, num_patches)])
+        model.add_constraints([model.sum(total_dollar[i].tolist()) >= minimim_intervention_budget[i]
+                               for i in range(0, num_interventions)])
+        model.add_constraints([model.sum(total_dollar[i].tolist()) <= maximum_intervention_budget[i]
+                               for i in range(0, num_interventions)])
 
         # objective piecewise linear constraints
 
-        model.add_constraints(model.sum(model.w_var[i][p][j] for j in range(0, num_pieces+1)) == 1 for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.sum(c_points[i][p][j] * model.w_var[i][p][j] for j in range(0, num_pieces+1)) == model.cover_var[i][p] for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.sum(model.lambda_var[i][p][j] for j in range(1, num_pieces+1)) == 1 for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.w_var[i][p][0] <= model.lambda_var[i][p][1] for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.w_var[i][p][num_pieces] <= model.lambda_var[i][p][num_pieces] for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.w_var[i][p][j] <= model.lambda_var[i][p][j] + model.lambda_var[i][p][j+1] for i in range(0, num_interventions) for p in range(0, num_patches) for j in range(1, num_pieces))
+        model.add_constraints([model.sum(w[i, p, :r0_points[i, p]].tolist()) == 1 for i, p in r0_pairs])
+        model.add_constraints([model.scal_prod(w[i, p, :r0_points[i, p]].tolist(), c_points[:r0_points[i, p]]) ==
+                               cover[i, p] for i, p in r0_pairs])
+        if self.formulation == 'binary':
+            # lambda[j] selects the piece between breakpoints j - 1 and j
+            model.add_constraints([model.sum(lam[i, p, 1:r0_points[i, p]].tolist()) == 1 for i, p in r0_adjacent])
+            model.add_constraints([w[i, p, 0] <= lam[i, p, 1] for i, p in r0_adjacent])
+            model.add_constraints([w[i, p, r0_points[i, p] - 1] <= lam[i, p, r0_points[i, p] - 1]
+                                   for i, p in r0_adjacent])
+            model.add_constraints([w[i, p, j] <= lam[i, p, j] + lam[i, p, j+1]
+                                   for i, p in r0_adjacent for j in range(1, r0_points[i, p] - 1)])
+        else:
+            self._add_sos2(model, w, lam, r0_adjacent, r0_points)
 
-        model.add_constraints(model.sum((np.log(1-float(efficacy_beta[p][i] * c_points[i][p][j])) +
-                                        np.log(1-float(efficacy_gamma[p][i] * c_points[i][p][j]))) * model.w_var[i][p][j]
-                                        for i in range(0, num_interventions) for j in range(0, num_pieces+1))
-                              == model.var_R0[p] for p in range(0,num_patches))
+        # log R0 reduction [interventions, patches, points] of the kept breakpoints, plus that of fixed pairs
+        log_reduction = np.transpose(log_reduction, (1, 0, 2))
+        fixed_log_reduction = report.fixed_log_reduction.sum(axis=0)
+        model.add_constraints([model.scal_prod(w[:, p][w_kept[:, p]].tolist(), log_reduction[:, p][w_kept[:, p]]) +
+                               fixed_log_reduction[p] == model.var_R0[p] for p in range(0, num_patches)])
 
         # cost piecewise linear constraints
-        model.add_constraints(model.sum(model.eta_var[i][p][k] * threshold_coverage[p][i][k] for k in range(0, num_phases) ) == model.cover_var[i][p] for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.sum(model.eta_var[i][p][k] * threshold_cost[p][i][k] for k in range(0, num_phases)) + model.alpha_var[i][p] * threshold_cost[p][i][0]  == model.total_dollar_var[i][p] for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.sum(model.eta_var[i][p][k] for k in range(0, num_phases)) == 1 for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.sum(model.psi_var[i][p][k] for k in range(0, num_phases)) == 1 for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.eta_var[i][p][0] <= model.psi_var[i][p][0] for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.eta_var[i][p][num_phases-1] <= model.psi_var[i][p][num_phases-2] for i in range(0, num_interventions) for p in range(0, num_patches))
-        model.add_constraints(model.eta_var[i][p][k] <= model.psi_var[i][p][k-1] + model.psi_var[i][p][k] for i in range(0, num_interventions) for p in range(0, num_patches) for k in range(1, num_phases-1))
+        model.add_constraints([model.scal_prod(eta[i, p, :cost_points[i, p]].tolist(),
+                                               threshold_coverage[p, i, :cost_points[i, p]]) == cover[i, p]
+                               for i, p in cost_pairs])
+        model.add_constraints([model.scal_prod(eta[i, p, :cost_points[i, p]].tolist(),
+                                               threshold_cost[p, i, :cost_points[i, p]]) +
+                               model.alpha_var[i, p] * threshold_cost[p, i, 0] == total_dollar[i, p]
+                               for i, p in cost_pairs])
+        model.add_constraints([threshold_cost[p, i, 0] + model.alpha_var[i, p] * threshold_cost[p, i, 0] ==
+                               total_dollar[i, p] for i, p in flat_pairs])
+        model.add_constraints([model.sum(eta[i, p, :cost_points[i, p]].tolist()) == 1 for i, p in cost_pairs])
+        if self.formulation == 'binary':
+            # psi[k] selects the phase between thresholds k and k + 1
+            psi_kept = report.psi_mask()
+            model.add_constraints([model.sum(psi[i, p][psi_kept[i, p]].tolist()) == 1 for i, p in cost_adjacent])
+            model.add_constraints([eta[i, p, 0] <= psi[i, p, 0] for i, p in cost_adjacent])
+            model.add_constraints([eta[i, p, cost_points[i, p] - 1] <= psi[i, p, cost_points[i, p] - 2]
+                                   for i, p in cost_adjacent])
+            model.add_constraints([eta[i, p, k] <= psi[i, p, k-1] + psi[i, p, k]
+                                   for i, p in cost_adjacent for k in range(1, cost_points[i, p] - 1)])
+        else:
+            self._add_sos2(model, eta, psi, cost_adjacent, cost_points)
 
         # for the presentation only
         min_r0_possible = np.log(0.9) - np.log(beta[0]*gamma[0])
 
-        model.max_var = model.continuous_var(lb=min_r0_possible, name="max_var")
-        model.add_constraints(model.max_var >= model.var_R0[p] for p in range(0, num_patches))
+        model.max_var = model.continuous_var(lb=min_r0_possible, name=None if self.ignore_names else "max_var")
+        model.add_constraints([model.max_var >= model.var_R0[p] for p in range(0, num_patches)])
 
         '''
         Objective
         '''
-        model.minimize(model.sum(population[p] * (model.var_R0[p] + model.max_var) for p in range(0, num_patches)))
+        model.minimize(model.scal_prod(model.var_R0, population) + sum(population.tolist()) * model.max_var)
+
+        if self.warm_start is not None:
+            self.add_warm_start(model, self.warm_start)
+
+        stats.stop('build')
+        stats.record_model(model)
+        model.run_stats = self.stats = stats
+
         return self.patches, self.config, model
         # return patch_entry, model
 
+    def prior_allocation(self, prior):
+        """
+        Coverage and spend of a prior plan, matched to the current patches (by patch id) and interventions
+
+        :param prior: dict from get_optimization_solution(), or a stored result in the layout of
+        DataFromOpt.result_as_dict(); patches and interventions missing from it get no coverage and no spend
+        :return: (coverage, spend), arrays [interventions, patches]
+        """
+        num_interventions = self.config['num_interventions']
+        intervention_names = self.config['intervention_names'][:num_interventions]
+        patch_ids = [self.patches[patch]['name'] for patch in self.patches.keys()]
+        coverage = np.zeros((num_interventions, len(patch_ids)))
+        spend = np.zeros((num_interventions, len(patch_ids)))
+
+        if 'coverage_patches_interventions' in prior:
+            prior_patches = {patch_id: p for p, patch_id in enumerate(prior.get('patch_ids', patch_ids))}
+            prior_coverage = np.asarray(prior['coverage_patches_interventions'], dtype=float)
+            prior_spend = np.asarray(prior['allocated_budget_patches_interventions'], dtype=float)
+            # rows of the prior plan for the configured interventions, by name (by position for plans without names)
+            prior_names = list(prior.get('intervention_names', intervention_names))[:prior_coverage.shape[0]]
+            rows = [(i, prior_names.index(name)) for i, name in enumerate(intervention_names) if name in prior_names]
+            current, previous = [i for i, _ in rows], [k for _, k in rows]
+            for p, patch_id in enumerate(patch_ids):
+                if patch_id in prior_patches:
+                    coverage[current, p] = prior_coverage[previous, prior_patches[patch_id]]
+                    spend[current, p] = prior_spend[previous, prior_patches[patch_id]]
+            return coverage, spend
+
+        interventions = {name: i for i, name in enumerate(intervention_names)}
+        for p, patch_id in enumerate(patch_ids):
+            entry = prior['patches'].get(data_consts.TRANSFER_NAME_DATA.get(patch_id, patch_id))
+            for detail in (entry or {}).get('details', []):
+                if detail['intervention'] in interventions:
+                    coverage[interventions[detail['intervention']], p] = detail['coverage']
+                    spend[interventions[detail['intervention']], p] = detail['totalSpend']
+        return coverage, spend
+
+    def add_warm_start(self, model, prior):
+        """
+        Add a prior plan to a model built by build_model() as a MIP start. Only the coverage (and whether a fixed cost
+        was paid) is taken from the plan: the breakpoint weights, their binaries, the spend, R0 and max_var values are
+        filled in so that the start satisfies the piecewise-linear constraints. Constraints the plan no longer satisfies
+        (e.g. after a budget change, or from the rounding of a stored result) are left to the solver to repair.
+
+        :param model: docplex model from build_model()
+        :param prior: dict from get_optimization_solution(), or a stored result (see prior_allocation())
+        """
+        data = self.optimization_data()
+        num_pieces = self.config['num_pieces']
+        num_phases = data['threshold_coverage'].shape[-1]
+        coverage, spend = self.prior_allocation(prior)
+        pairs = coverage.shape
+
+        # the cost curve ends at its last breakpoint, and so does the coverage it can pay for
+        threshold_coverage = np.transpose(data['threshold_coverage'][:, :, :num_phases], (1, 0, 2))
+        threshold_cost = np.transpose(data['threshold_cost'][:, :, :num_phases], (1, 0, 2))
+        coverage = np.clip(coverage, np.maximum(threshold_coverage[..., 0], 0),
+                           np.minimum(threshold_coverage[..., -1], 1))
+
+        # and, after presolve, at the breakpoints its curves were cut to, or at the coverage its pair was fixed to
+        report = model.presolve_report
+        r0_points = np.where(report.r0_points > 0, report.r0_points, num_pieces + 1)
+        cost_points = np.where(report.cost_points > 0, report.cost_points, num_phases)
+        cost_end = np.take_along_axis(threshold_coverage, cost_points[..., np.newaxis] - 1, axis=-1)[..., 0]
+        coverage = np.clip(coverage, report.cover_lb, np.minimum(report.cover_ub, (r0_points - 1) / num_pieces))
+        coverage = np.where(report.flat_cost, coverage, np.minimum(coverage, np.maximum(cost_end, report.cover_lb)))
+        coverage = np.where(report.fixed, report.fixed_coverage, coverage)
+
+        # R0 curve: coverage * pieces lies between breakpoints piece and piece + 1
+        piece = np.minimum(np.floor(coverage * num_pieces).astype(int), r0_points - 2)
+        fraction = coverage * num_pieces - piece
+        w = np.zeros(pairs + (num_pieces + 1,))
+        np.put_along_axis(w, piece[..., np.newaxis], (1 - fraction)[..., np.newaxis], axis=-1)
+        np.put_along_axis(w, piece[..., np.newaxis] + 1, fraction[..., np.newaxis], axis=-1)
+
+        # cost curve
+        phase = np.clip((threshold_coverage <= coverage[..., np.newaxis]).sum(axis=-1) - 1, 0, cost_points - 2)
+        low = np.take_along_axis(threshold_coverage, phase[..., np.newaxis], axis=-1)[..., 0]
+        high = np.take_along_axis(threshold_coverage, phase[..., np.newaxis] + 1, axis=-1)[..., 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(high > low, (coverage - low) / (high - low), 0.0)
+        eta = np.zeros(pairs + (num_phases,))
+        np.put_along_axis(eta, phase[..., np.newaxis], (1 - share)[..., np.newaxis], axis=-1)
+        np.put_along_axis(eta, phase[..., np.newaxis] + 1, share[..., np.newaxis], axis=-1)
+
+        curve_cost = (eta * threshold_cost).sum(axis=-1)
+        fixed_cost = threshold_cost[..., 0]
+        alpha = ((fixed_cost > 0) & (spend - curve_cost >= 0.5 * fixed_cost)).astype(float)
+        total_dollar = np.where(report.fixed, report.fixed_spend, curve_cost + alpha * fixed_cost)
+
+        c_points = np.arange(num_pieces + 1) / num_pieces
+        log_reduction = (np.log(1 - data['efficacy_beta'][:, :, np.newaxis] * c_points) +
+                         np.log(1 - data['efficacy_gamma'][:, :, np.newaxis] * c_points))
+        r0 = (np.transpose(log_reduction, (1, 0, 2)) * w).sum(axis=(0, 2))
+
+        values = {}
+        for variables, array in ((model.cover_var, (w * c_points).sum(axis=-1)), (model.w_var, w),
+                                 (model.eta_var, eta), (model.alpha_var, alpha),
+                                 (model.total_dollar_var, total_dollar)):
+            # variables removed by presolve are None
+            values.update(item for item in zip(variables.ravel().tolist(), array.ravel().tolist())
+                          if item[0] is not None)
+        values.update(zip(model.var_R0, r0.tolist()))
+        values[model.max_var] = max(float(r0.max()), model.max_var.lb)
+
+        if self.formulation != 'sos2':
+            # lambda is indexed by piece from 1 (lambda[0] is unused), psi by phase from 0
+            for variables, segment, offset in ((model.lambda_var, piece, 1), (model.psi_var, phase, 0)):
+                if self.formulation == 'binary':
+                    selected = np.arange(variables.shape[-1]) == (segment + offset)[..., np.newaxis]
+                else:
+                    gray = segment ^ (segment >> 1)
+                    selected = (gray[..., np.newaxis] >> np.arange(variables.shape[-1])) & 1
+                values.update(item for item in zip(variables.ravel().tolist(), selected.astype(float).ravel().tolist())
+                              if item[0] is not None)
+
+        add_mip_start(model, SolveSolution(model, var_value_map=values, name='warm_start'))
+
     @staticmethod
-    def get_optimization_solution(patches, config, optimization_model):
+    def solution_from_arrays(patches, config, allocated_budget, coverage, var_r0):
         """
-        Utility function for printing the solution details for the specified optimization model
+        A plan given as arrays (e.g. from a decomposition or a heuristic rather than a solved model), in the layout of
+        get_optimization_solution()
 
         :param patches: List pf patches and all related information
         :param config: Global data
-        :param optimization_model: Optimization model solution returned from build_patch_model
-        :return:
+        :param allocated_budget: spend, array [interventions, patches]
+        :param coverage: coverage, array [interventions, patches]
+        :param var_r0: values of the model's var_R0 (log R0 reduction), array [patches]
+        :return: solution dict, see get_optimization_solution()
         """
-
-        num_interventions = config['num_interventions']
-        num_patches = len(patches)
-        total_budget = config['total_budget']
-        population = []
-        beta = []
-        gamma =[]
-        patch_ids = []
-
-        for patch in patches.keys():
-            population.append(patches[patch]['population'])
-            beta.append(patches[patch]['Beta'])
-            gamma.append(patches[patch]['Gamma'])
-            patch_ids.append(patches[patch]['name'])
-
-        solution_allocated_budget_patches_interventions =[[] for i in range(0, num_interventions)]
-        solution_allocated_budget_patches = np.zeros(num_patches)
-        solution_allocated_budget_interventions = np.zeros(num_interventions)
-        solution_coverage_patches_interventions = [[] for i in range(0, num_interventions)]
-        solution_population_coverage_interventions = np.zeros(num_interventions)
-        solution_population_coverage_patches_interventions = [[] for _ in range(num_interventions)]
-        solution_r0 = []
-        base_r0 = []
-
-        for i in range(0, num_interventions):
-            for p in range(0, num_patches):
-                solution_allocated_budget_patches_interventions[i].append(optimization_model.total_dollar_var[i][p].solution_value)
-                solution_allocated_budget_patches[p] = solution_allocated_budget_patches[p] +  optimization_model.total_dollar_var[i][p].solution_value
-                solution_coverage_patches_interventions[i].append(optimization_model.cover_var[i][p].solution_value)
-                solution_population_coverage_interventions[i]= solution_population_coverage_interventions[i]+ optimization_model.cover_var[i][p].solution_value *population[p]
-                solution_population_coverage_patches_interventions[i].append(optimization_model.cover_var[i][p].solution_value * population[p])
-            solution_allocated_budget_interventions[i] = np.sum(solution_allocated_budget_patches_interventions[i][:])
-
-        weighted_sum = 0
-        max_r0 = -np.infty
-        for p in range(0, num_patches):
-            r_value = np.exp(np.log(beta[p] * gamma[p]) + optimization_model.var_R0[p].solution_value)
-            base_r0.append(np.exp(np.log(beta[p] * gamma[p])))
-            solution_r0.append(r_value)
-            if max_r0 < r_value:
-                max_r0 = r_value
-            weighted_sum += population[p] * r_value
-
-        print('R0 = ', solution_r0)
-        print('maxR0 = ', np.max(solution_r0))
-        print('budget allocated to each patch = ', solution_allocated_budget_patches)
-        print('budget allocated to each interventions =', solution_allocated_budget_interventions)
-        print('population covered for interventions =', solution_population_coverage_interventions)
-        print('budget unallocated =', total_budget-np.sum(solution_allocated_budget_patches) )
-        optimization_model.print_information()
-        print(optimization_model.solution)
-
-        solution = {
-            'allocated_budget_patches_interventions': solution_allocated_budget_patches_interventions,
-            'allocated_budget_patches': solution_allocated_budget_patches,
-            'coverage_patches_interventions': solution_coverage_patches_interventions,
-            'allocated_budget_interventions': solution_allocated_budget_interventions,
-            'population_coverage_interventions': solution_population_coverage_interventions,
-            'population_coverage_patches_interventions': solution_population_coverage_patches_interventions,
-            'R0': solution_r0,
-            'base_r0': base_r0,
+        entries = [patches[patch] for patch in patches.keys()]
+        population = [entry['population'] for entry in entries]
+        base_r0 = np.array([entry['Beta'] * entry['Gamma'] for entry in entries], dtype=float)
+        allocated_budget = np.asarray(allocated_budget, dtype=float)
+        coverage = np.asarray(coverage, dtype=float)
+        r0 = np.exp(np.log(base_r0) + np.asarray(var_r0, dtype=float))
+        population_coverage = coverage * np.array(population, dtype=float)
+
+        return {
+            'allocated_budget_patches_interventions': allocated_budget.tolist(),
+            'allocated_budget_patches': allocated_budget.sum(axis=0),
+            'coverage_patches_interventions': coverage.tolist(),
+            'allocated_budget_interventions': allocated_budget.sum(axis=1),
+            'population_coverage_interventions': population_coverage.sum(axis=1),
+            'population_coverage_patches_interventions': population_coverage.tolist(),
+            'R0': r0.tolist(),
+            'base_r0': base_r0.tolist(),
             'objectives': {
-                'weighted_sum': weighted_sum,
-                'max_r0': max_r0
+                'weighted_sum': float(np.dot(population, r0)),
+                'max_r0': float(r0.max())
             },
-            'patch_ids': patch_ids,
+            'patch_ids': [entry['name'] for entry in entries],
             'intervention_names': config['intervention_names'],
             'population': population
         }
 
+    @staticmethod
+    def get_optimization_solution(patches, config, optimization_model, verbose=False, model_solution=None):
+        """
+        Utility function for printing the solution details for the specified optimization model. The variable values
+        are read in bulk, as arrays [interventions, patches].
+
+        :param patches: List pf patches and all related information
+        :param config: Global data
+        :param optimization_model: Optimization model solution returned from build_patch_model
+        :param verbose: print the solution details, the model information and the solution
+        :param model_solution: docplex SolveSolution read instead of the model's solution, e.g. an incumbent
+        :return: solution dict, see solution_from_arrays()
+        """
+        # models from build_model() record the extraction time of their final solution in their RunStats
+        stats = getattr(optimization_model, 'run_stats', None) if model_solution is None else None
+        if stats is not None:
+            stats.start('extract')
+
+        if model_solution is None:
+            model_solution = optimization_model.solution
+        pairs = optimization_model.cover_var.shape
+        allocated_budget = np.array(model_solution.get_values(optimization_model.total_dollar_var.ravel().tolist()),
+                                    dtype=float).reshape(pairs)
+        coverage = np.array(model_solution.get_values(optimization_model.cover_var.ravel().tolist()),
+                            dtype=float).reshape(pairs)
+        var_r0 = np.array(model_solution.get_values(list(optimization_model.var_R0)), dtype=float)
+        solution = InterventionPlanMultiPatch.solution_from_arrays(patches, config, allocated_budget, coverage, var_r0)
+
+        if verbose:
+            print('R0 = ', solution['R0'])
+            print('maxR0 = ', np.max(solution['R0']))
+            print('budget allocated to each patch = ', solution['allocated_budget_patches'])
+            print('budget allocated to each interventions =', solution['allocated_budget_interventions'])
+            print('population covered for interventions =', solution['population_coverage_interventions'])
+            print('budget unallocated =', config['total_budget'] - np.sum(solution['allocated_budget_patches']))
+            optimization_model.print_information()
+            print(model_solution)
+
+        if stats is not None:
+            stats.stop('extract')
         return solution
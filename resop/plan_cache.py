@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Content-addressed disk cache of solved InterventionPlanMultiPatch plans, so that a payload solved before (a dashboard
+refresh, a retry, an unchanged nightly scenario) is answered without building or solving its model:
+
+    cache = PlanCache('/var/cache/resop', max_bytes=1024 ** 3)
+    solution = solve_cached(optimiser, cache)
+    print(cache.stats())
+
+Entries are keyed on the sha256 of a canonical JSON form of the config, the patches (in their order, which sets the
+layout of the solution) and the solver settings, presolve and the warm start included: key order and int/float spelling
+do not change the key. Each entry is the solution dict of get_optimization_solution(), and optionally the model exported
+as an LP file. When the entries take more than max_bytes the least recently used are removed.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .multi_patch_optimizers import InterventionPlanMultiPatch
+
+
+def _canonical(value):
+    """
+    :return: value with numbers as floats, arrays and tuples as lists and dict keys as strings
+    """
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return _canonical(value.tolist())
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    return value
+
+
+def _json_default(value):
+    """
+    JSON form of the numpy values in solutions
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('%s is not JSON serializable' % type(value).__name__)
+
+
+def canonical_json(value):
+    """
+    :param value: JSON-like value (dicts, lists, numbers, strings, numpy arrays)
+    :return: JSON text that is the same for equal values whatever their key order or number types
+    """
+    return json.dumps(_canonical(value), sort_keys=True, separators=(',', ':'))
+
+
+def plan_key(config, patches, solver_settings):
+    """
+    :param config: the optimiser's config
+    :param patches: the optimiser's patches
+    :param solver_settings: dict of the solver settings, e.g. from SolverBackend.settings()
+    :return: hex digest identifying the plan
+    """
+    payload = {
+        'config': config,
+        'patches': patches,
+        'patch_order': list(patches.keys()),
+        'solver': solver_settings
+    }
+    return hashlib.sha256(canonical_json(payload).encode('utf-8')).hexdigest()
+
+
+class PlanCache(object):
+    """
+    Directory of solved plans, keyed by plan_key(), with least-recently-used eviction by size
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 ** 2, store_models=False):
+        """
+
+        :param directory: directory of the entries (created if needed); several processes may share it
+        :param max_bytes: largest total size of the entries' files
+        :param store_models: also keep every model, exported as an LP file (see model_path())
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.store_models = store_models
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def make_key(self, optimiser):
+        """
+        :param optimiser: InterventionPlanMultiPatch
+        :return: key of the plan the optimiser would solve
+        """
+        # presolve and the warm start change the plan an early-stopped solve finds, though not the optimum
+        warm_start = optimiser.warm_start
+        settings = dict(optimiser.solver_backend().settings(), formulation=optimiser.formulation,
+                        presolve=bool(optimiser.presolve),
+                        warm_start=None if warm_start is None else
+                        hashlib.sha256(canonical_json(warm_start).encode('utf-8')).hexdigest())
+        # limits that stop the solve early change the plan found; keys of plans solved without them are unchanged
+        limits = {'time_limit': optimiser.time_limit, 'mip_gap': optimiser.mip_gap, 'node_limit': optimiser.node_limit}
+        settings.update((name, value) for name, value in limits.items() if value is not None)
+        return plan_key(optimiser.config, optimiser.patches, settings)
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key + extension)
+
+    def _write(self, path, write):
+        """
+        Write a file through write(partial path) then rename it, so concurrent readers never see a partial file
+        """
+        partial = '%s.%d.tmp%s' % (path, os.getpid(), os.path.splitext(path)[1])
+        write(partial)
+        os.replace(partial, path)
+
+    def lookup(self, key):
+        """
+        :param key: key from make_key() or plan_key()
+        :return: cached solution dict, or None (counted as a miss)
+        """
+        path = self._path(key, '.json')
+        try:
+            with open(path) as entry_file:
+                entry = json.load(entry_file)
+            # mark the entry as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            # missing, or removed or replaced by another process meanwhile
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        solution = entry['solution']
+        for name in entry['arrays']:
+            solution[name] = np.array(solution[name])
+        return solution
+
+    def store(self, key, solution, model=None):
+        """
+        :param key: key from make_key() or plan_key()
+        :param solution: dict from InterventionPlanMultiPatch.get_optimization_solution()
+        :param model: the solved docplex model, exported when the cache stores models
+        """
+        entry = {
+            'solution': solution,
+            'arrays': sorted(name for name, value in solution.items() if isinstance(value, np.ndarray))
+        }
+
+        def write_entry(path):
+            with open(path, 'w') as entry_file:
+                json.dump(entry, entry_file, default=_json_default)
+
+        if self.store_models and model is not None:
+            self._write(self._path(key, '.lp'), lambda path: model.export_as_lp(path=path))
+        self._write(self._path(key, '.json'), write_entry)
+        self._evict()
+
+    def model_path(self, key):
+        """
+        :return: path of the entry's LP file, or None
+        """
+        path = self._path(key, '.lp')
+        return path if os.path.exists(path) else None
+
+    def _entries(self):
+        """
+        :return: dict of key -> (last use, size in bytes, paths)
+        """
+        entries = {}
+        for name in os.listdir(self.directory):
+            key, extension = os.path.splitext(name)
+            if extension not in ('.json', '.lp') or '.tmp' in key:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                status = os.stat(path)
+            except OSError:
+                continue
+            used, size, paths = entries.get(key, (0.0, 0, []))
+            entries[key] = (max(used, status.st_mtime), size + status.st_size, paths + [path])
+        return entries
+
+    def _evict(self):
+        """
+        Remove the least recently used entries until the rest fit in max_bytes
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries.values())
+        for key in sorted(entries, key=lambda name: entries[name][0]):
+            if total <= self.max_bytes:
+                break
+            _, size, paths = entries[key]
+            self._remove(paths)
+            total -= size
+            self.evictions += 1
+
+    @staticmethod
+    def _remove(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                # removed by another process meanwhile
+                pass
+
+    def clear(self):
+        """
+        Remove every entry (the counters are kept, see reset_stats())
+        """
+        for _, _, paths in self._entries().values():
+            self._remove(paths)
+
+    def reset_stats(self):
+        """
+        Reset the counters (the entries are kept)
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        :return: dict of hits, misses, hit_rate, evictions, entries and bytes
+        """
+        lookups = self.hits + self.misses
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries.values())
+        }
+
+
+def solve_cached(optimiser, cache):
+    """
+    Solution of an optimiser's plan from the cache, or from building and solving its model (then cached)
+
+    :param optimiser: InterventionPlanMultiPatch
+    :param cache: PlanCache
+    :return: dict as from InterventionPlanMultiPatch.get_optimization_solution()
+    """
+    key = cache.make_key(optimiser)
+    solution = cache.lookup(key)
+    if solution is None:
+        patches, config, model = optimiser.run()
+        solution = InterventionPlanMultiPatch.get_optimization_solution(patches, config, model)
+        cache.store(key, solution, model)
+    return solution
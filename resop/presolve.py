@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Reductions of the InterventionPlanMultiPatch model that are found from its data alone, before the model is built
+(InterventionPlanMultiPatch(..., presolve=True)). Each one leaves the optimal objective unchanged:
+
+- a pair whose coverage cannot change the objective is fixed at its cheapest coverage: when it has no efficacy on Beta
+  or Gamma, or when no coverage beyond the start of its cost curve is affordable, and in either case no minimum budget
+  of its patch or intervention may need its spend. Its cover and spend become constants and it gets no
+  piecewise-linear variables
+- a pair with no efficacy gets no R0 curve (its log R0 reduction is 0 at every coverage)
+- a pair whose cost curve is flat gets no cost curve: its spend is the constant cost (plus the fixed cost when alpha is
+  set) and its coverage is bounded by the first and last thresholds
+- the R0 and cost curves of the other pairs are cut after the breakpoint that ends the largest affordable coverage, the
+  coverage whose cost is within the total budget and the pair's maximum intervention budget
+- binaries that select nothing are left out: the unused lambda[0] and psi[phases - 1] of the 'binary' formulation, and
+  all the binaries of a curve with a single segment
+
+Dominance between the interventions of a patch is not a reduction: their log R0 reductions add up, so an intervention
+that is worse than another in every respect may still be worth funding alongside it.
+"""
+
+import numpy as np
+
+
+def _log_bits(num_points):
+    """
+    :return: number of binaries of the 'log' encoding of a curve with num_points breakpoints
+    """
+    segments = num_points - 1
+    return int(np.ceil(np.log2(segments))) if segments > 1 else 0
+
+
+def _binary_mask(formulation, points, num_points, prune, offset):
+    """
+    Which binaries of a piecewise-linear encoding a model has
+
+    :param points: number of breakpoints kept of every curve, array [interventions, patches]
+    :param num_points: number of breakpoints of the full curves
+    :param prune: whether binaries that select nothing are left out
+    :param offset: index of the binary of the first segment in the 'binary' formulation
+    :return: array [interventions, patches, binaries]
+    """
+    if formulation == 'sos2':
+        return np.zeros(points.shape + (0,), dtype=bool)
+    if formulation == 'log':
+        bits = np.vectorize(_log_bits, otypes=[int])(points)
+        return np.arange(_log_bits(num_points)) < bits[..., np.newaxis]
+    index = np.arange(num_points)
+    points = points[..., np.newaxis]
+    if prune:
+        return (index >= offset) & (index < points - 1 + offset) & (points > 2)
+    return index < points
+
+
+def _interpolate(coverage, points, values):
+    """
+    Piecewise-linear interpolation along the last axis, for every pair
+
+    :param coverage: array [interventions, patches]
+    :param points: increasing breakpoints, array [interventions, patches, points]
+    :param values: values at the breakpoints, array [interventions, patches, points]
+    :return: array [interventions, patches]
+    """
+    segment = np.clip((points <= coverage[..., np.newaxis]).sum(axis=-1) - 1, 0, points.shape[-1] - 2)
+    start = np.take_along_axis(points, segment[..., np.newaxis], axis=-1)[..., 0]
+    end = np.take_along_axis(points, segment[..., np.newaxis] + 1, axis=-1)[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(end > start, (coverage - start) / (end - start), 0.0)
+    return ((1 - share) * np.take_along_axis(values, segment[..., np.newaxis], axis=-1)[..., 0] +
+            share * np.take_along_axis(values, segment[..., np.newaxis] + 1, axis=-1)[..., 0])
+
+
+class PresolveReport(object):
+    """
+    Reductions of the model, arrays [interventions, patches]:
+
+    r0_points: number of R0 breakpoints kept (0 when the pair has no R0 curve)
+    cost_points: number of cost thresholds kept (0 when the pair has no cost curve)
+    fixed: whether the pair is fixed, at fixed_coverage and fixed_spend, with the constant fixed_log_reduction in var_R0
+    zero_efficacy, flat_cost, unaffordable: why pairs were reduced
+    cover_lb, cover_ub: bounds of the cover variables
+    prune_binaries: whether binaries that select nothing are left out
+    variables_removed: number of variables the model has fewer than without the reductions
+    """
+
+    def __init__(self, num_pieces, num_phases, formulation, zero_efficacy, flat_cost, unaffordable, fixed, r0_points,
+                 cost_points, fixed_coverage, fixed_spend, fixed_log_reduction, cover_lb, cover_ub, prune_binaries):
+        self.num_pieces = num_pieces
+        self.num_phases = num_phases
+        self.formulation = formulation
+        self.zero_efficacy = zero_efficacy
+        self.flat_cost = flat_cost
+        self.unaffordable = unaffordable
+        self.fixed = fixed
+        self.r0_points = r0_points
+        self.cost_points = cost_points
+        self.fixed_coverage = fixed_coverage
+        self.fixed_spend = fixed_spend
+        self.fixed_log_reduction = fixed_log_reduction
+        self.cover_lb = cover_lb
+        self.cover_ub = cover_ub
+        self.prune_binaries = prune_binaries
+        full = np.zeros(fixed.shape, dtype=bool)
+        self.variables_removed = (self._count_variables(full + num_pieces + 1, full + num_phases, full, False) -
+                                  self._count_variables(r0_points, cost_points, fixed, prune_binaries))
+
+    def lambda_mask(self):
+        """
+        :return: which lambda variables the model has, array [interventions, patches, lambda variables]
+        """
+        # lambda[j] selects the piece between breakpoints j - 1 and j
+        return _binary_mask(self.formulation, self.r0_points, self.num_pieces + 1, self.prune_binaries, 1)
+
+    def psi_mask(self):
+        """
+        :return: which psi variables the model has, array [interventions, patches, psi variables]
+        """
+        # psi[k] selects the phase between thresholds k and k + 1
+        return _binary_mask(self.formulation, self.cost_points, self.num_phases, self.prune_binaries, 0)
+
+    def _count_variables(self, r0_points, cost_points, fixed, prune_binaries):
+        """
+        :return: number of per-pair variables (w, lambda, eta, psi, alpha) of a model with these reductions
+        """
+        binaries = (_binary_mask(self.formulation, r0_points, self.num_pieces + 1, prune_binaries, 1).sum() +
+                    _binary_mask(self.formulation, cost_points, self.num_phases, prune_binaries, 0).sum())
+        return int(r0_points.sum() + cost_points.sum() + (~fixed).sum() + binaries)
+
+    def summary(self):
+        """
+        :return: dict of counts: pairs, fixed, zero_efficacy, flat_cost, unaffordable, r0_points_removed,
+        cost_points_removed and variables_removed
+        """
+        kept = ~self.fixed
+        return {
+            'pairs': int(self.fixed.size),
+            'fixed': int(self.fixed.sum()),
+            'zero_efficacy': int(self.zero_efficacy.sum()),
+            'flat_cost': int(self.flat_cost.sum()),
+            'unaffordable': int(self.unaffordable.sum()),
+            'r0_points_removed': int((self.num_pieces + 1 - self.r0_points)[kept].sum()),
+            'cost_points_removed': int((self.num_phases - self.cost_points)[kept].sum()),
+            'variables_removed': self.variables_removed
+        }
+
+    def fixed_pairs(self, intervention_names, patch_ids):
+        """
+        :return: list of (intervention name, patch id, reason) of the fixed pairs
+        """
+        pairs = []
+        for i, p in zip(*np.nonzero(self.fixed)):
+            reason = 'zero efficacy' if self.zero_efficacy[i, p] else 'unaffordable'
+            pairs.append((intervention_names[i], patch_ids[p], reason))
+        return pairs
+
+    def __str__(self):
+        summary = self.summary()
+        return ('presolve: %(fixed)d of %(pairs)d pairs fixed (%(zero_efficacy)d with zero efficacy, %(unaffordable)d '
+                'unaffordable), %(flat_cost)d flat cost curves, %(r0_points_removed)d R0 and %(cost_points_removed)d '
+                'cost breakpoints cut, %(variables_removed)d variables removed' % summary)
+
+
+def presolve(data, config, formulation='binary', reduce=True):
+    """
+    Find the reductions of the model built from data
+
+    :param data: dict from InterventionPlanMultiPatch.optimization_data()
+    :param config: the optimiser's config
+    :param formulation: piecewise-linear formulation of the model (see InterventionPlanMultiPatch)
+    :param reduce: False for a report that reduces nothing, describing the full model
+    :return: PresolveReport
+    """
+    num_pieces = config['num_pieces']
+    num_phases = data['threshold_coverage'].shape[-1]
+    num_interventions = config['num_interventions']
+    # [interventions, patches, ...] like the model's variables
+    threshold_coverage = np.transpose(data['threshold_coverage'][:, :, :num_phases], (1, 0, 2))
+    threshold_cost = np.transpose(data['threshold_cost'][:, :, :num_phases], (1, 0, 2))
+    efficacy_beta = data['efficacy_beta'].T
+    efficacy_gamma = data['efficacy_gamma'].T
+    pairs = threshold_cost.shape[:2]
+
+    c_points = np.arange(num_pieces + 1) / num_pieces
+    log_reduction = (np.log(1 - efficacy_beta[..., np.newaxis] * c_points) +
+                     np.log(1 - efficacy_gamma[..., np.newaxis] * c_points))
+
+    report = {
+        'zero_efficacy': np.zeros(pairs, dtype=bool),
+        'flat_cost': np.zeros(pairs, dtype=bool),
+        'unaffordable': np.zeros(pairs, dtype=bool),
+        'fixed': np.zeros(pairs, dtype=bool),
+        'r0_points': np.full(pairs, num_pieces + 1),
+        'cost_points': np.full(pairs, num_phases),
+        'fixed_coverage': np.zeros(pairs),
+        'fixed_spend': np.zeros(pairs),
+        'fixed_log_reduction': np.zeros(pairs),
+        'cover_lb': np.zeros(pairs),
+        'cover_ub': np.ones(pairs)
+    }
+    if not reduce:
+        return PresolveReport(num_pieces, num_phases, formulation, prune_binaries=False, **report)
+
+    # only curves the reasoning holds for: coverage thresholds in order, costs (and so the fixed cost) not negative and
+    # not decreasing along the curve, so that the coverage beyond the affordable one costs more
+    regular = ((np.diff(threshold_coverage, axis=-1) >= 0).all(axis=-1) & (threshold_cost >= 0).all(axis=-1) &
+               (np.diff(threshold_cost, axis=-1) >= 0).all(axis=-1))
+    start = np.clip(threshold_coverage[..., 0], 0, 1)
+    end = np.clip(threshold_coverage[..., -1], 0, 1)
+
+    # largest coverage whose cost fits in the pair's budget, over the segments of its cost curve
+    limit = np.minimum(float(config['total_budget']),
+                       np.array(config['maximum_intervention_budget'][:num_interventions], dtype=float))[:, np.newaxis]
+    low_cost, high_cost = threshold_cost[..., :-1], threshold_cost[..., 1:]
+    low_coverage, high_coverage = threshold_coverage[..., :-1], threshold_coverage[..., 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(high_cost > low_cost, (limit[..., np.newaxis] - low_cost) / (high_cost - low_cost), 1.0)
+    reach = np.where(low_cost <= limit[..., np.newaxis],
+                     low_coverage + np.clip(share, 0, 1) * (high_coverage - low_coverage), -np.inf)
+    affordable = np.clip(reach.max(axis=-1), start, end)
+
+    minimum_intervention_budget = np.array(config['minimum_intervention_budget'][:num_interventions], dtype=float)
+    minimum_needed = (minimum_intervention_budget > 0)[:, np.newaxis] | (data['minimum_patch_budget'] > 0)[np.newaxis]
+    zero_efficacy = regular & (efficacy_beta == 0) & (efficacy_gamma == 0)
+    flat_cost = regular & (np.ptp(threshold_cost, axis=-1) == 0)
+    unaffordable = regular & (affordable <= start + 1e-12)
+    # a fixed pair has no alpha either, so it could not add its fixed cost (or the rest of its curve) to a minimum
+    # budget
+    fixed = (zero_efficacy | unaffordable) & ~minimum_needed
+
+    report['zero_efficacy'] = zero_efficacy
+    report['flat_cost'] = flat_cost & ~fixed
+    report['unaffordable'] = unaffordable
+    report['fixed'] = fixed
+    report['fixed_coverage'] = np.where(fixed, start, 0.0)
+    report['fixed_spend'] = np.where(fixed, _interpolate(start, threshold_coverage, threshold_cost), 0.0)
+    report['fixed_log_reduction'] = np.where(fixed & ~zero_efficacy,
+                                             _interpolate(start, np.broadcast_to(c_points, log_reduction.shape),
+                                                          log_reduction), 0.0)
+
+    # curves cut after the breakpoint that ends the affordable coverage; where a minimum budget may need the spend,
+    # after the thresholds at that coverage too, whose spend is affordable without adding coverage
+    r0_points = np.minimum(np.ceil(affordable * num_pieces - 1e-9).astype(int), num_pieces) + 1
+    kept = ((threshold_coverage < affordable[..., np.newaxis] - 1e-12) |
+            (minimum_needed[..., np.newaxis] & (threshold_coverage <= affordable[..., np.newaxis] + 1e-12)))
+    cost_points = np.minimum(kept.sum(axis=-1) + 1, num_phases)
+    report['r0_points'] = np.where(regular, np.maximum(r0_points, 2), num_pieces + 1)
+    report['r0_points'][zero_efficacy | fixed] = 0
+    report['cost_points'] = np.where(regular, np.maximum(cost_points, 2), num_phases)
+    report['cost_points'][flat_cost | fixed] = 0
+
+    report['cover_lb'] = np.where(fixed, start, np.where(flat_cost, start, 0.0))
+    report['cover_ub'] = np.where(fixed, start, np.where(flat_cost, end, 1.0))
+    return PresolveReport(num_pieces, num_phases, formulation, prune_binaries=True, **report)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Timings and sizes of an InterventionPlanMultiPatch run, for tracking performance across releases and instance sizes.
+build_model() starts a RunStats on the model (model.run_stats, also the optimiser's stats), and run() and
+get_optimization_solution() add to it:
+
+    patches, config, model = optimiser.run()
+    solution = InterventionPlanMultiPatch.get_optimization_solution(patches, config, model)
+    model.run_stats.write('runs.jsonl')
+
+The phases are 'load' (conversion of the patch data), 'build', 'solve' and 'extract', each with its wall and CPU time
+(CPU time of this process: all the threads of a local solver, none of a DOCloud solve) and the peak memory of the
+process when it ended.
+"""
+
+import contextlib
+import json
+import sys
+import time
+
+__has_resource__ = True
+try:
+    import resource
+except ImportError:
+    __has_resource__ = False
+
+
+def peak_memory():
+    """
+    :return: peak resident memory of this process so far in bytes, or None where it is not available (Windows)
+    """
+    if not __has_resource__:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return int(peak if sys.platform == 'darwin' else peak * 1024)
+
+
+class RunStats(object):
+    """
+    Wall and CPU time of the phases of a run, with the model's size and the solver's results
+    """
+
+    def __init__(self, **info):
+        """
+
+        :param info: values describing the run (e.g. the instance size), kept in the record as they are
+        """
+        self.info = dict(info)
+        self.phases = {}
+        self.model = {}
+        self.solve = {}
+        self._started = {}
+
+    def start(self, phase):
+        """
+        Start timing a phase (a phase timed again adds to its times)
+        """
+        self._started[phase] = (time.time(), time.process_time())
+
+    def stop(self, phase):
+        """
+        Stop timing a phase started with start()
+        """
+        wall, cpu = self._started.pop(phase)
+        times = self.phases.setdefault(phase, {'wall': 0.0, 'cpu': 0.0})
+        times['wall'] += time.time() - wall
+        times['cpu'] += time.process_time() - cpu
+        times['peak_memory'] = peak_memory()
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        """
+        Context manager timing a phase, as start() and stop()
+        """
+        self.start(phase)
+        try:
+            yield self
+        finally:
+            self.stop(phase)
+
+    def record_model(self, model):
+        """
+        Record the numbers of variables and constraints of a docplex model, by type
+        """
+        self.model = {
+            'variables': model.number_of_variables,
+            'continuous_variables': model.number_of_continuous_variables,
+            'binary_variables': model.number_of_binary_variables,
+            'integer_variables': model.number_of_integer_variables,
+            'constraints': model.number_of_constraints,
+            'linear_constraints': model.number_of_linear_constraints,
+            'range_constraints': model.number_of_range_constraints,
+            'indicator_constraints': model.number_of_indicator_constraints,
+            'quadratic_constraints': model.number_of_quadratic_constraints,
+            'sos': model.number_of_sos,
+            'mip_starts': model.number_of_mip_starts
+        }
+
+    def record_solve(self, backend, solved):
+        """
+        Record the results of a solve
+
+        :param backend: the SolverBackend that solved the model
+        :param solved: whether a solution was found
+        """
+        details = backend.details or {}
+        self.solve = {
+            'solver': backend.name,
+            'solved': bool(solved),
+            'status': None if details.get('status') is None else str(details['status']),
+            'gap': details.get('gap'),
+            'nodes': details.get('nodes'),
+            'solver_time': details.get('time')
+        }
+
+    def as_dict(self):
+        """
+        :return: dict of the record: the info values, 'phases' (dict of phase -> 'wall', 'cpu' and 'peak_memory'),
+        'total' ('wall' and 'cpu' of all phases), 'model' (see record_model()), 'solve' (see record_solve()) and
+        'peak_memory' (bytes, None where not available)
+        """
+        record = dict(self.info)
+        record.update({
+            'phases': {phase: dict(times) for phase, times in self.phases.items()},
+            'total': {
+                'wall': sum(times['wall'] for times in self.phases.values()),
+                'cpu': sum(times['cpu'] for times in self.phases.values())
+            },
+            'model': dict(self.model),
+            'solve': dict(self.solve),
+            'peak_memory': peak_memory()
+        })
+        return record
+
+    def to_json(self):
+        """
+        :return: the record as one line of JSON
+        """
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def write(self, path):
+        """
+        Append the record to a JSON-lines file
+        """
+        with open(path, 'a') as stats_file:
+            stats_file.write(self.to_json() + '\n')
+
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Builds and solves many independent InterventionPlanMultiPatch scenarios in worker processes, yielding each result as
+soon as it is ready:
+
+    for result in run_scenarios(payloads, threads=16):
+        if result.failed():
+            print(result.name, result.error)
+        else:
+            store(result.name, result.solution)
+
+A global thread budget is shared between the workers and the solver threads in each of them. A scenario that raises
+only fails itself; if a worker process dies (e.g. a crash inside the solver) the scenarios it took down are retried,
+each in a fresh process of its own.
+"""
+
+import os
+import time
+import traceback
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    as_completed
+)
+from concurrent.futures.process import BrokenProcessPool
+
+from .multi_patch_optimizers import InterventionPlanMultiPatch
+from .solver_backends import make_backend
+
+__has_threadpoolctl__ = True
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    __has_threadpoolctl__ = False
+
+#: environment variables bounding the threads of the BLAS and OpenMP runtimes under numpy and scipy
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                    'NUMEXPR_NUM_THREADS')
+
+
+class ScenarioResult(object):
+    """
+    Outcome of one scenario:
+
+    index: position of the scenario in the input list
+    name: the scenario's 'name', or its index
+    solution: dict from InterventionPlanMultiPatch.get_optimization_solution() (None on failure)
+    error: formatted exception (None on success)
+    seconds: wall time spent building and solving in the worker
+    stats: dict of the run's timings and model size, from RunStats.as_dict() (None when the model was not built)
+    """
+
+    def __init__(self, index, name, solution=None, error=None, seconds=0.0, stats=None):
+        self.index = index
+        self.name = name
+        self.solution = solution
+        self.error = error
+        self.seconds = seconds
+        self.stats = stats
+
+    def failed(self):
+        """
+        :return: whether the scenario failed
+        """
+        return self.error is not None
+
+
+def thread_budget(threads, processes, scenarios):
+    """
+    Split a thread budget between worker processes and the solver threads of each
+
+    :param threads: total number of threads (None for the number of cores)
+    :param processes: largest number of worker processes (None for as many as the budget allows)
+    :param scenarios: number of scenarios
+    :return: (worker processes, solver threads per worker)
+    """
+    threads = threads or os.cpu_count() or 1
+    workers = max(1, min(processes or threads, threads, scenarios))
+    return workers, max(1, threads // workers)
+
+
+def _limit_threads(threads):
+    """
+    Initializer of the worker processes: bound the BLAS and OpenMP threads of the worker to its share of the thread
+    budget. The environment variables bound the runtimes loaded after the worker starts (with the 'spawn' and
+    'forkserver' start methods, all of them); threadpoolctl, when installed, also bounds those already loaded, e.g. the
+    BLAS of numpy in a forked worker.
+
+    :param threads: threads per worker
+    """
+    for name in THREAD_VARIABLES:
+        os.environ[name] = str(threads)
+    if __has_threadpoolctl__:
+        threadpool_limits(threads)
+
+
+def _solve_scenario(task):
+    """
+    Build and solve one scenario, in a worker process
+
+    :param task: (index, scenario, options)
+    :return: ScenarioResult
+    """
+    index, scenario, options = task
+    name = scenario.get('name', index)
+    start = time.time()
+    optimiser = None
+    try:
+        backend = make_backend(options['solver'], options['docloud_url'], options['docloud_client_id'],
+                               threads=options['threads'])
+        optimiser = InterventionPlanMultiPatch(options['docloud_url'], options['docloud_client_id'],
+                                               scenario['config'], scenario['patches'], ignore_names=True,
+                                               solver=backend, formulation=options['formulation'])
+        patches, config, model = optimiser.run()
+        solution = InterventionPlanMultiPatch.get_optimization_solution(patches, config, model)
+        return ScenarioResult(index, name, solution=solution, seconds=time.time() - start,
+                              stats=optimiser.stats.as_dict())
+    except Exception:
+        stats = optimiser.stats if optimiser is not None else None
+        return ScenarioResult(index, name, error=traceback.format_exc(), seconds=time.time() - start,
+                              stats=stats.as_dict() if stats is not None else None)
+
+
+def run_scenarios(scenarios, processes=None, threads=None, solver=None, formulation='binary', docloud_url=None,
+                  docloud_client_id=None):
+    """
+    Solve scenarios in parallel
+
+    :param scenarios: list of dicts with 'config' and 'patches' (as in examples/data/patch_data.json), and optionally a
+    'name'
+    :param processes: largest number of worker processes; 1 solves in this process
+    :param threads: thread budget shared by all workers' solvers (None for the number of cores). HiGHS solves through
+    scipy use one thread each. The BLAS and OpenMP threads of every worker are bounded to its share too.
+    :param solver: backend name for every scenario (see solver_backends.make_backend())
+    :param formulation: piecewise-linear formulation (see InterventionPlanMultiPatch)
+    :param docloud_url: DOCloud REST API endpoint url, for the 'docloud' backend
+    :param docloud_client_id: DOCloud REST API client id/key
+    :return: generator of ScenarioResult, in completion order
+    """
+    workers, solver_threads = thread_budget(threads, processes, len(scenarios))
+    options = {
+        'solver': solver,
+        'formulation': formulation,
+        'docloud_url': docloud_url,
+        'docloud_client_id': docloud_client_id,
+        'threads': solver_threads
+    }
+    tasks = [(index, scenario, options) for index, scenario in enumerate(scenarios)]
+
+    if workers == 1:
+        for task in tasks:
+            yield _solve_scenario(task)
+        return
+
+    broken = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_limit_threads, initargs=(solver_threads,)) as executor:
+        futures = {executor.submit(_solve_scenario, task): task for task in tasks}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool:
+                broken.append(futures[future])
+
+    # a dead worker takes every scenario still running or queued with it; retry them one process each, so only the
+    # scenario that kills its process fails
+    for task in broken:
+        with ProcessPoolExecutor(max_workers=1, initializer=_limit_threads, initargs=(solver_threads,)) as executor:
+            try:
+                yield executor.submit(_solve_scenario, task).result()
+            except BrokenProcessPool:
+                index, scenario, _ = task
+                yield ScenarioResult(index, scenario.get('name', index), error='Worker process terminated abruptly')
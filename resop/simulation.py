@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Simulations that stop early on events, such as the number infectious falling below a threshold, the epidemic peak or a
+target cumulative incidence.
+
+Events are checked at the reported times. Each member of a batch (e.g. each patch scenario of a BatchSIRModel) stops
+independently at the first event it triggers: simulate_until() integrates the batch in chunks of reported times and
+drops the members that have stopped, so the work left shrinks as the batch burns out. The stochastic counterpart is
+stochastic.simulate_until().
+
+iterate_batch() streams a batch trajectory in time chunks instead, for the consumers in streaming.
+"""
+
+import numpy as np
+
+from .sir_models import integrate_batch
+
+
+class Event(object):
+    """
+    Stopping condition, triggered when its value crosses zero in the given direction between two reported times. The
+    event time is interpolated linearly between those times.
+    """
+
+    #: -1 triggers on a crossing from >= 0 to < 0, +1 on a crossing from < 0 to >= 0
+    direction = -1
+    #: whether value() needs the derivatives of the state
+    needs_drift = False
+
+    def __init__(self, compartment):
+        """
+
+        :param compartment: index (or list of indices, which are summed) into the state of one batch member
+        """
+        self.compartment = compartment
+
+    def _total(self, states):
+        if np.ndim(self.compartment) == 0:
+            return states[:, self.compartment]
+        return states[:, list(self.compartment)].sum(axis=1)
+
+    def value(self, states, initial, drift):
+        """
+        :param states: array [members, state size]
+        :param initial: initial states of the same members, array [members, state size]
+        :param drift: derivatives of states (only when needs_drift, None otherwise)
+        :return: array [members]
+        """
+        raise NotImplementedError()
+
+    def crossed(self, previous, current):
+        """
+        :return: boolean array, whether the event triggered between the previous and current values
+        """
+        if self.direction < 0:
+            return (previous >= 0) & (current < 0)
+        return (previous < 0) & (current >= 0)
+
+
+class InfectiousBelow(Event):
+    """
+    Triggered when the number infectious falls below a threshold, e.g. threshold=1 for the end of an epidemic
+    """
+
+    def __init__(self, threshold=1.0, compartment=1):
+        """
+
+        :param threshold: number infectious
+        :param compartment: index (or indices) of the infectious compartment(s), e.g. 2 for SEIR
+        """
+        super(InfectiousBelow, self).__init__(compartment)
+        self.threshold = threshold
+
+    def value(self, states, initial, drift):
+        return self._total(states) - self.threshold
+
+
+class PeakReached(Event):
+    """
+    Triggered when the number infectious stops growing. A member whose infectious count already decreases at the start
+    never triggers it.
+    """
+
+    needs_drift = True
+
+    def __init__(self, compartment=1):
+        """
+
+        :param compartment: index (or indices) of the infectious compartment(s), e.g. 2 for SEIR
+        """
+        super(PeakReached, self).__init__(compartment)
+
+    def value(self, states, initial, drift):
+        return self._total(drift)
+
+
+class CumulativeIncidence(Event):
+    """
+    Triggered when the number infected since the start (the drop in susceptibles) reaches a target
+    """
+
+    direction = 1
+
+    def __init__(self, target, compartment=0):
+        """
+
+        :param target: number of infections
+        :param compartment: index (or indices) of the susceptible compartment(s)
+        """
+        super(CumulativeIncidence, self).__init__(compartment)
+        self.target = target
+
+    def value(self, states, initial, drift):
+        return self._total(initial) - self._total(states) - self.target
+
+
+class SimulationResult(object):
+    """
+    Outcome of a simulation with stopping events, one entry per member of the batch:
+
+    event_times: interpolated time of the event that stopped the member (nan if none did)
+    event_index: index into the list of events of that event (-1 if none did)
+    final_times: reported time at which the member stopped (the last time if it never did)
+    final_states: state at final_times
+    """
+
+    def __init__(self, event_times, event_index, final_times, final_states):
+        self.event_times = event_times
+        self.event_index = event_index
+        self.final_times = final_times
+        self.final_states = final_states
+
+    def stopped(self):
+        """
+        :return: boolean array, whether each member was stopped by an event
+        """
+        return self.event_index >= 0
+
+    def reshape(self, batch_shape, state_shape):
+        """
+        :return: SimulationResult with the members laid out as batch_shape
+        """
+        return SimulationResult(self.event_times.reshape(batch_shape), self.event_index.reshape(batch_shape),
+                                self.final_times.reshape(batch_shape),
+                                self.final_states.reshape(tuple(batch_shape) + tuple(state_shape)))
+
+
+class EventTracker(object):
+    """
+    Checks the events of every member of a batch at the reported times, recording which event stopped each member and
+    when. Used by simulate_until() and stochastic.simulate_until().
+    """
+
+    def __init__(self, events, initial, initial_drift, start_time):
+        """
+
+        :param events: list of Event instances
+        :param initial: initial states, array [members, state size]
+        :param initial_drift: derivatives of the initial states (only needed if an event needs_drift)
+        :param start_time: time of the initial states
+        """
+        self.events = list(events)
+        self.initial = np.asarray(initial)
+        self.needs_drift = any(event.needs_drift for event in self.events)
+
+        members = len(self.initial)
+        self._previous = [np.asarray(event.value(self.initial, self.initial, initial_drift), dtype=float)
+                          for event in self.events]
+        self._previous_time = np.full(members, float(start_time))
+        self.event_times = np.full(members, np.nan)
+        self.event_index = np.full(members, -1)
+        self.stop_times = np.full(members, np.nan)
+
+    def check(self, rows, times, states, drift):
+        """
+        :param rows: indices of the members being checked
+        :param times: reported time (scalar, or one per member)
+        :param states: states of those members at times, array [len(rows), state size]
+        :param drift: derivatives of states (only needed if an event needs_drift)
+        :return: boolean array over rows, whether each member has now been stopped
+        """
+        initial = self.initial[rows]
+        times = np.broadcast_to(np.asarray(times, dtype=float), rows.shape)
+        stopped = np.zeros(len(rows), dtype=bool)
+
+        for index, event in enumerate(self.events):
+            current = np.asarray(event.value(states, initial, drift), dtype=float)
+            previous = self._previous[index][rows]
+            fired = event.crossed(previous, current) & ~stopped
+            if fired.any():
+                fraction = previous[fired] / (previous[fired] - current[fired])
+                start = self._previous_time[rows[fired]]
+                self.event_times[rows[fired]] = start + fraction * (times[fired] - start)
+                self.event_index[rows[fired]] = index
+                self.stop_times[rows[fired]] = times[fired]
+                stopped |= fired
+            self._previous[index][rows] = current
+
+        self._previous_time[rows] = times
+        return stopped
+
+
+def simulate_until(model, initial_conditions, time_vector, events, chunk=100):
+    """
+    Integrate a batch model until each member of the batch triggers one of the events (or time_vector ends)
+
+    :param model: batch model instance, with 'num_compartments' and subset() (e.g. BatchSIRModel)
+    :param initial_conditions: array of shape [batch..., num_compartments]
+    :param time_vector: increasing times at which the events are checked
+    :param events: list of Event instances
+    :param chunk: number of reported times integrated at once, before stopped members are dropped
+    :return: SimulationResult, laid out as the batch
+    """
+    initial_conditions = np.asarray(initial_conditions, dtype=float)
+    batch_shape = initial_conditions.shape[:-1]
+    compartments = model.num_compartments
+    time_vector = np.asarray(time_vector, dtype=float)
+
+    final_states = initial_conditions.reshape(-1, compartments).copy()
+    initial_drift = None
+    if any(event.needs_drift for event in events):
+        initial_drift = np.reshape(model.run(final_states.ravel(), time_vector[0]), final_states.shape)
+    tracker = EventTracker(events, final_states.copy(), initial_drift, time_vector[0])
+
+    active = np.arange(len(final_states))
+    start = 0
+    while active.size and start < len(time_vector) - 1:
+        stop = min(start + chunk, len(time_vector) - 1)
+        members = model.subset(active)
+        populations = integrate_batch(members, final_states[active], time_vector[start:stop + 1])
+
+        live = np.ones(len(active), dtype=bool)
+        for step in range(1, len(populations)):
+            live_index = np.flatnonzero(live)
+            rows = active[live_index]
+            states = populations[step][live_index]
+            drift = None
+            if tracker.needs_drift:
+                drift = np.reshape(members.run(populations[step].ravel(), time_vector[start + step]),
+                                   populations[step].shape)[live_index]
+
+            stopped = tracker.check(rows, time_vector[start + step], states, drift)
+            final_states[rows] = states
+            live[live_index[stopped]] = False
+            if not live.any():
+                break
+
+        active = active[live]
+        start = stop
+
+    final_times = np.where(tracker.event_index >= 0, tracker.stop_times, time_vector[-1])
+    result = SimulationResult(tracker.event_times, tracker.event_index, final_times, final_states)
+    return result.reshape(batch_shape, (compartments,))
+
+
+def iterate_batch(model, initial_conditions, time_vector, chunk=100, **options):
+    """
+    Integrate a batch model chunk by chunk, restarting the solver from the last state of the previous chunk, so only
+    one chunk of the trajectory is in memory at a time
+
+    :param model: batch model instance, with 'num_compartments' (e.g. BatchSIRModel)
+    :param initial_conditions: array of shape [batch..., num_compartments]
+    :param time_vector: times at which the populations are reported
+    :param chunk: number of reported times per chunk
+    :param options: further keyword arguments for odeint
+    :return: generator of (times, populations) pairs, populations of shape [len(times), batch..., num_compartments];
+    the chunks together cover time_vector once
+    """
+    time_vector = np.asarray(time_vector, dtype=float)
+    state = np.asarray(initial_conditions, dtype=float)
+    if len(time_vector) == 1:
+        yield time_vector, state[np.newaxis].copy()
+        return
+
+    start = 0
+    while start < len(time_vector) - 1:
+        stop = min(start + chunk, len(time_vector) - 1)
+        populations = integrate_batch(model, state, time_vector[start:stop + 1], **options)
+        state = populations[-1]
+
+        # every chunk after the first starts from the time the previous one ended on
+        first = 0 if start == 0 else 1
+        yield time_vector[start + first:stop + 1], populations[first:]
+        start = stop
@@ -13,6 +13,118 @@
 
 import numpy as np
 import math
+__can_integrate__ = True
+try:
+    import scipy.integrate as scint
+    import scipy.linalg as linalg
+    import scipy.sparse as sparse
+    import scipy.sparse.linalg as sparse_linalg
+except ImportError:
+    __can_integrate__ = False
+
+# Multiplier applied to the estimated burn-out time before comparing it with a horizon. The estimate treats the growth and
+# decline phases as exponential, which underestimates the time spent around the peak by up to a factor of ~1.8.
+BURNOUT_SAFETY_FACTOR = 2.0
+
+# Networks up to this many patches have their next-generation matrix formed densely; larger ones use ARPACK
+DENSE_NEXT_GENERATION_PATCHES = 64
+
+
+def _sir_final_size(r0, population, initial_infected, infectious_period, horizon, threshold):
+    """
+    Final size of an SIR epidemic from the final-size relation ln(S_0 / S_inf) = R_0 (N - R_init - S_inf) / N, solved
+    by Newton iteration on u = ln(S_inf / N), together with whether it is reached within horizon.
+
+    :return: tuple (removed, burnt_out)
+    """
+    r0 = np.asarray(r0, dtype=float)
+    population = np.asarray(population, dtype=float)
+    r0, population, initial_infected, infectious_period = np.broadcast_arrays(
+        r0, population, np.asarray(initial_infected, dtype=float), np.asarray(infectious_period, dtype=float))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s0 = (population - initial_infected) / population
+        i0 = initial_infected / population
+        log_s0 = np.log(s0)
+
+        # f(u) = u - ln(s0) + R0 (s0 + i0 - e^u) is concave and increasing left of its relevant root, so Newton's method
+        # started from below converges monotonically
+        u = log_s0 - r0 * (s0 + i0)
+        for _ in range(100):
+            step = (u - log_s0 + r0 * (s0 + i0 - np.exp(u))) / (1 - r0 * np.exp(u))
+            step = np.where(np.isfinite(step), step, 0.0)
+            u = u - step
+            if np.all(np.abs(step) <= 1e-14 * np.maximum(1.0, np.abs(u))):
+                break
+        s_inf = np.where(s0 > 0, np.exp(u), 0.0)
+        removed = population * (1 - s_inf)
+
+        if horizon is None:
+            return removed, np.ones(removed.shape, dtype=bool)
+
+        # estimated time until fewer than 'threshold' cases are outstanding: exponential growth to the peak, then
+        # exponential decline at the final (slowest relevant) rate
+        rs0 = r0 * s0
+        rs_inf = r0 * s_inf
+        epidemic = rs0 > 1
+        peak = np.where(epidemic, population * (i0 + s0 - (1 + np.log(rs0)) / r0), initial_infected)
+        growth_time = np.where(epidemic, infectious_period * np.log(peak / initial_infected) / (rs0 - 1), 0.0)
+        decline_rate = np.where(epidemic, 1 - rs_inf, 1 - rs0)
+        decline_time = infectious_period * np.log(np.maximum(peak / (threshold * decline_rate), 1.0)) / decline_rate
+        burnout_time = BURNOUT_SAFETY_FACTOR * (growth_time + decline_time)
+
+    burnt_out = (decline_rate > 0) & np.isfinite(burnout_time) & (burnout_time <= horizon)
+
+    return removed, burnt_out
+
+
+def _power_iteration(matvec, size, tol, maxiter):
+    """
+    Spectral radius of a non-negative operator by power iteration from a positive vector
+    """
+    vector = np.ones(size) / np.sqrt(size)
+    radius = 0.0
+    for _ in range(maxiter):
+        image = matvec(vector)
+        estimate = np.linalg.norm(image)
+        if estimate == 0:
+            return 0.0
+        vector = image / estimate
+        if abs(estimate - radius) <= tol * estimate:
+            return estimate
+        radius = estimate
+
+    print('aur.resop: Warning: power iteration for R0 did not converge in %d iterations' % maxiter)
+    return radius
+
+
+def _jacobi_solve(diagonal, off_diagonal, right_hand_side, tol, maxiter):
+    """
+    Solve (diag(diagonal) - off_diagonal) x = right_hand_side by Jacobi iteration, for non-negative off_diagonal with
+    column sums below the diagonal (strict column diagonal dominance, so the iteration contracts in the 1-norm)
+    """
+    solution = right_hand_side / diagonal
+    for _ in range(maxiter):
+        updated = (right_hand_side + off_diagonal.dot(solution)) / diagonal
+        change = np.abs(updated - solution).sum()
+        solution = updated
+        if change <= tol * np.abs(solution).sum():
+            break
+    return solution
+
+
+def _next_generation_radius(scale, solve, size, tol, maxiter):
+    """
+    Spectral radius of the next-generation matrix diag(scale) V^-1, given a solver for V, with ARPACK (falling back to
+    power iteration if it does not converge)
+    """
+    operator = sparse_linalg.LinearOperator((size, size), matvec=lambda vector: scale * solve(vector), dtype=float)
+    try:
+        values = sparse_linalg.eigs(operator, k=1, which='LM', v0=np.ones(size), tol=tol, maxiter=maxiter,
+                                    return_eigenvectors=False)
+        return float(np.abs(values[0]))
+    except sparse_linalg.ArpackNoConvergence:
+        return _power_iteration(operator.matvec, size, tol, maxiter)
 
 
 class BaseModel(object):
@@ -29,6 +141,14 @@ class BaseModel(object):
     def run(self, previous_population, time_vector):
         raise NotImplementedError()
 
+    def jacobian(self, previous_population, time_vector):
+        """
+        Analytic Jacobian of run() with respect to the population, with the same call signature, so it can be passed as
+        e.g. "scint.odeint(model.run, initial_conditions, timespan, Dfun=model.jacobian)". For solve_ivp, which calls
+        fun(t, y), use "jac=lambda t, y: model.jacobian(y, t)".
+        """
+        raise NotImplementedError()
+
     def rnought(self):
         raise NotImplementedError()
 
@@ -69,6 +189,30 @@ class SIRModel(BaseModel):
 
         return d_pop
 
+    def jacobian(self, previous_population, time_vector):
+        """
+        Analytic Jacobian of run(), for use as the 'Dfun' of odeint
+        :param previous_population: vector (S, I, R)
+        :param time_vector: time (unused, the model is autonomous)
+        :return: 3 x 3 matrix d(d_pop)/d(previous_population)
+        """
+        susceptible, infectious = previous_population[0], previous_population[1]
+        population = sum(previous_population)
+        infections = self.transmission * susceptible * infectious / population
+
+        # derivative of the infection term, population includes every compartment
+        d_infections = np.full(3, -infections / population)
+        d_infections[0] += self.transmission * infectious / population
+        d_infections[1] += self.transmission * susceptible / population
+
+        jac = np.zeros((3, 3))
+        jac[0] = -d_infections
+        jac[1] = d_infections
+        jac[1, 1] -= 1 / self.infectious_period
+        jac[2, 1] = 1 / self.infectious_period
+
+        return jac
+
     def rnought(self):
         """
         Calculate the basic reproduction number for this model
@@ -77,6 +221,25 @@ class SIRModel(BaseModel):
 
         return self.transmission * self.infectious_period
 
+    @staticmethod
+    def final_size(r0, population, initial_infected=1.0, infectious_period=1.0, horizon=None, threshold=0.5):
+        """
+        Closed-form final size of the epidemic, i.e. the removed compartment once the epidemic has burnt out, without
+        integrating the trajectory. All arguments may be vectors (broadcast against each other).
+
+        :param r0: basic reproduction number(s)
+        :param population: population size(s), S_0 + I_0
+        :param initial_infected: initial number infectious, I_0
+        :param infectious_period: average infectious period(s), in days
+        :param horizon: number of days simulated. If given, burnt_out reports whether the epidemic is expected to have
+        burnt out (fewer than 'threshold' cases still to come) by then; if None, burnt_out is all True
+        :param threshold: number of outstanding cases below which the epidemic counts as burnt out
+        :return: tuple (removed, burnt_out) of arrays. Where burnt_out is False, removed is the eventual final size,
+        not the value at the horizon, and the trajectory has to be integrated instead
+        """
+
+        return _sir_final_size(r0, population, initial_infected, infectious_period, horizon, threshold)
+
 
 class SEIRModel(BaseModel):
     """
@@ -116,6 +279,31 @@ class SEIRModel(BaseModel):
 
         return d_pop
 
+    def jacobian(self, previous_population, t):
+        """
+        Analytic Jacobian of run(), for use as the 'Dfun' of odeint
+        :param previous_population: vector (S, E, I, R)
+        :param t: time (unused, the model is autonomous)
+        :return: 4 x 4 matrix d(d_pop)/d(previous_population)
+        """
+        susceptible, infectious = previous_population[0], previous_population[2]
+        population = sum(previous_population)
+        infections = self.transmission * susceptible * infectious / population
+
+        d_infections = np.full(4, -infections / population)
+        d_infections[0] += self.transmission * infectious / population
+        d_infections[2] += self.transmission * susceptible / population
+
+        jac = np.zeros((4, 4))
+        jac[0] = -d_infections
+        jac[1] = d_infections
+        jac[1, 1] -= 1 / self.incubation_period
+        jac[2, 1] = 1 / self.incubation_period
+        jac[2, 2] = -1 / self.infectious_period
+        jac[3, 2] = 1 / self.infectious_period
+
+        return jac
+
     def rnought(self):
         """
         Calculate the basic reproduction number for this model
@@ -166,6 +354,33 @@ class SIRSModel(BaseModel):
 
         return d_pop
 
+    def jacobian(self, previous_population, time_vector):
+        """
+        Analytic Jacobian of run(), for use as the 'Dfun' of odeint
+        :param previous_population: vector (S, I, R, Cumulative number infected)
+        :param time_vector: time (unused, the model is autonomous)
+        :return: 4 x 4 matrix d(d_pop)/d(previous_population)
+        """
+        susceptible, infectious = previous_population[0], previous_population[1]
+        population = sum(previous_population)
+        infections = self.transmission * susceptible * infectious / population
+
+        # as in run(), the population sum includes the cumulative number infected
+        d_infections = np.full(4, -infections / population)
+        d_infections[0] += self.transmission * infectious / population
+        d_infections[1] += self.transmission * susceptible / population
+
+        jac = np.zeros((4, 4))
+        jac[0] = -d_infections
+        jac[0, 2] += self.waning_immunity
+        jac[1] = d_infections
+        jac[1, 1] -= 1 / self.infectious_period
+        jac[2, 1] = 1 / self.infectious_period
+        jac[2, 2] = -self.waning_immunity
+        jac[3] = d_infections
+
+        return jac
+
     def rnought(self):
         """
         Calculate the basic reproduction number for this model
@@ -174,6 +389,28 @@ class SIRSModel(BaseModel):
 
         return self.transmission * self.infectious_period
 
+    @staticmethod
+    def final_size(r0, population, waning_immunity, initial_infected=1.0, infectious_period=1.0, horizon=None,
+                   threshold=0.5):
+        """
+        Closed-form cumulative number infected, for the entries where the SIR final-size relation applies: with no
+        waning immunity, or for subcritical epidemics (R0 <= 1), where reinfections are negligible. With waning immunity
+        and R0 > 1 the disease becomes endemic and never burns out, so those entries are reported as not burnt out.
+
+        :param r0: basic reproduction number(s)
+        :param population: population size(s), S_0 + I_0
+        :param waning_immunity: rate(s) at which the removed become susceptible again
+        :param initial_infected: initial number infectious, I_0
+        :param infectious_period: average infectious period(s), in days
+        :param horizon: number of days simulated, see SIRModel.final_size
+        :param threshold: number of outstanding cases below which the epidemic counts as burnt out
+        :return: tuple (cumulative_infected, burnt_out) of arrays
+        """
+        cumulative, burnt_out = _sir_final_size(r0, population, initial_infected, infectious_period, horizon, threshold)
+        endemic = (np.asarray(waning_immunity) > 0) & (np.asarray(r0) > 1)
+
+        return cumulative, burnt_out & ~endemic
+
 
 class SINRModel(BaseModel):
     """
@@ -216,6 +453,36 @@ class SINRModel(BaseModel):
 
         return d_pop
 
+    def jacobian(self, previous_population, time_vector):
+        """
+        Analytic Jacobian of run(), for use as the 'Dfun' of odeint
+        :param previous_population: vector (S, In, R), with 'n' infectious compartments
+        :param time_vector: time (unused, the model is autonomous)
+        :return: (n + 2) x (n + 2) matrix d(d_pop)/d(previous_population)
+        """
+        size = 2 + self.n
+        susceptible = previous_population[0]
+        population = sum(previous_population)
+        total_infectious = sum(previous_population[1:-2])
+        infections = self.transmission * susceptible * total_infectious / population
+        progression = self.n / self.infectious_period
+
+        # as in run(), the force of infection comes from previous_population[1:-2]
+        d_infections = np.full(size, -infections / population)
+        d_infections[0] += self.transmission * total_infectious / population
+        d_infections[1:size - 2] += self.transmission * susceptible / population
+
+        jac = np.zeros((size, size))
+        jac[0] = -d_infections
+        jac[1] = d_infections
+        jac[1, 1] -= progression
+        stages = np.arange(2, size - 1)
+        jac[stages, stages - 1] = progression
+        jac[stages, stages] = -progression
+        jac[size - 1, size - 2] = progression
+
+        return jac
+
     def rnought(self, exp_growth):
         """
         Calculate the basic reproduction number for this model
@@ -227,7 +494,9 @@ class SINRModel(BaseModel):
 
 class SIRMigrationModel(BaseModel):
     """
-    Implementation of an SIR migration model (single SIR model per patch, don't track locals vs travellers)
+    Implementation of an SIR migration model (single SIR model per patch, don't track locals vs travellers). The travel
+    matrix may be dense or a scipy.sparse matrix; with sparse mobility the right-hand side and Jacobian stay sparse, so
+    networks of many thousands of patches fit in memory.
     """
 
     def __init__(self, transmission, infectious_period, travel, patches):
@@ -235,52 +504,149 @@ class SIRMigrationModel(BaseModel):
 
         :param transmission: vector of size patches, transmission rate for each patch
         :param infectious_period: vector of size patches, infectious period for each patch
-        :param travel: 2D matrix of size patches x patches [(rows "to"), (columns "from")]
+        :param travel: 2D matrix (dense or scipy.sparse) of size patches x patches [(rows "to"), (columns "from")]
         :param patches: scalar, number of patches
         """
         BaseModel.__init__(self, transmission=transmission, infectious_period=infectious_period)
 
-        self.travel = travel
         self.patches = patches
+        self._transmission = np.broadcast_to(np.asarray(transmission, dtype=float), (patches,))
+        self._recovery = 1.0 / np.broadcast_to(np.asarray(infectious_period, dtype=float), (patches,))
+
+        # travel only changes through the constructor, so the rate of leaving each patch (column sums) and the net
+        # migration operator (arrivals minus departures) are computed once
+        if __can_integrate__ and sparse.issparse(travel):
+            self.travel = sparse.csr_matrix(travel, dtype=float)
+            self._leaving = np.asarray(self.travel.sum(axis=0)).ravel()
+            self._migration = (self.travel - sparse.diags(self._leaving)).tocsr()
+        else:
+            self.travel = np.asarray(travel, dtype=float)
+            self._leaving = self.travel.sum(axis=0)
+            self._migration = self.travel - np.diag(self._leaving)
 
     def parameters_string(self):
-        return "(transmission infectious_period patches travel) = (%f %f %f %s)" % \
-               (self.transmission, self.infectious_period, self.patches, str(self.travel))
+        return "(transmission infectious_period patches travel) = (%s %s %d %s)" % \
+               (str(self.transmission), str(self.infectious_period), self.patches, str(self.travel))
 
     def run(self, previous_population, time_vector):
         """
 
-        :param previous_population: (flattened) 2D matrix of size [number compartments, number of patches]
+        :param previous_population: (flattened) 2D matrix of size [number of patches, number compartments], with
+        (S, I, R, Cumulative number infected) for each patch
         :param time_vector: time vector [start day, assuming day increment, end day]
-        :return: integrated population values, for each compartment in each patch (for each time increment)
+        :return: the flattened derivatives, in the same layout as previous_population
         """
         previous_population = previous_population.reshape(self.patches, -1)
+        susceptible, infectious = previous_population[:, 0], previous_population[:, 1]
 
-        d_pop = np.zeros((4, self.patches))
-        patch_populations = previous_population.sum(axis=1)  # this is a problem. It now includes cumulative number infected in each patch...
-        leaving = sum(self.travel)
+        # the cumulative number infected is not part of the population
+        patch_populations = previous_population[:, :3].sum(axis=1)
+        infections = self._transmission * susceptible * infectious / patch_populations
+        recoveries = infectious * self._recovery
 
-        # linear algebra version
-        # dPop[0,:] = -self.transmission * previous_population[0,:] * previous_population[1, :] / patch_populations - np.matrixmultiply(leaving, previous_population[0,:]) + previous_population[0,:]*self.travel
+        d_pop = np.empty_like(previous_population)
+        d_pop[:, :3] = self._migration.dot(previous_population[:, :3])
+        d_pop[:, 0] -= infections
+        d_pop[:, 1] += infections - recoveries
+        d_pop[:, 2] += recoveries
+        d_pop[:, 3] = infections  # cumulative number infected in that patch
 
-        # iterating over patches version
-        for i in range(0, self.patches):
-            d_pop[0, i] = -self.transmission[i] * previous_population[i, 0] * previous_population[i, 1] / patch_populations[i] - leaving[i] * previous_population[i, 0] + np.dot(self.travel[i, :], previous_population[:, 0])
-            d_pop[1, i] = self.transmission[i] * previous_population[i, 0] * previous_population[i, 1] / \
-                         patch_populations[i] - previous_population[i, 1] / self.infectious_period[i] - leaving[i] * \
-                         previous_population[i, 1] + np.dot(self.travel[i, :], previous_population[:, 1])
-            d_pop[2, i] = previous_population[i, 1] / self.infectious_period[i] - leaving[i] * previous_population[i, 2] + np.dot(self.travel[i, :], previous_population[:, 2])
-            d_pop[3, i] = self.transmission[i] * previous_population[i, 0] * previous_population[i, 1] / patch_populations[i]  # cumulative number infected in that patch
+        return d_pop.ravel()
 
-            return d_pop.flatten()
+    def jacobian(self, previous_population, time_vector):
+        """
+        Analytic Jacobian of the migration model. The state is laid out as in run(), i.e. (S, I, R, Cumulative number
+        infected) for each patch in turn. Returned dense (e.g. for odeint's 'Dfun') when the travel matrix is dense, and
+        as a scipy.sparse matrix (e.g. for solve_ivp's 'BDF' or 'Radau' methods) when it is sparse.
 
-    def rnought(self):
+        :param previous_population: (flattened) 2D matrix of size [number of patches, number compartments]
+        :param time_vector: time (unused, the model is autonomous)
+        :return: (4 * patches) x (4 * patches) matrix d(d_pop)/d(previous_population)
         """
-        Calculate the basic reproduction number for this model
+        previous_population = previous_population.reshape(self.patches, -1)
+        susceptible, infectious = previous_population[:, 0], previous_population[:, 1]
+        patch_populations = previous_population[:, :3].sum(axis=1)
+        infections = self._transmission * susceptible * infectious / patch_populations
+
+        # local (within patch) terms, one 4 x 4 block per patch
+        d_infections = np.zeros((self.patches, 4))
+        d_infections[:, :3] = (-infections / patch_populations)[:, np.newaxis]
+        d_infections[:, 0] += self._transmission * infectious / patch_populations
+        d_infections[:, 1] += self._transmission * susceptible / patch_populations
+
+        blocks = np.zeros((self.patches, 4, 4))
+        blocks[:, 0] = -d_infections
+        blocks[:, 1] = d_infections
+        blocks[:, 1, 1] -= self._recovery
+        blocks[:, 2, 1] = self._recovery
+        blocks[:, 3] = d_infections
+
+        # travel moves S, I and R (not the cumulative count) between patches
+        moving = np.diag([1.0, 1.0, 1.0, 0.0])
+
+        if not isinstance(self._migration, np.ndarray):
+            index = np.arange(self.patches + 1)
+            local = sparse.bsr_matrix((blocks, index[:-1], index))
+            return (local + sparse.kron(self._migration, moving)).tocsr()
+
+        jac = np.kron(self._migration, moving).reshape(self.patches, 4, self.patches, 4)
+        patch_index = np.arange(self.patches)
+        jac[patch_index, :, patch_index, :] += blocks
+
+        return jac.reshape(4 * self.patches, 4 * self.patches)
+
+    def rnought(self, tol=1e-10, maxiter=10000):
+        """
+        Network-wide basic reproduction number: the spectral radius of the next-generation matrix F V^-1 at the
+        disease-free state, with F = diag(transmission) (new infections) and V = diag(1 / infectious_period + leaving)
+        - travel (recovery and movement of the infectious). Without travel this is the largest patch-wise R0; with
+        travel it is the number to compare with 1 for the whole network.
+
+        :param tol: relative tolerance of the iterative eigen-solver
+        :param maxiter: iteration limit of the iterative eigen-solver
         :return: $R_0$
         """
 
-        return np.nan  # placeholder
+        return self.rnought_batch(self._transmission, tol=tol, maxiter=maxiter)[0]
+
+    def rnought_batch(self, transmission, tol=1e-10, maxiter=10000):
+        """
+        Network-wide R0 (see rnought) for many transmission scenarios with this model's travel and infectious periods,
+        factorizing V once for all of them. For patch-wise R0 targets, use transmission = R0 / infectious_period.
+
+        :param transmission: array [scenarios, patches] (or [patches]), transmission rate in each patch
+        :param tol: relative tolerance of the iterative eigen-solver
+        :param maxiter: iteration limit of the iterative eigen-solver
+        :return: array [scenarios] of R0
+        """
+        scenarios = np.atleast_2d(np.asarray(transmission, dtype=float))
+        scenarios = np.broadcast_to(scenarios, (len(scenarios), self.patches))
+
+        # V = diag(recovery) - (travel - diag(leaving)), an M-matrix, so V^-1 and the next-generation matrix are
+        # non-negative and their spectral radius is a real eigenvalue
+        if isinstance(self._migration, np.ndarray):
+            transitions = np.diag(self._recovery) - self._migration
+        else:
+            transitions = sparse.diags(self._recovery) - self._migration
+
+        if self.patches <= DENSE_NEXT_GENERATION_PATCHES or not __can_integrate__:
+            dense = transitions if isinstance(transitions, np.ndarray) else transitions.toarray()
+            inverse = np.linalg.inv(dense)
+            return np.array([np.max(np.abs(np.linalg.eigvals(scenario[:, np.newaxis] * inverse)))
+                             for scenario in scenarios])
+
+        if isinstance(transitions, np.ndarray):
+            factors = linalg.lu_factor(transitions)
+            solve = lambda vector: linalg.lu_solve(factors, vector)
+        else:
+            # an LU factorization of a travel network fills in badly, but V is strictly diagonally dominant by columns
+            # (recovery plus leaving against leaving), so Jacobi iteration converges at least as fast as
+            # leaving / (recovery + leaving) per sweep
+            diagonal = self._recovery + self._leaving
+            solve = lambda vector: _jacobi_solve(diagonal, self.travel, vector, 0.01 * tol, maxiter)
+
+        return np.array([_next_generation_radius(scenario, solve, self.patches, tol, maxiter)
+                         for scenario in scenarios])
 
 
 class GammaContactModel(BaseModel):
@@ -308,13 +674,284 @@ class GammaContactModel(BaseModel):
 
         return d_pop
 
+    def jacobian(self, previous_population, time_vector):
+        """
+        Analytic Jacobian of run(), for use as the 'Dfun' of odeint
+        :param previous_population: vector (S, E, I, R)
+        :param time_vector: time (unused, the model is autonomous)
+        :return: 4 x 4 matrix d(d_pop)/d(previous_population)
+        """
+        susceptible, infectious = previous_population[0], previous_population[2]
+        population = sum(previous_population)
+        pressure = self.transmission * infectious / (self.shape * population)
+        force = self.shape * np.log(1 + pressure)
+
+        # d(force)/d(population) through the pressure term, plus the direct dependence on the infectious
+        d_force = np.full(4, -self.shape * pressure / ((1 + pressure) * population))
+        d_force[2] += self.transmission / ((1 + pressure) * population)
+        d_infections = susceptible * d_force
+        d_infections[0] += force
+
+        jac = np.zeros((4, 4))
+        jac[0] = self.birth - d_infections
+        jac[0, 0] -= self.death
+        jac[1] = d_infections
+        jac[1, 1] -= 1 / self.incubation_period + self.death
+        jac[2, 1] = 1 / self.incubation_period
+        jac[2, 2] = -(1 / self.infectious_period + self.death)
+        jac[3, 2] = 1 / self.infectious_period
+        jac[3, 3] = -self.death
+
+        return jac
+
     def rnought(self):
         """
-        Calculate the basic reproduction number for this model
+        Calculate the basic reproduction number for this model, from the next-generation matrix at the disease-free
+        state (where the force of infection is transmission * I / N): transmission, times the probability of surviving
+        the incubation period, times the average time infectious before recovery or death
         :return: $R_0$
         """
+        onset = 1.0 / self.incubation_period
+        recovery = 1.0 / self.infectious_period
+
+        return self.transmission * onset / ((onset + self.death) * (recovery + self.death))
+
+
+class BatchSIRModel(BaseModel):
+    """
+    Implementation of the 'SIR' model for a batch of independent populations (e.g. every patch, for both the base and
+    the intervention scenarios), advanced as a single state array so that each solver step costs one vectorized RHS
+    evaluation for the whole batch rather than one ODE solve per patch.
+    """
+
+    num_compartments = 3
+
+    def __init__(self, transmission, infectious_period):
+        """
+
+        :param transmission: array (e.g. scenarios x patches), the transmission rate for each member of the batch
+        :param infectious_period: array broadcastable to the shape of transmission, the average infectious period
+        """
+        transmission = np.asarray(transmission, dtype=float)
+        infectious_period = np.broadcast_to(np.asarray(infectious_period, dtype=float), transmission.shape)
+        BaseModel.__init__(self, transmission=transmission, infectious_period=infectious_period)
+
+        self.shape = transmission.shape
+        self._transmission = transmission.ravel()
+        self._recovery = 1.0 / infectious_period.ravel()
+
+    def parameters_string(self):
+        return "(transmission infectious_period) = (%s %s)" % (str(self.transmission), str(self.infectious_period))
+
+    def run(self, previous_population, time_vector):
+        """
+        call for ode solver, e.g. "populations = scint.odeint(batch_model.run, initial_conditions.ravel(), timespan)"
+        :param previous_population: (flattened) array of shape [batch..., 3], with (S, I, R) for each member of the batch
+        :param time_vector: time vector [start day, assuming day increment, end day]
+        :return: the flattened derivatives, in the same layout as previous_population
+        """
+        previous_population = previous_population.reshape(-1, 3)
+        population = previous_population.sum(axis=1)
+        infections = self._transmission * previous_population[:, 0] * previous_population[:, 1] / population
+        recoveries = previous_population[:, 1] * self._recovery
+
+        d_pop = np.empty_like(previous_population)
+        d_pop[:, 0] = -infections
+        d_pop[:, 1] = infections - recoveries
+        d_pop[:, 2] = recoveries
+
+        return d_pop.ravel()
+
+    def jacobian(self, previous_population, time_vector):
+        """
+        Analytic Jacobian of run(), block diagonal with one 3 x 3 block per member of the batch. Returned as a sparse
+        matrix, e.g. for "scint.solve_ivp(..., method='BDF', jac=lambda t, y: batch_model.jacobian(y, t))".
+
+        :param previous_population: (flattened) array of shape [batch..., 3]
+        :param time_vector: time (unused, the model is autonomous)
+        :return: scipy.sparse matrix of size (3 * batch) x (3 * batch)
+        """
+        previous_population = previous_population.reshape(-1, 3)
+        susceptible, infectious = previous_population[:, 0], previous_population[:, 1]
+        population = previous_population.sum(axis=1)
+        infections = self._transmission * susceptible * infectious / population
+
+        d_infections = np.repeat((-infections / population)[:, np.newaxis], 3, axis=1)
+        d_infections[:, 0] += self._transmission * infectious / population
+        d_infections[:, 1] += self._transmission * susceptible / population
+
+        blocks = np.zeros((len(previous_population), 3, 3))
+        blocks[:, 0] = -d_infections
+        blocks[:, 1] = d_infections
+        blocks[:, 1, 1] -= self._recovery
+        blocks[:, 2, 1] = self._recovery
+
+        index = np.arange(len(previous_population) + 1)
+        return sparse.bsr_matrix((blocks, index[:-1], index)).tocsr()
+
+    def rnought(self):
+        """
+        Calculate the basic reproduction number for each member of the batch
+        :return: array of $R_0$
+        """
+
+        return self.transmission * self.infectious_period
+
+    def subset(self, index):
+        """
+        :param index: indices (or boolean mask) into the flattened batch
+        :return: BatchSIRModel for just those members of the batch, flattened to one dimension
+        """
+
+        return BatchSIRModel(transmission=self.transmission.ravel()[index],
+                             infectious_period=self.infectious_period.ravel()[index])
+
+
+class BatchSEIRModel(BaseModel):
+    """
+    Implementation of the 'SEIR' model for a batch of independent populations, advanced as a single state array (see
+    BatchSIRModel).
+    """
+
+    num_compartments = 4
+
+    def __init__(self, transmission, infectious_period, incubation_period):
+        """
+
+        :param transmission: array, the transmission rate for each member of the batch
+        :param infectious_period: array broadcastable to the shape of transmission, the average infectious period
+        :param incubation_period: array broadcastable to the shape of transmission, the average incubation period
+        """
+        transmission = np.asarray(transmission, dtype=float)
+        infectious_period = np.broadcast_to(np.asarray(infectious_period, dtype=float), transmission.shape)
+        BaseModel.__init__(self, transmission=transmission, infectious_period=infectious_period)
+
+        self.incubation_period = np.broadcast_to(np.asarray(incubation_period, dtype=float), transmission.shape)
+        self.shape = transmission.shape
+        self._transmission = transmission.ravel()
+        self._recovery = 1.0 / infectious_period.ravel()
+        self._onset = 1.0 / self.incubation_period.ravel()
+
+    def parameters_string(self):
+        return "(transmission incubation_period infectious_period) = (%s %s %s)" % (
+            str(self.transmission), str(self.incubation_period), str(self.infectious_period))
+
+    def run(self, previous_population, time_vector):
+        """
+        call for ode solver, e.g. "populations = scint.odeint(batch_model.run, initial_conditions.ravel(), timespan)"
+        :param previous_population: (flattened) array of shape [batch..., 4], with (S, E, I, R) for each member
+        :param time_vector: time vector [start day, assuming day increment, end day]
+        :return: the flattened derivatives, in the same layout as previous_population
+        """
+        previous_population = previous_population.reshape(-1, 4)
+        population = previous_population.sum(axis=1)
+        infections = self._transmission * previous_population[:, 0] * previous_population[:, 2] / population
+        onsets = previous_population[:, 1] * self._onset
+        recoveries = previous_population[:, 2] * self._recovery
+
+        d_pop = np.empty_like(previous_population)
+        d_pop[:, 0] = -infections
+        d_pop[:, 1] = infections - onsets
+        d_pop[:, 2] = onsets - recoveries
+        d_pop[:, 3] = recoveries
+
+        return d_pop.ravel()
+
+    def jacobian(self, previous_population, time_vector):
+        """
+        Analytic Jacobian of run(), block diagonal with one 4 x 4 block per member of the batch
+        :param previous_population: (flattened) array of shape [batch..., 4]
+        :param time_vector: time (unused, the model is autonomous)
+        :return: scipy.sparse matrix of size (4 * batch) x (4 * batch)
+        """
+        previous_population = previous_population.reshape(-1, 4)
+        susceptible, infectious = previous_population[:, 0], previous_population[:, 2]
+        population = previous_population.sum(axis=1)
+        infections = self._transmission * susceptible * infectious / population
+
+        d_infections = np.repeat((-infections / population)[:, np.newaxis], 4, axis=1)
+        d_infections[:, 0] += self._transmission * infectious / population
+        d_infections[:, 2] += self._transmission * susceptible / population
+
+        blocks = np.zeros((len(previous_population), 4, 4))
+        blocks[:, 0] = -d_infections
+        blocks[:, 1] = d_infections
+        blocks[:, 1, 1] -= self._onset
+        blocks[:, 2, 1] = self._onset
+        blocks[:, 2, 2] = -self._recovery
+        blocks[:, 3, 2] = self._recovery
+
+        index = np.arange(len(previous_population) + 1)
+        return sparse.bsr_matrix((blocks, index[:-1], index)).tocsr()
+
+    def rnought(self):
+        """
+        Calculate the basic reproduction number for each member of the batch
+        :return: array of $R_0$
+        """
+
+        return self.transmission * self.infectious_period
+
+    def subset(self, index):
+        """
+        :param index: indices (or boolean mask) into the flattened batch
+        :return: BatchSEIRModel for just those members of the batch, flattened to one dimension
+        """
+
+        return BatchSEIRModel(transmission=self.transmission.ravel()[index],
+                              infectious_period=self.infectious_period.ravel()[index],
+                              incubation_period=self.incubation_period.ravel()[index])
+
+
+def integrate_batch(model, initial_conditions, time_vector, **options):
+    """
+    Integrate a batch model (e.g. BatchSIRModel) over time_vector as a single ODE system. Members of the batch only
+    interact through their own compartments, so the Jacobian is block diagonal and is handed to the solver as banded.
+
+    :param model: batch model instance, with 'num_compartments'
+    :param initial_conditions: array of shape [batch..., num_compartments]
+    :param time_vector: times at which the populations are reported
+    :param options: further keyword arguments for odeint, e.g. mxstep
+    :return: array of shape [len(time_vector), batch..., num_compartments]
+    """
+    if not __can_integrate__:
+        raise ImportError('"scipy" package not present - integration capability disabled')
+
+    initial_conditions = np.asarray(initial_conditions, dtype=float)
+    bandwidth = model.num_compartments - 1
+    populations = scint.odeint(model.run, initial_conditions.ravel(), time_vector, ml=bandwidth, mu=bandwidth,
+                               **options)
+
+    return populations.reshape((len(populations),) + initial_conditions.shape)
+
+
+def integrate_network(model, initial_conditions, time_vector, method='RK45', **options):
+    """
+    Integrate a metapopulation model (e.g. SIRMigrationModel with a sparse travel matrix) with scipy's solve_ivp. Unlike
+    odeint, this never allocates a dense (states x states) Jacobian, so it scales to networks of thousands of patches.
+    Mobility is usually not stiff and the explicit default needs no Jacobian; for the implicit methods ('BDF', 'Radau')
+    the model's (sparse) analytic Jacobian is used.
+
+    :param model: model instance with run() and jacobian(), e.g. SIRMigrationModel
+    :param initial_conditions: array of shape [patches, number compartments]
+    :param time_vector: times at which the populations are reported
+    :param method: solve_ivp method
+    :param options: further keyword arguments for solve_ivp, e.g. rtol and atol
+    :return: array of shape [len(time_vector), patches, number compartments]
+    """
+    if not __can_integrate__:
+        raise ImportError('"scipy" package not present - integration capability disabled')
+
+    initial_conditions = np.asarray(initial_conditions, dtype=float)
+    if method in ('BDF', 'Radau'):
+        options.setdefault('jac', lambda t, y: model.jacobian(y, t))
+
+    result = scint.solve_ivp(lambda t, y: model.run(y, t), (time_vector[0], time_vector[-1]),
+                             initial_conditions.ravel(), method=method, t_eval=time_vector, **options)
+    if not result.success:
+        raise ValueError('Integration failed: %s' % result.message)
 
-        return np.nan  # placeholder
+    return result.y.T.reshape((len(time_vector),) + initial_conditions.shape)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Solver backends for the docplex models built by InterventionPlanMultiPatch: the DOCloud service, a local CPLEX
+runtime, and HiGHS through scipy.optimize.milp (no CPLEX needed).
+
+Every backend leaves its solution on the docplex model, so the solved model is read the same way whichever backend was
+used (e.g. by get_optimization_solution()):
+
+    backend = make_backend('highs')
+    if not backend.solve(model):
+        ...
+
+A solve can be stopped early by a time limit, a relative MIP gap or a node limit, and then leaves the best solution
+found so far. Local CPLEX reports every improving incumbent to an on_incumbent callback as it is found; HiGHS (through
+scipy) and DOCloud only report the final solution.
+
+docplex has no public way to install a solution from another solver, so the HiGHS backend relies on the internal
+Model._set_solution() of docplex, as of the version it was written against (DOCPLEX_SOLUTION_VERSION, the version
+setup.py pins): HighsBackend() refuses older versions, and install_solution() fails with a clear error on a newer one
+that no longer installs the solution. HiGHS needs the optional scipy >= 1.9 ("pip install resop[highs]", Python 3.8+).
+"""
+
+import time
+
+import numpy as np
+
+from docplex.mp.constants import ComparisonType
+from docplex.mp.constr import RangeConstraint
+from docplex.mp.progress import (
+    ProgressClock,
+    SolutionListener
+)
+from docplex.mp.solution import SolveSolution
+from docplex.version import docplex_version_string
+
+__has_highs__ = True
+try:
+    import scipy.sparse as sparse
+    from scipy.optimize import Bounds, LinearConstraint, milp
+except ImportError:
+    __has_highs__ = False
+
+__has_cplex__ = True
+try:
+    import cplex
+except ImportError:
+    __has_cplex__ = False
+
+BACKENDS = ('docloud', 'cplex', 'highs')
+
+#: docplex version whose internal Model._set_solution() install_solution() was written against
+DOCPLEX_SOLUTION_VERSION = (2, 32)
+
+
+class SolverBackend(object):
+    """
+    Solves a docplex model and leaves the solution on it
+    """
+
+    name = None
+    #: whether MIP starts added to the model are used
+    supports_mip_starts = True
+    #: dict of 'status', 'nodes', 'gap' and 'time' (seconds) of the last solve
+    details = None
+
+    def solve(self, model, time_limit=None, mip_gap=None, node_limit=None, on_incumbent=None):
+        """
+        :param model: docplex Model
+        :param time_limit: seconds before the solve stops with its best solution (None for no limit)
+        :param mip_gap: relative MIP gap at which the solve stops (None for the solver's default)
+        :param node_limit: number of branch-and-bound nodes after which the solve stops (None for no limit)
+        :param on_incumbent: function called with every improving solution found (a docplex SolveSolution), or only
+        with the final one where the solver does not report them
+        :return: True if a solution was found (and is now the model's solution), False otherwise
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def _set_limits(model, time_limit, mip_gap, node_limit):
+        """
+        Set the limits of a solve as CPLEX parameters of the model
+        """
+        if time_limit is not None:
+            model.parameters.timelimit = time_limit
+        if mip_gap is not None:
+            model.parameters.mip.tolerances.mipgap = mip_gap
+        if node_limit is not None:
+            model.parameters.mip.limits.nodes = node_limit
+
+    def settings(self):
+        """
+        :return: dict of the settings that can change the solution found, e.g. for keying cached results
+        """
+        return {'name': self.name}
+
+    def _record_docplex_details(self, model):
+        solve_details = model.solve_details
+        self.details = {
+            'status': solve_details.status,
+            'nodes': solve_details.nb_nodes_processed,
+            'gap': solve_details.mip_relative_gap,
+            'time': solve_details.time
+        }
+
+    def __str__(self):
+        return self.name
+
+
+class DOCloudBackend(SolverBackend):
+    """
+    Solve on the DOCloud service
+    """
+
+    name = 'docloud'
+
+    def __init__(self, url, key):
+        """
+
+        :param url: DOCloud REST API endpoint url
+        :param key: DOCloud REST API client id/key
+        """
+        self.url = url
+        self.key = key
+
+    def solve(self, model, time_limit=None, mip_gap=None, node_limit=None, on_incumbent=None):
+        self._set_limits(model, time_limit, mip_gap, node_limit)
+        solution = model.solve(url=self.url, key=self.key)
+        self._record_docplex_details(model)
+        # the service does not report incumbents
+        if solution and on_incumbent is not None:
+            on_incumbent(solution)
+        return bool(solution)
+
+
+class CplexBackend(SolverBackend):
+    """
+    Solve with the CPLEX runtime installed locally (the "cplex" package)
+    """
+
+    name = 'cplex'
+
+    def __init__(self, log_output=False, threads=None):
+        """
+
+        :param log_output: print the CPLEX log
+        :param threads: number of threads CPLEX may use (None for its default, all cores)
+        """
+        if not __has_cplex__:
+            raise ImportError('"cplex" package not present - local CPLEX solves disabled')
+        self.log_output = log_output
+        self.threads = threads
+
+    def solve(self, model, time_limit=None, mip_gap=None, node_limit=None, on_incumbent=None):
+        if self.threads is not None:
+            model.parameters.threads = self.threads
+        self._set_limits(model, time_limit, mip_gap, node_limit)
+        listener = None
+        if on_incumbent is not None:
+            listener = IncumbentListener(on_incumbent)
+            model.add_progress_listener(listener)
+        try:
+            solution = model.solve(log_output=self.log_output)
+        finally:
+            if listener is not None:
+                model.remove_progress_listener(listener)
+        self._record_docplex_details(model)
+        return bool(solution)
+
+
+class IncumbentListener(SolutionListener):
+    """
+    Passes every improving incumbent of a local CPLEX solve to a function
+    """
+
+    def __init__(self, on_incumbent):
+        """
+
+        :param on_incumbent: function called with each incumbent, a docplex SolveSolution
+        """
+        # the Objective clock only fires when the incumbent's objective improves
+        super(IncumbentListener, self).__init__(ProgressClock.Objective)
+        self.on_incumbent = on_incumbent
+
+    def notify_solution(self, sol):
+        self.on_incumbent(sol)
+
+
+def model_arrays(model):
+    """
+    Linear constraints, bounds and objective of a docplex model as arrays, in the layout of scipy.optimize.milp
+
+    :param model: docplex Model with linear constraints (including ranges) only, and no SOS sets
+    :return: dict of 'variables' (list, in column order), 'c', 'constant' (objective constant), 'maximize', 'A' (csr
+    matrix), 'row_lb', 'row_ub', 'lb', 'ub' and 'integrality'
+    """
+    if model.number_of_quadratic_constraints or model.number_of_constraints != model.number_of_linear_constraints:
+        raise ValueError('Model %s has non-linear constraints' % model.name)
+    if model.number_of_sos:
+        raise ValueError('Model %s has SOS sets, which cannot be converted to arrays - use the "binary" or "log" '
+                         'formulation' % model.name)
+
+    variables = list(model.iter_variables())
+    infinity = model.infinity
+    lb = np.array([var.lb for var in variables], dtype=float)
+    ub = np.array([var.ub for var in variables], dtype=float)
+    lb[lb <= -infinity] = -np.inf
+    ub[ub >= infinity] = np.inf
+    integrality = np.array([1 if var.is_integer() or var.is_binary() else 0 for var in variables])
+
+    rows, columns, values = [], [], []
+    row_lb, row_ub = [], []
+    for row, constraint in enumerate(model.iter_linear_constraints()):
+        if isinstance(constraint, RangeConstraint):
+            expression = constraint.expr
+            terms = list(expression.iter_terms())
+            low = constraint.lb - expression.get_constant()
+            high = constraint.ub - expression.get_constant()
+        else:
+            left, right = constraint.left_expr, constraint.right_expr
+            terms = list(left.iter_terms()) + [(var, -coefficient) for var, coefficient in right.iter_terms()]
+            rhs = right.get_constant() - left.get_constant()
+            low = -np.inf if constraint.sense == ComparisonType.LE else rhs
+            high = np.inf if constraint.sense == ComparisonType.GE else rhs
+
+        for var, coefficient in terms:
+            rows.append(row)
+            columns.append(var.index)
+            values.append(coefficient)
+        row_lb.append(low)
+        row_ub.append(high)
+
+    # duplicate (row, column) entries, e.g. a variable on both sides of a constraint, are summed
+    a = sparse.csr_matrix((np.array(values, dtype=float), (rows, columns)), shape=(len(row_lb), len(variables)))
+
+    c = np.zeros(len(variables))
+    objective = model.objective_expr
+    for var, coefficient in objective.iter_terms():
+        c[var.index] += coefficient
+
+    return {
+        'variables': variables,
+        'c': c,
+        'constant': objective.get_constant(),
+        'maximize': not model.is_minimized(),
+        'A': a,
+        'row_lb': np.array(row_lb, dtype=float),
+        'row_ub': np.array(row_ub, dtype=float),
+        'lb': lb,
+        'ub': ub,
+        'integrality': integrality
+    }
+
+
+class HighsBackend(SolverBackend):
+    """
+    Solve with HiGHS through scipy.optimize.milp (scipy >= 1.9). The model is converted to arrays and the solution is
+    installed back on the docplex model. MIP starts are ignored.
+    """
+
+    name = 'highs'
+    supports_mip_starts = False
+
+    def __init__(self, time_limit=None, mip_rel_gap=None, verbose=False):
+        """
+
+        :param time_limit: seconds before the solve stops with its best solution (None for no limit)
+        :param mip_rel_gap: relative optimality gap at which the solve stops (None for the HiGHS default)
+        :param verbose: print the HiGHS log
+        """
+        if not __has_highs__:
+            raise ImportError('"scipy" package (>= 1.9) not present - HiGHS solves disabled')
+        if _version(docplex_version_string) < DOCPLEX_SOLUTION_VERSION:
+            raise RuntimeError('HiGHS solves need docplex %s or later to install their solutions, found docplex %s'
+                               % ('.'.join(map(str, DOCPLEX_SOLUTION_VERSION)), docplex_version_string))
+        self.time_limit = time_limit
+        self.mip_rel_gap = mip_rel_gap
+        self.verbose = verbose
+        self.result = None
+
+    def settings(self):
+        return {'name': self.name, 'time_limit': self.time_limit, 'mip_rel_gap': self.mip_rel_gap}
+
+    def solve(self, model, time_limit=None, mip_gap=None, node_limit=None, on_incumbent=None):
+        start = time.time()
+        if model.number_of_mip_starts:
+            print('aur.resop: Warning: scipy.optimize.milp does not take MIP starts - HiGHS solves from scratch')
+        arrays = model_arrays(model)
+        sign = -1.0 if arrays['maximize'] else 1.0
+
+        # limits of the solve take precedence over those of the backend
+        options = {'disp': self.verbose}
+        time_limit = time_limit if time_limit is not None else self.time_limit
+        mip_gap = mip_gap if mip_gap is not None else self.mip_rel_gap
+        if time_limit is not None:
+            options['time_limit'] = time_limit
+        if mip_gap is not None:
+            options['mip_rel_gap'] = mip_gap
+        if node_limit is not None:
+            options['node_limit'] = node_limit
+
+        constraints = ()
+        if arrays['A'].shape[0]:
+            constraints = LinearConstraint(arrays['A'], arrays['row_lb'], arrays['row_ub'])
+        self.result = milp(sign * arrays['c'], integrality=arrays['integrality'],
+                           bounds=Bounds(arrays['lb'], arrays['ub']), constraints=constraints, options=options)
+        self.details = {
+            'status': self.result.message,
+            'nodes': getattr(self.result, 'mip_node_count', 0),
+            'gap': getattr(self.result, 'mip_gap', 0.0),
+            'time': time.time() - start
+        }
+        if self.result.x is None:
+            return False
+
+        values = np.where(arrays['integrality'] == 1, np.round(self.result.x), self.result.x)
+        objective = float(np.dot(arrays['c'], values)) + arrays['constant']
+        solution = SolveSolution(model, var_value_map=dict(zip(arrays['variables'], values.tolist())), obj=objective,
+                                 solved_by=self.name)
+        install_solution(model, solution)
+        # scipy.optimize.milp does not report incumbents
+        if on_incumbent is not None:
+            on_incumbent(solution)
+        return True
+
+
+def _version(version_string):
+    """
+    :return: tuple of the leading numeric parts of a version string, e.g. (2, 32, 264) for '2.32.264'
+    """
+    parts = []
+    for part in version_string.split('.'):
+        if not part.isdigit():
+            break
+        parts.append(int(part))
+    return tuple(parts)
+
+
+def install_solution(model, solution):
+    """
+    Make a solution the model's current solution, as docplex does for solutions of its own engines
+
+    :param model: docplex Model
+    :param solution: SolveSolution of the model
+    """
+    set_solution = getattr(model, '_set_solution', None)
+    if set_solution is not None:
+        set_solution(solution)
+    else:
+        # what _set_solution() does in the docplex versions that have it
+        model._solution = solution
+    if model.solution is not solution:
+        raise RuntimeError('Cannot install a solution on a model of docplex %s - solve with the "cplex" or "docloud" '
+                           'backend instead' % docplex_version_string)
+
+
+def make_backend(name=None, docloud_url=None, docloud_client_id=None, threads=None):
+    """
+    :param name: 'docloud', 'cplex', 'highs', or None for DOCloud when a url is given, else local CPLEX when installed,
+    else HiGHS
+    :param docloud_url: DOCloud REST API endpoint url
+    :param docloud_client_id: DOCloud REST API client id/key
+    :param threads: number of threads local CPLEX solves may use (None for all cores)
+    :return: SolverBackend
+    """
+    if name is None:
+        name = 'docloud' if docloud_url else ('cplex' if __has_cplex__ else 'highs')
+    if name not in BACKENDS:
+        raise ValueError('Unknown solver backend "%s", expected one of %s' % (name, ', '.join(BACKENDS)))
+
+    if name == 'docloud':
+        return DOCloudBackend(docloud_url, docloud_client_id)
+    if name == 'cplex':
+        return CplexBackend(threads=threads)
+    return HighsBackend()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Stochastic (individual-count) versions of the SIR, SEIR and SIR migration models from sir_models.
+
+Realizations are advanced together as integer NumPy arrays, either with the exact stochastic simulation algorithm
+(Gillespie's direct method) or by tau-leaping, and can be spread over a process pool. Realizations are split into fixed
+chunks, each with its own seed stream spawned from a single seed, so results are reproducible and do not depend on the
+number of worker processes.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .sir_models import (
+    SIRModel,
+    SEIRModel,
+    SIRMigrationModel
+)
+from .simulation import EventTracker, SimulationResult
+
+METHODS = ('ssa', 'tau')
+
+
+class ReactionNetwork(object):
+    """
+    Transitions of a patch-structured compartmental model, each moving one individual from a source compartment to a
+    target compartment and optionally incrementing a counter compartment (e.g. cumulative infections). The state of a
+    realization is the flattened (patches, compartments) array of counts.
+
+    The first 'patches' transitions are infections, with per-capita rate transmission * I / N in their patch; every
+    other transition has a constant per-capita rate.
+    """
+
+    def __init__(self, shape, transmission, infectious, population, source, target, counter, rate):
+        """
+
+        :param shape: (patches, compartments)
+        :param transmission: vector of size patches, transmission rate in each patch
+        :param infectious: index of the infectious compartment within a patch
+        :param population: indices of the compartments that make up a patch's population
+        :param source: flat state index each transition takes an individual from
+        :param target: flat state index each transition moves the individual to
+        :param counter: flat state index each transition increments as well, or -1
+        :param rate: per-capita rate of each transition (ignored for the infections)
+        """
+        self.shape = tuple(shape)
+        self.num_states = int(np.prod(shape))
+        self.transmission = np.asarray(transmission, dtype=float)
+        self.infectious = infectious
+        self.population = list(population)
+        self.source = np.asarray(source)
+        self.target = np.asarray(target)
+        self.counter = np.asarray(counter)
+        self.rate = np.asarray(rate, dtype=float)
+
+        # transitions grouped by source compartment (padded with -1), for tau-leaping
+        by_source = [np.nonzero(self.source == state)[0] for state in range(self.num_states)]
+        width = max(1, max(len(group) for group in by_source))
+        self.groups = np.full((self.num_states, width), -1)
+        for state, group in enumerate(by_source):
+            self.groups[state, :len(group)] = group
+
+    def per_capita_rates(self, counts):
+        """
+        :param counts: array [realizations, num_states]
+        :return: array [realizations, transitions]
+        """
+        state = counts.reshape((len(counts),) + self.shape)
+        patches = self.shape[0]
+        population = state[:, :, self.population].sum(axis=2)
+
+        rates = np.empty((len(counts), len(self.rate)))
+        rates[:, patches:] = self.rate[patches:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates[:, :patches] = np.where(population > 0,
+                                          self.transmission * state[:, :, self.infectious] / population, 0.0)
+        return rates
+
+    def propensities(self, counts):
+        """
+        :param counts: array [realizations, num_states]
+        :return: array [realizations, transitions]
+        """
+        return self.per_capita_rates(counts) * counts[:, self.source]
+
+    def drift(self, counts):
+        """
+        Expected rate of change of the counts (the deterministic right-hand side)
+
+        :param counts: array [realizations, num_states]
+        :return: array [realizations, num_states]
+        """
+        propensities = self.propensities(counts)
+        drift = np.zeros(counts.shape)
+        np.subtract.at(drift, (slice(None), self.source), propensities)
+        np.add.at(drift, (slice(None), self.target), propensities)
+        counted = self.counter >= 0
+        np.add.at(drift, (slice(None), self.counter[counted]), propensities[:, counted])
+        return drift
+
+
+def _sir_network(model):
+    # (S, I, R): infection S -> I, recovery I -> R
+    return ReactionNetwork(shape=(1, 3), transmission=[model.transmission], infectious=1, population=[0, 1, 2],
+                           source=[0, 1], target=[1, 2], counter=[-1, -1], rate=[0.0, 1.0 / model.infectious_period])
+
+
+def _seir_network(model):
+    # (S, E, I, R): infection S -> E, end of incubation E -> I, recovery I -> R
+    return ReactionNetwork(shape=(1, 4), transmission=[model.transmission], infectious=2, population=[0, 1, 2, 3],
+                           source=[0, 1, 2], target=[1, 2, 3], counter=[-1, -1, -1],
+                           rate=[0.0, 1.0 / model.incubation_period, 1.0 / model.infectious_period])
+
+
+def _migration_network(model):
+    # per patch (S, I, R, Cumulative number infected): infection S -> I (counted), recovery I -> R, and travel of S, I
+    # and R along every non-zero entry of the travel matrix [(rows "to"), (columns "from")]
+    patches = model.patches
+    flat = np.arange(4 * patches).reshape(patches, 4)
+    travel = model.travel.tocoo() if hasattr(model.travel, 'tocoo') else None
+    if travel is not None:
+        destinations, origins, travel_rates = travel.row, travel.col, travel.data
+    else:
+        destinations, origins = np.nonzero(model.travel)
+        travel_rates = model.travel[destinations, origins]
+    keep = (destinations != origins) & (travel_rates > 0)
+    destinations, origins, travel_rates = destinations[keep], origins[keep], travel_rates[keep]
+
+    source = [flat[:, 0], flat[:, 1]]
+    target = [flat[:, 1], flat[:, 2]]
+    counter = [flat[:, 3], np.full(patches, -1)]
+    rate = [np.zeros(patches), model._recovery]
+    for compartment in range(3):
+        source.append(flat[origins, compartment])
+        target.append(flat[destinations, compartment])
+        counter.append(np.full(len(origins), -1))
+        rate.append(travel_rates)
+
+    return ReactionNetwork(shape=(patches, 4), transmission=model._transmission, infectious=1, population=[0, 1, 2],
+                           source=np.concatenate(source), target=np.concatenate(target),
+                           counter=np.concatenate(counter), rate=np.concatenate(rate))
+
+
+_NETWORKS = {
+    SIRModel: _sir_network,
+    SEIRModel: _seir_network,
+    SIRMigrationModel: _migration_network,
+}
+
+
+def reaction_network(model):
+    """
+    :param model: SIRModel, SEIRModel or SIRMigrationModel instance
+    :return: ReactionNetwork
+    """
+    if type(model) not in _NETWORKS:
+        raise ValueError('No stochastic version of model type %s' % type(model).__name__)
+
+    return _NETWORKS[type(model)](model)
+
+
+def _apply(counts, rows, transitions, network):
+    """
+    Fire one transition in each of the given realizations
+    """
+    counts[rows, network.source[transitions]] -= 1
+    counts[rows, network.target[transitions]] += 1
+    counted = network.counter[transitions] >= 0
+    counts[rows[counted], network.counter[transitions[counted]]] += 1
+
+
+def _stop(tracker, network, rows, times, counts, out, next_output):
+    """
+    Check the events of the given realizations at their latest reported times; the state of those that stop is held
+    for the remaining reported times. Returns the stopped rows.
+    """
+    drift = network.drift(counts[rows]) if tracker.needs_drift else None
+    stopped = rows[tracker.check(rows, times, counts[rows], drift)]
+    for row in stopped:
+        out[row, next_output[row]:] = counts[row]
+    return stopped
+
+
+def _ssa(network, counts, time_vector, random, out, tracker=None):
+    """
+    Gillespie's direct method, one transition per active realization per iteration. out[r, k] receives the state of
+    realization r at time_vector[k]. With a tracker, realizations stop at their first event.
+    """
+    num_times = len(time_vector)
+    now = np.full(len(counts), float(time_vector[0]))
+    next_output = np.zeros(len(counts), dtype=int)
+    active = np.arange(len(counts))
+
+    while active.size:
+        propensities = network.propensities(counts[active])
+        cumulative = np.cumsum(propensities, axis=1)
+        total = cumulative[:, -1]
+        with np.errstate(divide='ignore'):
+            jump_time = now[active] - np.log(1.0 - random.random(len(active))) / total
+
+        # record every output time passed before the jump (the state is constant until then)
+        passed = time_vector[next_output[active]] < jump_time
+        while passed.any():
+            rows = active[passed]
+            out[rows, next_output[rows]] = counts[rows]
+            next_output[rows] += 1
+            if tracker is not None:
+                stopped = _stop(tracker, network, rows, time_vector[next_output[rows] - 1], counts, out, next_output)
+                next_output[stopped] = num_times
+            waiting = next_output[active] < num_times
+            passed = waiting & (time_vector[np.minimum(next_output[active], num_times - 1)] < jump_time)
+
+        running = next_output[active] < num_times
+        target = (1.0 - random.random(np.count_nonzero(running))) * total[running]
+        transitions = np.minimum((cumulative[running] < target[:, np.newaxis]).sum(axis=1), cumulative.shape[1] - 1)
+        _apply(counts, active[running], transitions, network)
+
+        now[active] = jump_time
+        active = active[running]
+
+
+def _tau_leap(network, counts, time_vector, tau, random, out, tracker=None):
+    """
+    Tau-leaping with Euler-multinomial steps: over each step the number leaving a compartment is binomial given its
+    total per-capita exit rate, and is split between the competing transitions, so counts never become negative. With
+    a tracker, realizations stop at their first event.
+    """
+    now = float(time_vector[0])
+    groups = network.groups
+    valid = groups >= 0
+    members = np.where(valid, groups, 0)
+    last = valid & ~np.concatenate([valid[:, 1:], np.zeros((len(groups), 1), dtype=bool)], axis=1)
+    active = np.arange(len(counts))
+    next_output = np.zeros(len(counts), dtype=int)
+
+    for k, output_time in enumerate(time_vector):
+        while now + tau <= output_time + 1e-9 * tau:
+            rates = network.per_capita_rates(counts[active])
+            grouped = np.where(valid, rates[:, members], 0.0)
+            exit_rate = grouped.sum(axis=2)
+            remaining = random.binomial(counts[active], -np.expm1(-exit_rate * tau))
+            remaining_rate = exit_rate
+
+            fired = np.zeros(rates.shape, dtype=counts.dtype)
+            for column in range(groups.shape[1]):
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    share = np.where(remaining_rate > 0, grouped[:, :, column] / remaining_rate, 0.0)
+                share = np.where(last[:, column], 1.0, np.clip(share, 0.0, 1.0))
+                share = np.where(valid[:, column], share, 0.0)
+                taken = random.binomial(remaining, share)
+                fired[:, groups[valid[:, column], column]] = taken[:, valid[:, column]]
+                remaining = remaining - taken
+                remaining_rate = remaining_rate - grouped[:, :, column]
+
+            stepped = counts[active]
+            np.subtract.at(stepped, (slice(None), network.source), fired)
+            np.add.at(stepped, (slice(None), network.target), fired)
+            counted = network.counter >= 0
+            np.add.at(stepped, (slice(None), network.counter[counted]), fired[:, counted])
+            counts[active] = stepped
+            now += tau
+        out[active, k] = counts[active]
+
+        if tracker is not None:
+            next_output[active] = k + 1
+            stopped = _stop(tracker, network, active, output_time, counts, out, next_output)
+            active = np.setdiff1d(active, stopped, assume_unique=True)
+            if not active.size:
+                break
+
+
+def _simulate_chunk(arguments):
+    model, initial_conditions, time_vector, realizations, method, tau, seed_sequence, events = arguments
+    network = reaction_network(model)
+    random = np.random.default_rng(seed_sequence)
+
+    counts = np.tile(np.asarray(initial_conditions, dtype=np.int64).reshape(1, -1), (realizations, 1))
+    out = np.zeros((realizations, len(time_vector), network.num_states), dtype=np.int64)
+    tracker = None
+    if events is not None:
+        initial_drift = network.drift(counts) if any(event.needs_drift for event in events) else None
+        tracker = EventTracker(events, counts.copy(), initial_drift, time_vector[0])
+
+    if method == 'ssa':
+        _ssa(network, counts, time_vector, random, out, tracker)
+    else:
+        _tau_leap(network, counts, time_vector, tau, random, out, tracker)
+
+    if tracker is None:
+        return out
+    return out, tracker.event_times, tracker.event_index, tracker.stop_times
+
+
+def _simulate_chunks(model, initial_conditions, time_vector, realizations, method, tau, seed, processes, chunk_size,
+                     events):
+    if method not in METHODS:
+        raise ValueError('Unknown stochastic method "%s", expected one of %s' % (method, ', '.join(METHODS)))
+
+    if method == 'tau' and tau is None:
+        tau = 0.1 * np.min(np.diff(time_vector)) if len(time_vector) > 1 else 0.1
+
+    sizes = [min(chunk_size, realizations - start) for start in range(0, realizations, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = [(model, initial_conditions, time_vector, size, method, tau, seed_sequence, events)
+              for size, seed_sequence in zip(sizes, seed_sequences)]
+
+    if processes is None or processes == 1:
+        return [_simulate_chunk(chunk) for chunk in chunks]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_simulate_chunk, chunks))
+
+
+def simulate(model, initial_conditions, time_vector, realizations, method='ssa', tau=None, seed=None, processes=None,
+             chunk_size=1000):
+    """
+    Simulate realizations of the stochastic version of a model
+
+    :param model: SIRModel, SEIRModel or SIRMigrationModel instance, giving the rates
+    :param initial_conditions: integer counts, laid out as for the model's run() (e.g. (S_0, I_0, R_0))
+    :param time_vector: increasing times at which the state is reported
+    :param realizations: number of realizations
+    :param method: 'ssa' (exact) or 'tau' (tau-leaping)
+    :param tau: tau-leaping step size, in days (defaults to a tenth of the smallest output interval)
+    :param seed: seed for the random number generator; chunk i uses the i-th stream spawned from it
+    :param processes: number of worker processes; None or 1 simulates in this process
+    :param chunk_size: number of realizations simulated together in one chunk
+    :return: integer array [realizations, len(time_vector), state shape...]
+    """
+    time_vector = np.asarray(time_vector, dtype=float)
+    results = _simulate_chunks(model, initial_conditions, time_vector, realizations, method, tau, seed, processes,
+                               chunk_size, None)
+
+    state_shape = np.shape(initial_conditions)
+    out = np.concatenate(results, axis=0) if results else np.zeros((0, len(time_vector), int(np.prod(state_shape))))
+    return out.reshape((realizations, len(time_vector)) + state_shape)
+
+
+def simulate_until(model, initial_conditions, time_vector, realizations, events, method='ssa', tau=None, seed=None,
+                   processes=None, chunk_size=1000):
+    """
+    Simulate realizations of the stochastic version of a model, each stopping at the first of the events it triggers
+    (checked at the reported times). Realizations use the same random streams as simulate() until they stop.
+
+    :param model: SIRModel, SEIRModel or SIRMigrationModel instance, giving the rates
+    :param initial_conditions: integer counts, laid out as for the model's run() (e.g. (S_0, I_0, R_0))
+    :param time_vector: increasing times at which the events are checked
+    :param realizations: number of realizations
+    :param events: list of simulation.Event instances, with compartments indexing the flattened state
+    :param method: 'ssa' (exact) or 'tau' (tau-leaping)
+    :param tau: tau-leaping step size, in days (defaults to a tenth of the smallest output interval)
+    :param seed: seed for the random number generator; chunk i uses the i-th stream spawned from it
+    :param processes: number of worker processes; None or 1 simulates in this process
+    :param chunk_size: number of realizations simulated together in one chunk
+    :return: simulation.SimulationResult, one entry per realization
+    """
+    time_vector = np.asarray(time_vector, dtype=float)
+    results = _simulate_chunks(model, initial_conditions, time_vector, realizations, method, tau, seed, processes,
+                               chunk_size, list(events))
+
+    state_shape = np.shape(initial_conditions)
+    num_states = int(np.prod(state_shape))
+    event_times = np.concatenate([result[1] for result in results]) if results else np.zeros(0)
+    event_index = np.concatenate([result[2] for result in results]) if results else np.zeros(0, dtype=int)
+    stop_times = np.concatenate([result[3] for result in results]) if results else np.zeros(0)
+    final_states = np.concatenate([result[0][:, -1] for result in results]) if results else np.zeros((0, num_states))
+    final_times = np.where(event_index >= 0, stop_times, time_vector[-1])
+
+    result = SimulationResult(event_times, event_index, final_times, final_states)
+    return result.reshape((realizations,), state_shape)
+
+
+def iterate(model, initial_conditions, time_vector, realizations, method='ssa', tau=None, seed=None, chunk=100):
+    """
+    Simulate realizations chunk by chunk in time, so only one chunk of the trajectories is in memory at a time. Both
+    methods restart exactly from the state at the end of the previous chunk (the waiting times of the stochastic
+    simulation algorithm are memoryless), but the random draws differ from simulate() with the same seed.
+
+    :param model: SIRModel, SEIRModel or SIRMigrationModel instance, giving the rates
+    :param initial_conditions: integer counts, laid out as for the model's run() (e.g. (S_0, I_0, R_0))
+    :param time_vector: increasing times at which the state is reported
+    :param realizations: number of realizations
+    :param method: 'ssa' (exact) or 'tau' (tau-leaping)
+    :param tau: tau-leaping step size, in days (defaults to a tenth of the smallest output interval)
+    :param seed: seed for the random number generator
+    :param chunk: number of reported times per chunk
+    :return: generator of (times, counts) pairs, counts of shape [len(times), realizations, state shape...] (time
+    first, as for the consumers in streaming)
+    """
+    if method not in METHODS:
+        raise ValueError('Unknown stochastic method "%s", expected one of %s' % (method, ', '.join(METHODS)))
+
+    time_vector = np.asarray(time_vector, dtype=float)
+    if method == 'tau' and tau is None:
+        tau = 0.1 * np.min(np.diff(time_vector)) if len(time_vector) > 1 else 0.1
+
+    network = reaction_network(model)
+    random = np.random.default_rng(seed)
+    state_shape = np.shape(initial_conditions)
+    counts = np.tile(np.asarray(initial_conditions, dtype=np.int64).reshape(1, -1), (realizations, 1))
+
+    start = 0
+    while start == 0 or start < len(time_vector) - 1:
+        stop = min(start + chunk, len(time_vector) - 1)
+        times = time_vector[start:stop + 1]
+        out = np.zeros((realizations, len(times), network.num_states), dtype=np.int64)
+        if method == 'ssa':
+            _ssa(network, counts, times, random, out)
+        else:
+            _tau_leap(network, counts, times, tau, random, out)
+
+        # every chunk after the first starts from the time the previous one ended on
+        first = 0 if start == 0 else 1
+        out = np.swapaxes(out[:, first:], 0, 1)
+        yield times[first:], out.reshape((len(out), realizations) + state_shape)
+        if stop == start:
+            break
+        start = stop
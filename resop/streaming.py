@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Consumers for trajectories streamed in time chunks, e.g. by simulation.iterate_batch() or stochastic.iterate(), so
+that long runs over many patches or realizations never hold the full (time x members x compartments) array in memory.
+
+Chunks are (times, populations) pairs, with populations of shape [len(times), members..., compartments]. A
+TrajectoryStore writes them to disk as they arrive and the reducers keep running summaries:
+
+    store = TrajectoryStore('run.npy', (len(timespan),) + initial_conditions.shape, dtype=np.float32)
+    peak, final = consume(iterate_batch(model, initial_conditions, timespan), [Peak(1), FinalSize(2)], store=store)
+"""
+
+import numpy as np
+
+FORMATS = ('npy', 'raw')
+
+
+class TrajectoryStore(object):
+    """
+    Trajectory written chunk by chunk into a memory-mapped file, either a .npy file (readable with np.load, including
+    mmap_mode='r') or a raw numpy.memmap
+    """
+
+    def __init__(self, path, shape, dtype=np.float32, file_format='npy'):
+        """
+
+        :param path: output file
+        :param shape: full shape of the trajectory, [number of times, members..., compartments]
+        :param dtype: storage type, e.g. np.float32 (half the size) or np.float64
+        :param file_format: 'npy' or 'raw'
+        """
+        if file_format not in FORMATS:
+            raise ValueError('Unknown trajectory format "%s", expected one of %s' % (file_format, ', '.join(FORMATS)))
+
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        if file_format == 'npy':
+            self.array = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype, shape=self.shape)
+        else:
+            self.array = np.memmap(path, mode='w+', dtype=self.dtype, shape=self.shape)
+        self.written = 0
+
+    def write(self, times, populations):
+        """
+        :param times: times of the chunk
+        :param populations: array [len(times), members..., compartments]
+        """
+        if self.written + len(populations) > self.shape[0]:
+            raise ValueError('Trajectory store %s is full (%d times)' % (self.path, self.shape[0]))
+        self.array[self.written:self.written + len(populations)] = populations
+        self.written += len(populations)
+
+    def close(self):
+        """
+        Flush the file and release the mapping
+        """
+        self.array.flush()
+        self.array = None
+
+
+class Reducer(object):
+    """
+    Summary of one compartment, updated chunk by chunk
+    """
+
+    def __init__(self, compartment):
+        """
+
+        :param compartment: index of the compartment (last axis of the populations)
+        """
+        self.compartment = compartment
+
+    def update(self, times, populations):
+        raise NotImplementedError()
+
+    def result(self):
+        raise NotImplementedError()
+
+
+class Peak(Reducer):
+    """
+    Largest value of a compartment (e.g. the number infectious) and the time it was first reached, for each member
+    """
+
+    def __init__(self, compartment=1):
+        super(Peak, self).__init__(compartment)
+        self.value = None
+        self.time = None
+
+    def update(self, times, populations):
+        values = populations[..., self.compartment]
+        index = np.argmax(values, axis=0)
+        chunk_peak = np.take_along_axis(values, index[np.newaxis], axis=0)[0]
+        chunk_time = np.asarray(times)[index]
+
+        if self.value is None:
+            self.value, self.time = chunk_peak.astype(float), chunk_time.astype(float)
+        else:
+            higher = chunk_peak > self.value
+            self.value = np.where(higher, chunk_peak, self.value)
+            self.time = np.where(higher, chunk_time, self.time)
+
+    def result(self):
+        """
+        :return: (peak values, peak times), arrays [members...]
+        """
+        return self.value, self.time
+
+
+class FinalSize(Reducer):
+    """
+    Value of a compartment (e.g. the number removed) at the last time, for each member
+    """
+
+    def __init__(self, compartment=2):
+        super(FinalSize, self).__init__(compartment)
+        self.value = None
+
+    def update(self, times, populations):
+        self.value = np.array(populations[-1, ..., self.compartment], dtype=float)
+
+    def result(self):
+        """
+        :return: array [members...]
+        """
+        return self.value
+
+
+class CumulativeCases(Reducer):
+    """
+    Number infected since the first time, for each member: the drop in susceptibles, or the rise of a compartment
+    accumulating the infections. The drop in susceptibles only counts infections when nothing else moves them: in
+    SIRMigrationModel trajectories travel moves susceptibles between patches, so count its cumulative number infected
+    instead (CumulativeCases(incidence=3)).
+    """
+
+    def __init__(self, compartment=0, incidence=None):
+        """
+
+        :param compartment: susceptible compartment
+        :param incidence: compartment accumulating the infections, counted instead of the susceptibles when given
+        """
+        super(CumulativeCases, self).__init__(compartment if incidence is None else incidence)
+        self.sign = 1.0 if incidence is None else -1.0
+        self.initial = None
+        self.latest = None
+
+    def update(self, times, populations):
+        if self.initial is None:
+            self.initial = np.array(populations[0, ..., self.compartment], dtype=float)
+        self.latest = np.array(populations[-1, ..., self.compartment], dtype=float)
+
+    def result(self):
+        """
+        :return: array [members...]
+        """
+        return self.sign * (self.initial - self.latest)
+
+
+def consume(chunks, reducers=(), store=None):
+    """
+    Run a chunk stream to the end, writing it to a store and feeding it to reducers
+
+    :param chunks: iterable of (times, populations) pairs
+    :param reducers: list of Reducer instances
+    :param store: optional TrajectoryStore, closed at the end
+    :return: list with the result() of each reducer
+    """
+    for times, populations in chunks:
+        if store is not None:
+            store.write(times, populations)
+        for reducer in reducers:
+            reducer.update(times, populations)
+
+    if store is not None:
+        store.close()
+    return [reducer.result() for reducer in reducers]
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+"""
+Bounded least-recently-used cache of integration results, optionally backed by a directory of .npy files, also
+bounded in size.
+
+Keys are built from quantized parameters (rounded to a number of significant digits), so values that differ only by
+floating-point noise - e.g. R0 values recomputed from an optimisation - share an entry.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+__can_integrate__ = True
+try:
+    import scipy.integrate as scint
+except ImportError:
+    __can_integrate__ = False
+
+
+def quantize(value, digits=10):
+    """
+    :param value: number, string, array (dense or scipy.sparse), or tuple/list of these
+    :param digits: significant digits kept for floating-point numbers
+    :return: hashable representation of value
+    """
+    if isinstance(value, str) or value is None:
+        return value
+    if isinstance(value, (float, np.floating)):
+        return float('%.*g' % (digits, value))
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (tuple, list)):
+        return tuple(quantize(item, digits) for item in value)
+    if hasattr(value, 'tocoo'):
+        coo = value.tocoo()
+        return ('sparse', coo.shape, quantize(coo.row, digits), quantize(coo.col, digits),
+                quantize(coo.data, digits))
+
+    array = np.asarray(value)
+    if array.dtype.kind == 'f':
+        # (integer mantissa, decimal exponent) pairs, which compare exactly
+        with np.errstate(divide='ignore'):
+            exponent = np.where(array != 0, np.floor(np.log10(np.abs(array))), 0).astype(np.int64) - (digits - 1)
+        mantissa = np.round(array / 10.0 ** exponent).astype(np.int64)
+        array = np.stack([mantissa, np.where(mantissa != 0, exponent, 0)], axis=-1)
+    if array.size <= 16:
+        return (array.shape, tuple(array.ravel().tolist()))
+
+    # long vectors are keyed on a digest of their quantized contents
+    return (array.shape, hashlib.sha256(array.tobytes()).hexdigest())
+
+
+class TrajectoryCache(object):
+    """
+    LRU cache of arrays, e.g. trajectories or final sizes, keyed on quantized model parameters
+    """
+
+    def __init__(self, max_entries=1024, directory=None, digits=10, max_disk_bytes=256 * 1024 ** 2):
+        """
+
+        :param max_entries: number of entries kept in memory (0 disables the in-memory cache)
+        :param directory: optional directory where every entry is also saved, and looked up on an in-memory miss
+        :param digits: significant digits kept when quantizing parameters
+        :param max_disk_bytes: largest total size of the files in directory; the least recently used are removed
+        beyond it (None for no limit)
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self.digits = digits
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def make_key(self, *parts):
+        """
+        :param parts: model class or name, then the parameters that determine the result
+        :return: hashable key
+        """
+        return tuple(part.__name__ if isinstance(part, type) else quantize(part, self.digits) for part in parts)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(repr(key).encode('utf-8')).hexdigest() + '.npy')
+
+    def _remember(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, key):
+        """
+        :param key: key from make_key()
+        :return: cached array, or None (counted as a miss)
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                value = np.load(path)
+                # mark the file as recently used
+                os.utime(path)
+            except (OSError, ValueError):
+                # missing, or removed by another process meanwhile
+                value = None
+            if value is not None:
+                self._remember(key, value)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def store(self, key, value):
+        """
+        :param key: key from make_key()
+        :param value: array to cache (callers should not modify it afterwards)
+        """
+        value = np.asarray(value)
+        self._remember(key, value)
+
+        if self.directory is not None:
+            # write then rename, so concurrent readers never see a partial file
+            path = self._path(key)
+            partial = path + '.%d.tmp' % os.getpid()
+            with open(partial, 'wb') as output:
+                np.save(output, value)
+            os.replace(partial, path)
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """
+        Remove the least recently used files until the rest fit in max_disk_bytes
+        """
+        if self.max_disk_bytes is None:
+            return
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npy'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                status = os.stat(path)
+            except OSError:
+                continue
+            files.append((status.st_mtime, status.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # removed by another process meanwhile
+                pass
+            total -= size
+            self.disk_evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        :param key: key from make_key()
+        :param compute: function of no arguments, called on a miss
+        :return: cached or computed array
+        """
+        value = self.lookup(key)
+        if value is None:
+            value = np.asarray(compute())
+            self.store(key, value)
+        return value
+
+    def clear(self):
+        """
+        Empty the in-memory cache and reset the counters (files on disk are kept)
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        :return: dict of hits, disk_hits, misses, hit_rate, entries and disk_evictions
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'disk_evictions': self.disk_evictions
+        }
+
+
+def model_key(cache, model, initial_conditions, time_vector):
+    """
+    :return: cache key for integrating model from initial_conditions over time_vector
+    """
+    parameters = sorted(vars(model).items(), key=lambda item: item[0])
+    return cache.make_key(type(model), tuple(parameters), initial_conditions, time_vector)
+
+
+def cached_integrate(model, initial_conditions, time_vector, cache):
+    """
+    Integrate model with odeint (as the models' own examples do), reusing a cached trajectory when the same model
+    parameters, initial conditions and times were integrated before
+
+    :param model: model instance from sir_models
+    :param initial_conditions: population vector, laid out as for the model's run()
+    :param time_vector: times at which the populations are reported
+    :param cache: TrajectoryCache
+    :return: array [len(time_vector), number of states]
+    """
+    if not __can_integrate__:
+        raise ImportError('"scipy" package not present - integration capability disabled')
+
+    return cache.get_or_compute(model_key(cache, model, initial_conditions, time_vector),
+                                lambda: scint.odeint(model.run, initial_conditions, time_vector))
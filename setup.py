@@ -20,11 +20,24 @@ def python_version_requirements():
     Returns the list of package dependencies for the respective version of Python
     :return:
     """
-    if sys.version_info >= (3, 7):
-        # Python 3.7 requirements
+    if sys.version_info >= (3, 8):
+        # Python 3.8+ requirements: the versions the optional HiGHS backend (scipy >= 1.9) and the JIT kernels (numba)
+        # install with, and the docplex whose internals the HiGHS backend uses (see resop.solver_backends)
         return [
             'future==0.16.0',
-            'numpy==1.15.1',
+            'numpy>=1.18.5',
+            'ujson==1.35',
+            'simplejson==3.13.2',
+            'docloud==1.0.375',
+            'docplex==2.32.264',
+            'ibmdbpy==0.1.6',
+            'jaydebeapi==1.1.1',
+        ]
+    elif sys.version_info >= (3, 7):
+        # Python 3.7 requirements (no HiGHS backend: scipy >= 1.9 needs Python 3.8)
+        return [
+            'future==0.16.0',
+            'numpy==1.17.5',
             'ujson==1.35',
             'simplejson==3.13.2',
             'docloud==1.0.375',
@@ -40,12 +53,14 @@ setup(
     version='0.0.2',
     description='Resource optimization utilities',
     long_description='This package contains utilities for obtaining optimized allocation of resources given an objective.',
-    author='Hamideh Anjomshoa, Roslyn Hicks, Stefan von Cavallar, Olivia Smith', 'Manoj Gambhir',
-    author_email='hamideh.a@au1.ibm.com, svcavallar@au1.ibm.com
+    author='Hamideh Anjomshoa, Roslyn Hicks, Stefan von Cavallar, Olivia Smith, Manoj Gambhir',
+    author_email='hamideh.a@au1.ibm.com, svcavallar@au1.ibm.com',
     url='https://github.ibm.com/Hamideh-A/optimal_intervention_plan',
     install_requires=python_version_requirements(),
     extras_require={
         'dev': [],
+        'highs': ['scipy>=1.9; python_version >= "3.8"'],
+        'jit': ['numba>=0.48'],
         'test': ['flake8', 'pytest', 'coverage'],
     },
     classifiers=[
@@ -54,6 +69,7 @@ setup(
         'Operating System :: OS Independent',
         'Topic :: Scientific/Engineering'],
     packages=find_packages(exclude=['tests*']),
+    package_data={'resop': ['data/*.npz']},
     include_package_data=True,
     license='Apache'
 )
\ No newline at end of file
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+import copy
+import json
+import os
+
+import pytest
+
+from resop.multi_patch_optimizers import InterventionPlanMultiPatch
+
+EXAMPLE_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples', 'data',
+                            'patch_data.json')
+
+
+@pytest.fixture(scope='session')
+def example_data():
+    """
+    The config and patches of examples/data/patch_data.json (22 patches, 4 interventions)
+    """
+    with open(EXAMPLE_DATA) as data_file:
+        return json.load(data_file)
+
+
+@pytest.fixture
+def make_optimiser(example_data):
+    """
+    Factory of InterventionPlanMultiPatch on the example data, with the total budget and the minimum budget of every
+    patch changed as given
+    """
+    def make(total_budget=None, minimum_patch_budget=None, **options):
+        config = copy.deepcopy(example_data['config'])
+        if total_budget is not None:
+            config['total_budget'] = total_budget
+        patches = copy.deepcopy(example_data['patches'])
+        if minimum_patch_budget is not None:
+            for entry in patches.values():
+                entry['minimum_patch_budget'] = minimum_patch_budget
+        return InterventionPlanMultiPatch(None, None, config, patches, ignore_names=True, **options)
+    return make
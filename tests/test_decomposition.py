@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+import pytest
+
+pytest.importorskip('scipy.optimize', reason='the MILP is solved with HiGHS')
+
+from resop.decomposition import LagrangianDecomposition
+from resop.solver_backends import HighsBackend
+
+
+@pytest.mark.parametrize('total_budget, minimum_patch_budget', [(1e5, 2000), (2e5, 2000), (1e6, 0)])
+def test_bounds_enclose_milp_optimum(make_optimiser, total_budget, minimum_patch_budget):
+    optimiser = make_optimiser(total_budget, minimum_patch_budget, solver=HighsBackend(mip_rel_gap=1e-7))
+    result = LagrangianDecomposition(optimiser).solve()
+    _, _, model = optimiser.build_model()
+    assert optimiser.solver.solve(model)
+    optimum = model.objective_value
+
+    assert result.feasible()
+    assert result.lower_bound <= optimum + 1e-6 * abs(optimum)
+    assert result.upper_bound >= optimum - 1e-6 * abs(optimum)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+from resop.frontier import PlanSweep
+
+
+def test_set_budget_keeps_presolved_spend(make_optimiser):
+    optimiser = make_optimiser(1e5, presolve=True)
+    # the second intervention has no efficacy anywhere, so presolve fixes all its pairs
+    for entry in optimiser.patches.values():
+        entry['efficacyBeta'][1] = entry['efficacyGamma'][1] = 0.0
+    sweep = PlanSweep(optimiser)
+    fixed = sweep.model.presolve_report.fixed
+    assert fixed[1].all()
+
+    sweep.set_budget(5e4)
+    spend = sweep.model.total_dollar_var
+    assert all(var.ub == 0 for var in spend[fixed])
+    assert all(var.ub == 5e4 for var in spend[~fixed])
+    assert sweep.model.budget_constraint.rhs.constant == 5e4
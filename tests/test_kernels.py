@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+import numpy as np
+import pytest
+
+from resop import kernels
+from resop.kernels import compile_model
+from resop.sir_models import (
+    GammaContactModel,
+    SEIRModel,
+    SINRModel,
+    SIRMigrationModel,
+    SIRModel,
+    SIRSModel
+)
+
+
+def models():
+    rng = np.random.RandomState(2)
+    travel = rng.uniform(0, 0.05, (4, 4))
+    np.fill_diagonal(travel, 0)
+    migration_state = np.column_stack([rng.uniform(500, 1000, 4), rng.uniform(1, 50, 4), rng.uniform(0, 50, 4),
+                                       rng.uniform(1, 100, 4)]).ravel()
+    cases = [
+        (SIRModel(0.6, 4.0), np.array([900.0, 80.0, 20.0])),
+        (SEIRModel(0.6, 4.0, 3.0), np.array([900.0, 40.0, 40.0, 20.0])),
+        (SIRSModel(0.6, 4.0, 0.01), np.array([900.0, 80.0, 20.0, 100.0])),
+        (SINRModel(0.6, 4.0, 3), np.array([900.0, 30.0, 30.0, 20.0, 20.0])),
+        # enough stages for the vectorized kernel
+        (SINRModel(0.6, 4.0, 40), np.concatenate([[900.0], rng.uniform(0, 5, 40), [20.0]])),
+        (GammaContactModel(0.6, 4.0, 3.0, 2.0, birth=0.001, death=0.001), np.array([900.0, 40.0, 40.0, 20.0])),
+        (SIRMigrationModel(rng.uniform(0.3, 0.8, 4), 4.0, travel, 4), migration_state),
+    ]
+    if kernels.__has_scipy__:
+        import scipy.sparse as sparse
+        cases.append((SIRMigrationModel(rng.uniform(0.3, 0.8, 4), 4.0, sparse.csr_matrix(travel), 4),
+                      migration_state))
+    return cases
+
+
+@pytest.mark.parametrize('backend', kernels.BACKENDS)
+@pytest.mark.parametrize('model, state', models(), ids=lambda value: type(value).__name__)
+def test_kernel_matches_model(model, state, backend):
+    if backend == 'numba' and not kernels.__has_numba__:
+        pytest.skip('numba is not installed')
+    compiled = compile_model(model, backend=backend)
+    assert np.allclose(compiled.run(state, 0.0), model.run(state, 0.0), rtol=1e-12, atol=1e-12)
+    # the buffer is reused, so the second call must not depend on the first
+    assert np.allclose(compiled.run(state, 0.0), model.run(state, 0.0), rtol=1e-12, atol=1e-12)
+    jacobian = compiled.jacobian(state, 0.0)
+    expected = model.jacobian(state, 0.0)
+    assert np.allclose(getattr(jacobian, 'toarray', lambda: jacobian)(),
+                       getattr(expected, 'toarray', lambda: expected)())
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+import numpy as np
+import pytest
+
+from resop.marginal_allocator import MarginalAllocator
+
+
+@pytest.mark.parametrize('total_budget, minimum_patch_budget', [(1e6, 0), (1e5, 2000), (2e5, 2000), (1e4, 200)])
+def test_plan_is_a_valid_warm_start(make_optimiser, total_budget, minimum_patch_budget):
+    optimiser = make_optimiser(total_budget, minimum_patch_budget)
+    allocator = MarginalAllocator(optimiser)
+    solution = allocator.allocate()
+
+    spend = np.array(solution['allocated_budget_patches_interventions'])
+    assert spend.sum() <= total_budget * (1 + 1e-9)
+    assert (allocator.patch_spend >= minimum_patch_budget - 1e-6).all()
+
+    optimiser.warm_start = solution
+    _, _, model = optimiser.build_model()
+    start = next(iter(model.iter_mip_starts()))
+    start = start[0] if isinstance(start, tuple) else start
+    assert start.find_unsatisfied_constraints(model, tolerance=1e-6) == []
+
+
+def test_unmet_minimum_budget_raises(make_optimiser):
+    # every patch's minimum budget adds up to more than the total budget
+    optimiser = make_optimiser(1e4, 1000)
+    with pytest.raises(ValueError):
+        MarginalAllocator(optimiser).allocate()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+import numpy as np
+import pytest
+
+from resop.model_spec import ModelSpec, spec_from_model
+from resop.sir_models import (
+    GammaContactModel,
+    SEIRModel,
+    SIRMigrationModel,
+    SIRModel,
+    SIRSModel
+)
+
+MODELS = [
+    (SIRModel(0.6, 4.0), [900.0, 80.0, 20.0]),
+    (SEIRModel(0.6, 4.0, 3.0), [900.0, 40.0, 40.0, 20.0]),
+    (SIRSModel(0.6, 4.0, 0.01), [900.0, 80.0, 20.0, 100.0]),
+    (GammaContactModel(0.6, 4.0, 3.0, 2.0, birth=0.001, death=0.001), [900.0, 40.0, 40.0, 20.0]),
+]
+
+
+@pytest.mark.parametrize('model, state', MODELS, ids=lambda value: type(value).__name__)
+def test_spec_matches_model(model, state):
+    state = np.array(state)
+    compiled = spec_from_model(model).compile()
+    assert np.allclose(compiled.run(state, 0.0), model.run(state, 0.0), rtol=1e-12, atol=1e-12)
+    assert np.allclose(compiled.jacobian(state, 0.0), model.jacobian(state, 0.0), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('sparse_travel', [False, True])
+def test_spec_with_mobility_matches_migration_model(sparse_travel):
+    sparse = pytest.importorskip('scipy.sparse')
+    rng = np.random.RandomState(1)
+    patches = 5
+    transmission = rng.uniform(0.3, 0.8, patches)
+    travel = rng.uniform(0, 0.05, (patches, patches))
+    np.fill_diagonal(travel, 0)
+    if sparse_travel:
+        travel = sparse.csr_matrix(travel)
+    model = SIRMigrationModel(transmission, 4.0, travel, patches)
+    spec = ModelSpec(compartments=['S', 'I', 'R', 'C'],
+                     transitions=[{'from': 'S', 'to': 'I', 'rate': 'infection', 'counter': 'C'},
+                                  {'from': 'I', 'to': 'R', 'rate': 0.25}],
+                     infection={'infectious': ['I'], 'transmission': transmission[:, np.newaxis]},
+                     population=['S', 'I', 'R'], mobility=travel, patches=patches)
+    compiled = spec.compile()
+    state = np.column_stack([rng.uniform(500, 1000, patches), rng.uniform(1, 50, patches),
+                             rng.uniform(0, 50, patches), rng.uniform(1, 100, patches)]).ravel()
+
+    assert np.allclose(compiled.run(state, 0.0), model.run(state, 0.0), rtol=1e-12, atol=1e-12)
+    jacobian = model.jacobian(state, 0.0)
+    jacobian = jacobian.toarray() if sparse.issparse(jacobian) else jacobian
+    assert np.allclose(compiled.jacobian(state, 0.0).toarray(), jacobian, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+import pytest
+
+from resop.solver_backends import CplexBackend, HighsBackend
+
+# optimum of the example data with the formulation the package started with
+BASELINE_OBJECTIVE = -14119260.95
+
+
+@pytest.mark.parametrize('formulation', ['binary', 'log'])
+@pytest.mark.parametrize('presolve', [False, True])
+def test_formulations_match_baseline(make_optimiser, formulation, presolve):
+    pytest.importorskip('scipy.optimize', reason='the MILP is solved with HiGHS')
+    optimiser = make_optimiser(formulation=formulation, presolve=presolve, solver=HighsBackend(mip_rel_gap=1e-7))
+    _, _, model = optimiser.build_model()
+    assert optimiser.solver.solve(model)
+    assert model.objective_value == pytest.approx(BASELINE_OBJECTIVE, rel=1e-8)
+
+
+def test_sos2_formulation_matches_baseline(make_optimiser):
+    pytest.importorskip('cplex', reason='SOS constraints need CPLEX')
+    # presolved, the model fits the size limits of the CPLEX community edition
+    optimiser = make_optimiser(formulation='sos2', presolve=True, solver=CplexBackend())
+    _, _, model = optimiser.build_model()
+    assert optimiser.solver.solve(model)
+    assert model.objective_value == pytest.approx(BASELINE_OBJECTIVE, rel=1e-8)
+
+
+def test_solution_spends_within_budget(make_optimiser):
+    pytest.importorskip('scipy.optimize', reason='the MILP is solved with HiGHS')
+    optimiser = make_optimiser(1e5, 2000, solver='highs')
+    patches, config, model = optimiser.run()
+    solution = optimiser.get_optimization_solution(patches, config, model)
+    assert sum(solution['allocated_budget_patches']) <= 1e5 * (1 + 1e-9)
+    assert min(solution['allocated_budget_patches']) >= 2000 * (1 - 1e-9)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+from resop.marginal_allocator import MarginalAllocator
+from resop.plan_cache import PlanCache
+
+
+def test_key_covers_presolve_and_warm_start(make_optimiser, tmp_path):
+    cache = PlanCache(str(tmp_path))
+    optimiser = make_optimiser(1e5, solver='highs', time_limit=10)
+    cold = cache.make_key(optimiser)
+    assert cache.make_key(make_optimiser(1e5, solver='highs', time_limit=10)) == cold
+
+    assert cache.make_key(make_optimiser(1e5, solver='highs', time_limit=10, presolve=True)) != cold
+    warm_start = MarginalAllocator(optimiser).allocate()
+    warm = cache.make_key(make_optimiser(1e5, solver='highs', time_limit=10, warm_start=warm_start))
+    assert warm != cold
+    assert cache.make_key(make_optimiser(1e5, solver='highs', time_limit=10, warm_start=dict(warm_start))) == warm
+
+
+def test_clear_removes_entries(tmp_path):
+    cache = PlanCache(str(tmp_path))
+    cache.store('key', {'objective': 1.0})
+    assert cache.lookup('key') == {'objective': 1.0}
+    cache.clear()
+    assert cache.lookup('key') is None
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+import pytest
+
+pytest.importorskip('scipy.optimize', reason='the MILP is solved with HiGHS')
+
+from resop.solver_backends import HighsBackend
+
+
+def optimum(optimiser):
+    _, _, model = optimiser.build_model()
+    assert optimiser.solver.solve(model)
+    return model.objective_value
+
+
+def spend_only(optimiser, cost):
+    """
+    Give the first intervention of every patch a cost curve that adds spend but no coverage, so that presolve finds it
+    unaffordable
+    """
+    for entry in optimiser.patches.values():
+        entry['threshold_coverage'][0] = [0.0] * len(entry['threshold_coverage'][0])
+        entry['threshold_costs'][0] = [cost * (k + 1) for k in range(len(entry['threshold_costs'][0]))]
+    return optimiser
+
+
+@pytest.mark.parametrize('total_budget, minimum_patch_budget, unaffordable', [(1e5, 2000, False), (1e5, 2000, True)])
+def test_presolve_keeps_optimum(make_optimiser, total_budget, minimum_patch_budget, unaffordable):
+    objectives = []
+    for reduce in (False, True):
+        optimiser = make_optimiser(total_budget, minimum_patch_budget, presolve=reduce,
+                                   solver=HighsBackend(mip_rel_gap=1e-7))
+        if unaffordable:
+            spend_only(optimiser, 300)
+        objectives.append(optimum(optimiser))
+    assert objectives[1] == pytest.approx(objectives[0], rel=1e-6)
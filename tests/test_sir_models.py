@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+##################################################################
+#
+# Licensed Materials - Property of IBM
+#
+# (C) Copyright IBM Corp. 2020. All Rights Reserved.
+#
+# US Government Users Restricted Rights - Use, duplication or
+# disclosure restricted by GSA ADP Schedule Contract with IBM Corp.
+#
+##################################################################
+
+import numpy as np
+import pytest
+
+scint = pytest.importorskip('scipy.integrate')
+sparse = pytest.importorskip('scipy.sparse')
+
+from resop.sir_models import (
+    BatchSIRModel,
+    BatchSEIRModel,
+    GammaContactModel,
+    SEIRModel,
+    SINRModel,
+    SIRMigrationModel,
+    SIRModel,
+    SIRSModel
+)
+
+
+def hand_written_models():
+    """
+    One instance of every model with an analytic Jacobian, with a state to evaluate it at
+    """
+    rng = np.random.RandomState(0)
+    travel = rng.uniform(0, 0.05, (4, 4))
+    np.fill_diagonal(travel, 0)
+    return [
+        (SIRModel(0.6, 4.0), np.array([900.0, 80.0, 20.0])),
+        (SEIRModel(0.6, 4.0, 3.0), np.array([900.0, 40.0, 40.0, 20.0])),
+        (SIRSModel(0.6, 4.0, 0.01), np.array([900.0, 80.0, 20.0, 100.0])),
+        (SINRModel(0.6, 4.0, 3), np.array([900.0, 30.0, 30.0, 20.0, 20.0])),
+        (GammaContactModel(0.6, 4.0, 3.0, 2.0, birth=0.001, death=0.001), np.array([900.0, 40.0, 40.0, 20.0])),
+        (SIRMigrationModel(rng.uniform(0.3, 0.8, 4), 4.0, travel, 4),
+         np.column_stack([rng.uniform(500, 1000, 4), rng.uniform(1, 50, 4), rng.uniform(0, 50, 4),
+                          rng.uniform(1, 100, 4)]).ravel()),
+        (SIRMigrationModel(rng.uniform(0.3, 0.8, 4), 4.0, sparse.csr_matrix(travel), 4),
+         np.column_stack([rng.uniform(500, 1000, 4), rng.uniform(1, 50, 4), rng.uniform(0, 50, 4),
+                          rng.uniform(1, 100, 4)]).ravel()),
+        (BatchSIRModel(rng.uniform(0.3, 0.8, (2, 3)), 4.0),
+         np.stack([rng.uniform(500, 1000, (2, 3)), rng.uniform(1, 50, (2, 3)), rng.uniform(0, 50, (2, 3))],
+                  axis=-1).ravel()),
+        (BatchSEIRModel(rng.uniform(0.3, 0.8, (2, 3)), 4.0, 3.0),
+         np.stack([rng.uniform(500, 1000, (2, 3)), rng.uniform(1, 50, (2, 3)), rng.uniform(1, 50, (2, 3)),
+                   rng.uniform(0, 50, (2, 3))], axis=-1).ravel()),
+    ]
+
+
+def finite_difference_jacobian(run, state, step=1e-4):
+    columns = []
+    for k in range(len(state)):
+        shift = np.zeros(len(state))
+        shift[k] = step * max(1.0, abs(state[k]))
+        columns.append((np.array(run(state + shift, 0.0)) - np.array(run(state - shift, 0.0))) / (2 * shift[k]))
+    return np.column_stack(columns)
+
+
+@pytest.mark.parametrize('model, state', hand_written_models(), ids=lambda value: type(value).__name__)
+def test_jacobian_matches_finite_differences(model, state):
+    jacobian = model.jacobian(state, 0.0)
+    jacobian = jacobian.toarray() if sparse.issparse(jacobian) else np.asarray(jacobian)
+    assert np.allclose(jacobian, finite_difference_jacobian(model.run, state), rtol=1e-6, atol=1e-9)
+
+
+@pytest.mark.parametrize('r0', [0.8, 1.5, 2.5, 5.0])
+def test_sir_final_size_matches_odeint(r0):
+    population, infected, infectious_period = 1e4, 10.0, 5.0
+    model = SIRModel(r0 / infectious_period, infectious_period)
+    times = np.linspace(0, 2000, 201)
+    populations = scint.odeint(model.run, [population - infected, infected, 0.0], times, Dfun=model.jacobian,
+                               rtol=1e-10, atol=1e-8)
+
+    removed, burnt_out = SIRModel.final_size(r0, population, infected, infectious_period, horizon=times[-1])
+    assert burnt_out
+    assert removed == pytest.approx(populations[-1, 2], rel=1e-5)
+
+
+def test_sirs_final_size_without_waning_matches_sir():
+    r0 = np.array([0.8, 2.0, 4.0])
+    cumulative, burnt_out = SIRSModel.final_size(r0, 1e4, 0.0)
+    removed, _ = SIRModel.final_size(r0, 1e4)
+    assert np.allclose(cumulative, removed)
+    assert burnt_out.all()
+    _, endemic_burnt_out = SIRSModel.final_size(r0, 1e4, 0.01)
+    assert (endemic_burnt_out == (r0 <= 1)).all()